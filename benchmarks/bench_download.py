@@ -0,0 +1,130 @@
+"""
+Benchmark sin red del planificador de descargas (src/scheduler.py) contra el
+proveedor simulado FakeSource: mide solicitudes por segundo y reintentos bajo un
+límite de tasa y fallas transitorias, verifica que el resultado coincide con los
+datos grabados y que una ejecución interrumpida se retoma desde los checkpoints.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.bench_download
+    python -m benchmarks.bench_download --fixture src/palladium/static/data/historical.csv --interval 1d
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from benchmarks.bench_pipeline import RESULTS_DIR, synthetic_ohlcv
+from src.logger import logger
+from src.scheduler import DownloadScheduler
+from src.sources import SOURCE_COLUMNS, FakeSource
+
+
+def fixture_frames(symbols, rows, fixture=None):
+    """Datos grabados por símbolo: un CSV de fixture o barras sintéticas con el formato de yfinance"""
+    if fixture:
+        return None
+    frames = {}
+    for seed, symbol in enumerate(symbols):
+        df = synthetic_ohlcv(rows, seed=seed)
+        df.columns = SOURCE_COLUMNS
+        df.index = (df.index + pd.DateOffset(years=40)).as_unit('ns')
+        frames[symbol] = df
+    return frames
+
+
+def expected(source, symbols):
+    return {symbol: source._load(symbol) for symbol in symbols}
+
+
+def run(source, symbols, interval, args, checkpoint_dir):
+    """Descarga el rango completo de cada símbolo y devuelve (frames, métricas)"""
+    data = expected(source, symbols)
+    requests = {symbol: {'start': data[symbol].index[0], 'end': data[symbol].index[-1] + pd.Timedelta(hours=1),
+                         'interval': interval} for symbol in symbols}
+    scheduler = DownloadScheduler(source, rate=args.rate, burst=args.burst, max_concurrency=args.concurrency,
+                                  base_delay=args.base_delay, checkpoint_dir=checkpoint_dir, logger=logger, seed=0)
+    start = time.perf_counter()
+    frames = scheduler.run(requests)
+    wall = time.perf_counter() - start
+    return frames, dict(scheduler.stats, wall_s=wall, requests_per_s=scheduler.stats['requests'] / wall)
+
+
+def interrupted(source, symbols, interval, args, checkpoint_dir):
+    """Interrumpe la primera ejecución a la mitad y mide cuántos bloques se reutilizan al retomarla"""
+    data = expected(source, symbols)
+    symbol = symbols[0]
+    request = {'start': data[symbol].index[0], 'end': data[symbol].index[-1] + pd.Timedelta(hours=1), 'interval': interval}
+    scheduler = DownloadScheduler(source, rate=None, max_concurrency=1, checkpoint_dir=checkpoint_dir, seed=0)
+    chunks = scheduler.plan(request['start'], request['end'], interval)
+    history = source.history
+    calls = {'count': 0}
+
+    def failing(*a, **kwargs):
+        calls['count'] += 1
+        if calls['count'] > len(chunks) // 2:
+            raise ValueError('Interrupción simulada')
+        return history(*a, **kwargs)
+
+    source.history = failing
+    try:
+        scheduler.run({symbol: request})
+    except ValueError:
+        pass
+    finally:
+        del source.history
+    resumed = DownloadScheduler(source, rate=None, checkpoint_dir=checkpoint_dir, seed=0)
+    frame = resumed.run({symbol: request})[symbol]
+    return {'chunks': len(chunks), 'from_checkpoint': resumed.stats['checkpoints'],
+            'refetched': resumed.stats['chunks'], 'matches': frame.equals(data[symbol])}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark del planificador de descargas con un proveedor simulado.')
+    parser.add_argument('--symbols', nargs='+', default=['PA=F', 'PL=F', 'GC=F', 'SI=F'])
+    parser.add_argument('--rows', type=int, default=20_000, help='Barras horarias sintéticas por símbolo')
+    parser.add_argument('--fixture', type=str, help='CSV grabado a servir en lugar de barras sintéticas')
+    parser.add_argument('--interval', default='1h', choices=['1h', '1d'])
+    parser.add_argument('--latency', type=float, default=0.02, help='Latencia simulada por solicitud (s)')
+    parser.add_argument('--provider_limit', type=float, default=20, help='Solicitudes por segundo que acepta el proveedor')
+    parser.add_argument('--failure_rate', type=float, default=0.05, help='Probabilidad de falla transitoria por solicitud')
+    parser.add_argument('--rate', type=float, default=15, help='Tasa del token bucket del planificador')
+    parser.add_argument('--burst', type=int, default=4)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--base_delay', type=float, default=0.05)
+    parser.add_argument('--output', type=str, help='Archivo JSON de resultados')
+    args = parser.parse_args()
+
+    logger.setLevel(logging.WARNING)
+    frames = fixture_frames(args.symbols, args.rows, args.fixture)
+    source = FakeSource(args.fixture, frames=frames, latency=args.latency, rate_limit=args.provider_limit,
+                        failure_rate=args.failure_rate)
+    with tempfile.TemporaryDirectory() as checkpoint_dir:
+        result, metrics = run(source, args.symbols, args.interval, args, checkpoint_dir)
+        data = expected(source, args.symbols)
+        metrics['matches'] = all(result[symbol].equals(data[symbol]) for symbol in args.symbols)
+        metrics.update(provider_calls=source.calls, provider_rejected=source.rejected, provider_failed=source.failed)
+        clean = FakeSource(args.fixture, frames=frames, latency=args.latency)
+        resume = interrupted(clean, args.symbols, args.interval, args, checkpoint_dir)
+
+    for key, value in metrics.items():
+        print(f'{key:<20}{value:.3f}' if isinstance(value, float) else f'{key:<20}{value}')
+    print(f"reanudación: {resume['from_checkpoint']}/{resume['chunks']} bloques desde checkpoint, "
+          f"{resume['refetched']} descargados de nuevo, coincide={resume['matches']}")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(RESULTS_DIR, f"download-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(output, 'w') as output_file:
+        json.dump({'args': vars(args), 'results': metrics, 'resume': resume}, output_file, indent=4)
+    print(f'Resultados guardados en {output}')
+    if not (metrics['matches'] and resume['matches']):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+"""
+Benchmark reproducible del pipeline recolectar -> enriquecer -> preparar -> entrenar -> predecir.
+Genera series OHLCV sintéticas (sin red ni yfinance) y mide cada etapa por separado:
+tiempo de pared, pico de RSS y filas por segundo. Los resultados se guardan en JSON y
+se pueden comparar contra una línea base para detectar regresiones.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.bench_pipeline --sizes 1000 100000
+    python -m benchmarks.bench_pipeline --sizes 1000 100000 --baseline benchmarks/baseline.json
+    python -m benchmarks.bench_pipeline --sizes 1000 100000 --update_baseline
+"""
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from src.collector import DataCollector
+from src.enricher import Enricher
+from src.logger import current_rss, logger
+from src.modeller import Modeller
+
+STAGES = ['enrich_data', 'save_to_db', 'save_to_csv', 'preparar_df', 'entrenar_df', 'predecir_df']
+DEFAULT_SIZES = [1_000, 100_000, 10_000_000]
+RESULTS_DIR = 'benchmarks/results'
+BASELINE_PATH = 'benchmarks/baseline.json'
+
+
+def synthetic_ohlcv(rows, seed=42):
+    """Barras horarias OHLCV con un paseo aleatorio geométrico (reproducible por semilla)"""
+    rng = np.random.default_rng(seed)
+    close = 1000 * np.exp(np.cumsum(rng.normal(0, 0.005, rows)))
+    open_ = np.concatenate(([close[0]], close[:-1]))
+    spread = np.abs(rng.normal(0, 0.003, rows)) * close
+    # Resolución de segundos: 10M barras horarias exceden el rango de datetime64[ns]
+    index = pd.date_range('1970-01-01', periods=rows, freq='h', unit='s', name='datetime')
+    return pd.DataFrame({
+        'open': open_,
+        'high': np.maximum(open_, close) + spread,
+        'low': np.minimum(open_, close) - spread,
+        'close': close,
+        'volume': rng.integers(0, 500, rows).astype('float64'),
+        'dividends': 0.0,
+        'stock_splits': 0.0
+    }, index=index)
+
+
+class RssSampler:
+    """Muestrea el RSS del proceso en un hilo y conserva el pico durante la etapa"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    current = staticmethod(current_rss)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self.current())
+
+    def __enter__(self):
+        self.peak = self.current()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.current())
+
+
+def measure(stage, rows, func):
+    """Ejecuta una etapa y devuelve (resultado, métricas)"""
+    gc.collect()
+    with RssSampler() as sampler:
+        start = time.perf_counter()
+        result = func()
+        wall = time.perf_counter() - start
+    return result, {
+        'stage': stage,
+        'rows': rows,
+        'wall_s': wall,
+        'peak_rss_mb': sampler.peak / 1024 ** 2,
+        'rows_per_s': rows / wall if wall > 0 else None
+    }
+
+
+def run_size(rows, stages, workdir, max_train_rows):
+    """Ejecuta las etapas para un tamaño; cada etapa usa la salida de la anterior"""
+    raw = synthetic_ohlcv(rows)
+    collector = DataCollector(db_path=os.path.join(workdir, f'bench-{rows}.db'),
+                              csv_path=os.path.join(workdir, f'bench-{rows}.csv'),
+                              symbol='BENCH')
+    modeller = Modeller(logger, pkl_path=os.path.join(workdir, f'bench-{rows}.pkl'), symbol='BENCH',
+                        registry_root=workdir)
+    enricher = Enricher(logger)
+
+    results = []
+    enriched = raw
+    if 'enrich_data' in stages:
+        enriched, result = measure('enrich_data', rows, lambda: enricher.enrich_data(raw))
+        results.append(result)
+    if 'save_to_db' in stages:
+        _, result = measure('save_to_db', rows, lambda: collector.save_to_db(enriched, incremental=False))
+        results.append(result)
+    if 'save_to_csv' in stages:
+        _, result = measure('save_to_csv', rows, lambda: collector.save_to_csv(enriched))
+        results.append(result)
+
+    needs_model = {'preparar_df', 'entrenar_df', 'predecir_df'} & set(stages)
+    if needs_model:
+        (prepared, _), result = measure('preparar_df', rows, lambda: modeller.preparar_df(enriched))
+        if 'preparar_df' in stages:
+            results.append(result)
+        # El entrenamiento usa como máximo las últimas `max_train_rows` filas
+        train_df = prepared.iloc[-max_train_rows:]
+        _, result = measure('entrenar_df', len(train_df), lambda: modeller.entrenar_df(train_df))
+        if 'entrenar_df' in stages:
+            results.append(result)
+        if 'predecir_df' in stages:
+            _, result = measure('predecir_df', len(prepared), lambda: modeller.predecir_df(prepared))
+            results.append(result)
+    return results
+
+
+def environment():
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__
+    }
+
+
+def compare(results, baseline, threshold=0.2):
+    """Regresiones de tiempo o memoria respecto a la línea base (misma etapa y tamaño)"""
+    reference = {(entry['stage'], entry['rows']): entry for entry in baseline['results']}
+    regressions = []
+    for entry in results:
+        base = reference.get((entry['stage'], entry['rows']))
+        if base is None:
+            continue
+        for metric in ('wall_s', 'peak_rss_mb'):
+            ratio = entry[metric] / base[metric] if base[metric] else 1.0
+            if ratio > 1 + threshold:
+                regressions.append(dict(stage=entry['stage'], rows=entry['rows'], metric=metric,
+                                        baseline=base[metric], current=entry[metric], ratio=ratio))
+    return regressions
+
+
+def print_table(results):
+    print(f"{'etapa':<14}{'filas':>12}{'tiempo (s)':>12}{'RSS (MB)':>10}{'filas/s':>14}")
+    for entry in results:
+        print(f"{entry['stage']:<14}{entry['rows']:>12}{entry['wall_s']:>12.3f}"
+              f"{entry['peak_rss_mb']:>10.1f}{entry['rows_per_s'] or 0:>14.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de las etapas del pipeline con datos sintéticos.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='Cantidad de barras a generar')
+    parser.add_argument('--stages', nargs='+', default=STAGES, choices=STAGES, help='Etapas a medir')
+    parser.add_argument('--max_train_rows', type=int, default=100_000, help='Filas máximas para entrenar')
+    parser.add_argument('--output', type=str, help='Archivo JSON de resultados')
+    parser.add_argument('--baseline', type=str, help='Línea base contra la cual comparar')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Tolerancia antes de marcar una regresión (0.2 = 20%%)')
+    parser.add_argument('--update_baseline', action='store_true', help=f'Guardar los resultados como {BASELINE_PATH}')
+    args = parser.parse_args()
+
+    logger.setLevel(logging.WARNING)
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for rows in args.sizes:
+            results.extend(run_size(rows, args.stages, workdir, args.max_train_rows))
+    print_table(results)
+
+    report = {'environment': environment(), 'results': results}
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(RESULTS_DIR, f"bench-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(output, 'w') as output_file:
+        json.dump(report, output_file, indent=4)
+    print(f'Resultados guardados en {output}')
+    if args.update_baseline:
+        with open(BASELINE_PATH, 'w') as baseline_file:
+            json.dump(report, baseline_file, indent=4)
+        print(f'Línea base actualizada: {BASELINE_PATH}')
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.threshold)
+        for regression in regressions:
+            print(f"REGRESIÓN {regression['stage']} ({regression['rows']} filas) {regression['metric']}: "
+                  f"{regression['baseline']:.3f} -> {regression['current']:.3f} (x{regression['ratio']:.2f})")
+        if regressions:
+            sys.exit(1)
+        print('Sin regresiones respecto a la línea base')
+
+
+if __name__ == '__main__':
+    main()
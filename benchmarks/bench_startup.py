@@ -0,0 +1,120 @@
+"""
+Benchmark del tiempo de arranque de la CLI con `python -X importtime`.
+Para cada objetivo mide el tiempo total del proceso (mejor de N ejecuciones), el
+tiempo acumulado de importación, los módulos más costosos y si se cargaron
+módulos pesados que ese camino no debería necesitar (sklearn en predict, etc.).
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --baseline benchmarks/startup_baseline.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+RESULTS_DIR = 'benchmarks/results'
+BASELINE_PATH = 'benchmarks/startup_baseline.json'
+
+# Objetivo -> (código a ejecutar, módulos que no deben importarse)
+# Los comandos importan sus módulos de forma diferida; aquí se importan los mismos
+# módulos que usa cada comando para medir su costo sin tocar los datos del proyecto.
+TARGETS = {
+    'cli --help': ("import sys, main; sys.argv = ['main.py', '--help']\ntry: main.main()\nexcept SystemExit: pass",
+                   ['pandas', 'sklearn', 'yfinance']),
+    'collect': ('import main, src.collector, src.sources', ['sklearn']),
+    'enrich': ('import main, src.collector, src.enricher, src.cache', ['sklearn', 'yfinance']),
+    'train': ('import main, src.collector, src.modeller, src.training, src.cache', ['yfinance']),
+    'predict': ('import main, src.collector, src.modeller, src.cache, src.inference', ['sklearn', 'yfinance', 'joblib']),
+    'serve': ('import main, src.collector, src.modeller, src.server', ['sklearn', 'yfinance', 'joblib'])
+}
+
+HEAVY_MODULES = ['pandas', 'numpy', 'sklearn', 'scipy', 'joblib', 'yfinance']
+
+
+def parse_importtime(stderr):
+    """
+    Devuelve {módulo: microsegundos acumulados} de los imports de nivel superior
+    en la salida de -X importtime (los anidados aparecen con sangría).
+    """
+    top_level = {}
+    for line in stderr.splitlines():
+        parts = line[len('import time:'):].split('|') if line.startswith('import time:') else []
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue
+        name = parts[2][1:]
+        if name == name.lstrip():
+            top_level[name.strip()] = top_level.get(name.strip(), 0) + int(parts[1])
+    return top_level
+
+
+def measure(code, forbidden, runs):
+    check = f"\nimport sys as _s; print('MODULES:' + ','.join(m for m in {HEAVY_MODULES!r} if m in _s.modules))"
+    best_wall = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        process = subprocess.run([sys.executable, '-X', 'importtime', '-c', code + check],
+                                 capture_output=True, text=True)
+        wall = time.perf_counter() - start
+        if process.returncode != 0:
+            raise RuntimeError(process.stderr[-2000:])
+        if best_wall is None or wall < best_wall:
+            best_wall, stdout, stderr = wall, process.stdout, process.stderr
+    modules_line = [line for line in stdout.splitlines() if line.startswith('MODULES:')][-1]
+    loaded = [module for module in modules_line[len('MODULES:'):].split(',') if module]
+    top_level = parse_importtime(stderr)
+    return {
+        'wall_s': best_wall,
+        'import_s': sum(top_level.values()) / 1e6,
+        'top_modules': sorted(top_level.items(), key=lambda item: -item[1])[:10],
+        'heavy_modules': loaded,
+        'forbidden_loaded': [module for module in forbidden if module in loaded]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark del tiempo de arranque por comando.')
+    parser.add_argument('--runs', type=int, default=5, help='Ejecuciones por objetivo (se conserva la mejor)')
+    parser.add_argument('--targets', nargs='+', default=list(TARGETS), choices=list(TARGETS))
+    parser.add_argument('--output', type=str, help='Archivo JSON de resultados')
+    parser.add_argument('--baseline', type=str, help='Línea base contra la cual comparar')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Tolerancia antes de marcar una regresión (0.2 = 20%%)')
+    parser.add_argument('--update_baseline', action='store_true', help=f'Guardar los resultados como {BASELINE_PATH}')
+    args = parser.parse_args()
+
+    results = {target: measure(*TARGETS[target], args.runs) for target in args.targets}
+    print(f"{'objetivo':<14}{'proceso (s)':>12}{'imports (s)':>12}  módulos pesados")
+    for target, result in results.items():
+        print(f"{target:<14}{result['wall_s']:>12.3f}{result['import_s']:>12.3f}  {', '.join(result['heavy_modules'])}")
+
+    report = {'timestamp': datetime.now().isoformat(timespec='seconds'), 'python': sys.version.split()[0],
+              'results': results}
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(RESULTS_DIR, f"startup-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(output, 'w') as output_file:
+        json.dump(report, output_file, indent=4)
+    print(f'Resultados guardados en {output}')
+    if args.update_baseline:
+        with open(BASELINE_PATH, 'w') as baseline_file:
+            json.dump(report, baseline_file, indent=4)
+
+    failures = [f"{target}: importa {', '.join(result['forbidden_loaded'])}"
+                for target, result in results.items() if result['forbidden_loaded']]
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)['results']
+        for target, result in results.items():
+            base = baseline.get(target)
+            if base and result['wall_s'] > base['wall_s'] * (1 + args.threshold):
+                failures.append(f"{target}: {base['wall_s']:.3f}s -> {result['wall_s']:.3f}s")
+    for failure in failures:
+        print(f'REGRESIÓN {failure}')
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
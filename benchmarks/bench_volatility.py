@@ -0,0 +1,138 @@
+"""
+Benchmark de los modelos de volatilidad condicional (src/volatility.py): compara el
+ajuste vectorizado (recursión con lfilter y gradiente analítico) contra una
+referencia con la recursión en un bucle de Python y gradiente por diferencias
+finitas, sobre series simuladas de cada modelo con parámetros conocidos. Mide el tiempo
+por ajuste, el error de los parámetros recuperados y el reajuste en ventanas
+móviles con y sin pool de procesos.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.bench_volatility
+    python -m benchmarks.bench_volatility --rows 50000 --window 2000 --step 24 --workers 4
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+from benchmarks.bench_pipeline import RESULTS_DIR
+from src.volatility import MODELS, PARAMETERS, _bounds, _start, backcast, fit, rolling_fit
+
+TRUE_PARAMS = {
+    'garch': [0.02, 0.08, 0.90],
+    'gjr': [0.02, 0.04, 0.08, 0.88],
+    'ewma': [0.94]
+}
+
+
+def simulate(kind, params, rows, seed=0):
+    """Rendimientos (en %) de un proceso con la varianza del modelo y parámetros dados"""
+    rng = np.random.default_rng(seed)
+    if kind == 'ewma':
+        omega, alpha, gamma, beta = 0.001, 1 - params[0], 0.0, params[0]
+    elif kind == 'garch':
+        (omega, alpha, beta), gamma = params, 0.0
+    else:
+        omega, alpha, gamma, beta = params
+    shocks = rng.standard_normal(rows)
+    returns = np.empty(rows)
+    sigma2 = omega / max(1 - alpha - beta - gamma / 2, 1e-3)
+    for t in range(rows):
+        returns[t] = np.sqrt(sigma2) * shocks[t]
+        sigma2 = omega + (alpha + gamma * (returns[t] < 0)) * returns[t] ** 2 + beta * sigma2
+    return returns
+
+
+def loop_loglik(theta, kind, returns, initial):
+    """Referencia: -log verosimilitud con la recursión en un bucle de Python"""
+    if kind == 'garch':
+        (omega, alpha, beta), gamma = theta, 0.0
+    elif kind == 'gjr':
+        omega, alpha, gamma, beta = theta
+    else:
+        omega, alpha, gamma, beta = 0.0, 1 - theta[0], 0.0, theta[0]
+    sigma2, value = initial, 0.0
+    for r in returns:
+        value += 0.5 * (np.log(sigma2) + r * r / sigma2)
+        sigma2 = omega + (alpha + gamma * (r < 0)) * r * r + beta * sigma2
+    return value
+
+
+def loop_fit(returns, kind):
+    """Referencia: L-BFGS-B con la recursión en bucle y gradiente por diferencias finitas"""
+    from scipy.optimize import minimize
+    result = minimize(loop_loglik, _start(kind, returns), args=(kind, returns, backcast(returns)),
+                      method='L-BFGS-B', bounds=_bounds(kind, returns))
+    return dict(zip(PARAMETERS[kind], map(float, result.x)))
+
+
+def timed_call(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def compare(kind, returns, reference_rows):
+    """Ajuste vectorizado vs. referencia en bucle sobre las primeras `reference_rows` barras"""
+    model, vectorized = timed_call(fit, returns, kind)
+    reference_model, _ = timed_call(fit, returns[:reference_rows], kind)
+    reference, loop = timed_call(loop_fit, returns[:reference_rows], kind)
+    difference = max(abs(reference[name] - reference_model['params'][name]) for name in reference)
+    error = max(abs(model['params'][name] - value) for name, value in zip(PARAMETERS[kind], TRUE_PARAMS[kind]))
+    return {'rows': len(returns), 'fit_s': vectorized, 'iterations': model['iterations'],
+            'reference_rows': reference_rows, 'reference_fit_s': loop,
+            'max_param_difference': difference, 'max_param_error': error, 'params': model['params']}
+
+
+def rolling(kind, returns, window, step, workers):
+    """Reajuste en ventanas móviles con un proceso y con `workers`"""
+    serial, serial_s = timed_call(rolling_fit, returns, kind, window=window, step=step, n_jobs=1)
+    parallel, parallel_s = timed_call(rolling_fit, returns, kind, window=window, step=step, n_jobs=workers)
+    # Los bloques paralelos arrancan de otro punto inicial: se comparan las verosimilitudes del óptimo
+    matches = len(serial) == len(parallel) and all(abs(a['loglik'] - b['loglik']) <= 1e-6 * abs(a['loglik'])
+                                                   for a, b in zip(serial, parallel))
+    return {'fits': len(serial), 'serial_s': serial_s, 'parallel_s': parallel_s, 'workers': workers,
+            'per_fit_ms': 1000 * serial_s / len(serial), 'matches': matches}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de los modelos GARCH/GJR/EWMA vectorizados.')
+    parser.add_argument('--models', nargs='+', default=list(MODELS), choices=MODELS)
+    parser.add_argument('--rows', type=int, default=20_000, help='Rendimientos simulados por modelo')
+    parser.add_argument('--reference_rows', type=int, default=2_000, help='Barras del ajuste de referencia en bucle')
+    parser.add_argument('--window', type=int, default=2_000)
+    parser.add_argument('--step', type=int, default=24)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--output', type=str, help='Archivo JSON de resultados')
+    args = parser.parse_args()
+
+    # Calienta las importaciones de scipy para no cargarlas al primer ajuste medido
+    fit(simulate('garch', TRUE_PARAMS['garch'], 500), 'garch')
+    results = {}
+    for kind in args.models:
+        returns = simulate(kind, TRUE_PARAMS[kind], args.rows)
+        results[kind] = {'fit': compare(kind, returns, args.reference_rows),
+                         'rolling': rolling(kind, returns, args.window, args.step, args.workers)}
+        single, windows = results[kind]['fit'], results[kind]['rolling']
+        print(f"{kind:<6} ajuste {single['rows']} barras: {1000 * single['fit_s']:.1f} ms "
+              f"(referencia en bucle, {single['reference_rows']} barras: {1000 * single['reference_fit_s']:.1f} ms, "
+              f"diferencia máx. {single['max_param_difference']:.2e}); error vs. parámetros reales "
+              f"{single['max_param_error']:.4f}")
+        print(f"{'':<6} {windows['fits']} ventanas: {windows['serial_s']:.2f}s en serie, "
+              f"{windows['parallel_s']:.2f}s con {windows['workers']} procesos, coincide={windows['matches']}")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(RESULTS_DIR, f"volatility-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(output, 'w') as output_file:
+        json.dump({'args': vars(args), 'results': results}, output_file, indent=4)
+    print(f'Resultados guardados en {output}')
+    if not all(result['rolling']['matches'] for result in results.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,64 +1,461 @@
 import argparse
-import pandas as pd
-from src.collector import DataCollector
-from src.enricher import Enricher
-from src.modeller import Modeller
-from src.logger import logger
+import contextlib
+import sys
+from src.logger import configure_profiling, logger, timing_summary
+from src.utils.helpers import DEFAULT_SYMBOL, MemoryBudget, symbol_filename
 
-def main():
+# Cada comando importa solo los módulos que usa: pandas, sklearn o yfinance no se
+# cargan para `--help`, y `predict` con un modelo compilado no carga sklearn ni yfinance.
+COMMANDS = ['run', 'pipeline', 'collect', 'enrich', 'train', 'predict', 'export', 'serve']
+
+def build_parser():
     parser = argparse.ArgumentParser(description='Aplicación para recolectar, enriquecer y predecir datos históricos del palladium.')
-    parser.add_argument('--start_date', type=str, help='Fecha de inicio en formato YYYY-MM-DD')
-    parser.add_argument('--end_date', type=str, help='Fecha de fin en formato YYYY-MM-DD')
-    parser.add_argument('--train', action='store_true', help='Entrenar el modelo')
-    parser.add_argument('--predict', action='store_true', help='Realizar predicciones')
-    args = parser.parse_args()
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--symbols', nargs='+', default=[DEFAULT_SYMBOL], help='Símbolos a procesar (ej. PA=F PL=F GC=F SI=F)')
+    common.add_argument('--workers', type=int, default=4, help='Descargas y procesos de cálculo concurrentes')
+    common.add_argument('--no_cache', action='store_true', help='Recalcular KPIs y características sin usar el cache')
+    common.add_argument('--max_memory_mb', type=float, help='Falla si el pico de memoria del pipeline supera este presupuesto')
+    common.add_argument('--profile', choices=['cprofile', 'tracemalloc'], help='Perfilar cada etapa (perfiles en docs/logs/profiles)')
+    common.add_argument('--store_format', choices=['arrow', 'parquet'], default='arrow',
+                        help='Formato del almacenamiento columnar particionado por mes (el CSV queda solo como exportación)')
+
+    download = argparse.ArgumentParser(add_help=False)
+    download.add_argument('--start_date', type=str, help='Fecha de inicio en formato YYYY-MM-DD')
+    download.add_argument('--end_date', type=str, help='Fecha de fin en formato YYYY-MM-DD')
+    download.add_argument('--resume', action='store_true', help='Descargar solo las barras posteriores a la última guardada')
+    download.add_argument('--source_file', type=str, help='CSV local a reproducir en lugar de Yahoo Finance')
+    download.add_argument('--interval', choices=['1m', '5m', '15m', '30m', '1h', '1d'],
+                          help='Resolución a descargar (por defecto 1h con fechas, 1d sin ellas); las de minutos se guardan en el almacenamiento de barras')
+    download.add_argument('--rate_limit', type=float, help='Solicitudes por segundo a la fuente (por defecto, el de la fuente)')
+
+    training = argparse.ArgumentParser(add_help=False)
+    training.add_argument('--incremental', action='store_true', help='Actualizar el modelo vigente solo con las barras nuevas')
+    training.add_argument('--walk_forward', action='store_true', help='Entrenar evaluando la grilla de hiperparámetros con validación walk-forward')
+    training.add_argument('--folds', type=int, default=5, help='Folds de la validación walk-forward')
+    training.add_argument('--backend', choices=['forest', 'garch', 'gjr', 'ewma'], default='forest',
+                          help='Modelo de volatilidad: RandomForest o econométrico (GARCH, GJR-GARCH, EWMA)')
+
+    quality = argparse.ArgumentParser(add_help=False)
+    quality.add_argument('--fill', choices=['ffill'], help='Insertar las barras que faltan según el calendario de los futuros')
+    quality.add_argument('--drop_flat', action='store_true', help='Descartar las barras planas sin volumen (relleno de la fuente)')
+    quality.add_argument('--resample', choices=['1m', '5m', '15m', '30m', '1h', '4h', '1d'],
+                         help='Agregar las barras validadas a esta resolución antes de enriquecerlas')
+
+    chunking = argparse.ArgumentParser(add_help=False)
+    chunking.add_argument('--chunk_rows', type=int,
+                          help='Procesar el histórico por bloques de este número de barras (históricos más grandes que la memoria)')
+    chunking.add_argument('--float32', action='store_true', help='Guardar en memoria los bloques y las características en float32 (mitad de memoria, ~7 cifras significativas)')
+
+    window = argparse.ArgumentParser(add_help=False)
+    window.add_argument('--from_date', type=str, help='Primera barra a usar (YYYY-MM-DD), leída por rango sin red')
+    window.add_argument('--to_date', type=str, help='Última barra a usar (YYYY-MM-DD)')
+
+    commands = parser.add_subparsers(dest='command', metavar='comando')
+    run = commands.add_parser('run', parents=[common, download, training, quality],
+                              help='Pipeline completo (comando por defecto): descargar, enriquecer, guardar y opcionalmente entrenar/predecir')
+    run.add_argument('--train', action='store_true', help='Entrenar el modelo')
+    run.add_argument('--predict', action='store_true', help='Realizar predicciones')
+    run.add_argument('--export', action='store_true', help='Actualizar y exportar las tablas de los tableros de Power BI')
+    pipeline = commands.add_parser('pipeline', parents=[common, download, training, quality],
+                                   help='Pipeline como grafo de etapas: escrituras y preparación en paralelo, etapas sin cambios se saltan')
+    pipeline.add_argument('--train', action='store_true', help='Entrenar el modelo')
+    pipeline.add_argument('--predict', action='store_true', help='Realizar predicciones')
+    pipeline.add_argument('--export', action='store_true', help='Actualizar y exportar las tablas de los tableros de Power BI')
+    pipeline.add_argument('--only', nargs='+', metavar='ETAPA', help='Ejecutar solo estas etapas (ej. prepare train)')
+    pipeline.add_argument('--from', dest='from_stage', metavar='ETAPA', help='Ejecutar desde esta etapa y las que dependen de ella')
+    pipeline.add_argument('--force', action='store_true', help='Ejecutar las etapas seleccionadas aunque sus entradas no cambien')
+    commands.add_parser('collect', parents=[common, download, quality], help='Descargar barras y guardarlas en historical.db')
+    enrich = commands.add_parser('enrich', parents=[common, window, quality, chunking], help='Calcular KPIs del histórico guardado y exportar el CSV')
+    enrich.add_argument('--timeframe', choices=['1m', '5m', '15m', '30m', '1h', '4h', '1d'],
+                        help='Calcular los KPIs sobre las barras de minutos agregadas a esta resolución')
+    enrich.add_argument('--base', default='1m', choices=['1m', '5m', '15m', '30m'], help='Resolución base de las barras guardadas')
+    enrich.add_argument('--kpi_windows', nargs=3, metavar=('VENTANA', 'RSI', 'MOMENTUM'),
+                        help="Ventanas de los KPIs en barras (20) o en tiempo ('20h')")
+    commands.add_parser('train', parents=[common, training, window, chunking], help='Entrenar el modelo con el histórico guardado')
+    commands.add_parser('predict', parents=[common, window, chunking], help='Predecir con el modelo vigente (compilado si existe)')
+    export = commands.add_parser('export', parents=[common],
+                                 help='Actualizar las tablas pre-agregadas de los tableros (solo los períodos con barras nuevas) y exportarlas a Parquet')
+    export.add_argument('--force', action='store_true', help='Reescribir los Parquet aunque no haya períodos para recalcular')
+    serve = commands.add_parser('serve', parents=[common], help='Servir predicciones por HTTP con el modelo del primer símbolo')
+    serve.add_argument('--port', type=int, default=8000, help='Puerto del servidor de predicción')
+    return parser
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    # Sin comando se ejecuta el pipeline completo, como en las versiones anteriores
+    if not argv or (argv[0] not in COMMANDS and argv[0] not in ('-h', '--help')):
+        argv = ['run'] + argv
+    args = build_parser().parse_args(argv)
+
+    if args.command == 'serve':
+        return serve(args)
+
+    configure_profiling(args.profile)
+    handler = {'run': run_pipeline, 'pipeline': run_graph, 'collect': collect, 'enrich': enrich,
+               'train': train, 'predict': predict, 'export': export}[args.command]
+    budget = MemoryBudget(args.max_memory_mb * 1024 ** 2) if args.max_memory_mb else contextlib.nullcontext()
+    with budget:
+        handler(args)
+    if args.max_memory_mb:
+        logger.info(f"Pico de memoria del pipeline: {budget.peak / 1024 ** 2:.1f} MB")
+    logger.info("\nResumen de etapas:\n" + timing_summary())
+
+def _source(args):
+    from src.sources import LocalFileSource
+    return LocalFileSource(args.source_file) if args.source_file else None
+
+def _cache(args):
+    if args.no_cache:
+        return None
+    from src.cache import ResultCache
+    return ResultCache(logger)
+
+def _collector(args, symbol, source=None):
+    from src.collector import DataCollector
+    return DataCollector(source=source, symbol=symbol, store_format=args.store_format)
+
+def _checked(args, frames):
+    """Etapa de calidad entre la recolección y el enriquecimiento (orden, repetidas, planas, huecos)"""
+    from src.quality import check_frames
+    frames, _ = check_frames(frames, logger, fill=args.fill, resample=args.resample, drop_flat=args.drop_flat)
+    return frames
+
+def _load_histories(args, symbols):
+    return {symbol: _collector(args, symbol).load_history() for symbol in symbols}
+
+def collect(args):
+    """Descarga y guarda las barras nuevas (los KPIs se calculan con `enrich`)"""
+    from src.collector import download_symbols
+    from src.timeframes import INTRADAY
+    source = _source(args)
+    raw_frames = download_symbols(args.symbols, source=source, max_workers=args.workers, rate_limit=args.rate_limit,
+                                  store_format=args.store_format, interval=args.interval,
+                                  start_date=args.start_date, end_date=args.end_date, resume=args.resume)
+    raw_frames = _checked(args, raw_frames)
+    if args.interval in INTRADAY:
+        # Las barras de minutos se guardan una vez; las resoluciones mayores se derivan al leerlas
+        for symbol, raw_df in raw_frames.items():
+            _collector(args, symbol, source).save_bars(raw_df, args.interval)
+        return
+    last = {symbol: _collector(args, symbol, source).last_stored_datetime() for symbol in args.symbols} \
+        if args.resume else {}
+    from src.collector import RAW_COLUMNS
+    for symbol, raw_df in raw_frames.items():
+        # Con resume solo se escriben las barras posteriores a la última guardada
+        if last.get(symbol) is not None:
+            raw_df = raw_df[raw_df.index > last[symbol]]
+        # Solo las columnas de la fuente: las barras ya guardadas conservan los KPIs calculados
+        collector = _collector(args, symbol, source)
+        collector.save_to_db(raw_df, columns=RAW_COLUMNS)
+        collector.save_to_store(raw_df, columns=RAW_COLUMNS)
+
+def _kpi_windows(args):
+    windows = args.kpi_windows or ['20', '14', '14']
+    return [int(window) if window.isdigit() else window for window in windows]
+
+def enrich(args):
+    from src.enricher import Enricher
+    enricher = Enricher(logger, *_kpi_windows(args))
+    if args.chunk_rows:
+        return enrich_chunked(args, enricher)
+    if args.timeframe:
+        return enrich_timeframe(args, enricher)
+    histories = _checked(args, {symbol: _collector(args, symbol).load_history(args.from_date, args.to_date)
+                                for symbol in args.symbols})
+    enriched_frames = enricher.enrich_many(histories, max_workers=args.workers, cache=_cache(args))
+    for symbol, enriched_df in enriched_frames.items():
+        collector = _collector(args, symbol)
+        collector.save_to_db(enriched_df)
+        collector.save_to_store(enriched_df)
+        collector.save_to_csv(enriched_df)
+
+def enrich_timeframe(args, enricher):
+    """KPIs sobre las barras de minutos agregadas a `--timeframe`, guardados en kpis-<símbolo>-<resolución>"""
+    from src.storage import PartitionedStore
+    bars = {f'{symbol}@{args.timeframe}': _collector(args, symbol).bar_store(args.base)
+            .bars(args.timeframe, start=args.from_date, end=args.to_date) for symbol in args.symbols}
+    bars = _checked(args, bars)
+    enriched_frames = enricher.enrich_many(bars, max_workers=args.workers, cache=_cache(args))
+    for key, enriched_df in enriched_frames.items():
+        symbol = key.split('@')[0]
+        PartitionedStore(f'kpis-{symbol}-{args.timeframe}', format=args.store_format, logger=logger).write(enriched_df)
+
+def enrich_chunked(args, enricher):
+    """
+    KPIs por bloques de --chunk_rows barras: cada bloque enriquecido se escribe en
+    cuanto está listo, así la memoria depende del bloque y no del histórico
+    """
+    from src.storage import PartitionedStore
+    dtype = _dtype(args)
+    for symbol in args.symbols:
+        collector = _collector(args, symbol)
+        if args.timeframe:
+            frames = collector.bar_store(args.base).iter_bars(args.timeframe, args.chunk_rows, args.from_date,
+                                                              args.to_date, dtype=dtype)
+            output = PartitionedStore(f'kpis-{symbol}-{args.timeframe}', format=args.store_format, logger=logger)
+        else:
+            frames = collector.iter_history(args.chunk_rows, args.from_date, args.to_date, dtype=dtype)
+            output = None
+        for position, enriched_df in enumerate(enricher.enrich_chunked(frames, dtype=dtype)):
+            if output is not None:
+                output.write(enriched_df)
+                continue
+            collector.save_to_db(enriched_df)
+            # Sin almacenamiento columnar todavía, los lectores siguen usando historical.db
+            if collector.store is not None and collector.store.exists():
+                collector.save_to_store(enriched_df)
+            collector.save_to_csv(enriched_df, append=position > 0)
+
+def _dtype(args):
+    return 'float32' if getattr(args, 'float32', False) else 'float64'
+
+def _prepared(symbol, history, cache, store=None, start=None, end=None, backend='forest', chunk_rows=None,
+              dtype='float64'):
+    from src.modeller import Modeller
+    modeller = Modeller(logger, symbol=symbol, backend=backend)
+    prepared_df, success = modeller.preparar_df(history, cache=cache, store=store, start=start, end=end,
+                                                chunk_rows=chunk_rows, dtype=dtype)
+    if not success:
+        logger.error(f"Error al preparar los datos para el modelo de {symbol}")
+        return modeller, None
+    return modeller, prepared_df
+
+def _prepared_stored(args, symbol, cache):
+    """Prepara desde el almacenamiento columnar (memory-map) o, si aún no existe, desde historical.db"""
+    collector = _collector(args, symbol)
+    # predict no tiene --backend: el backend del modelo vigente se lee de sus metadatos
+    backend = getattr(args, 'backend', 'forest')
+    if args.chunk_rows:
+        # Por bloques desde el almacenamiento columnar o, si no existe, con un cursor sobre historical.db
+        return _prepared(symbol, None, cache, store=collector, start=args.from_date, end=args.to_date,
+                         backend=backend, chunk_rows=args.chunk_rows, dtype=_dtype(args))
+    if collector.store is not None and collector.store.exists():
+        return _prepared(symbol, None, cache, store=collector.store, start=args.from_date, end=args.to_date,
+                         backend=backend, dtype=_dtype(args))
+    return _prepared(symbol, collector.load_history(args.from_date, args.to_date), cache, backend=backend,
+                     dtype=_dtype(args))
+
+def train(args):
+    cache = _cache(args)
+    for symbol in args.symbols:
+        modeller, prepared_df = _prepared_stored(args, symbol, cache)
+        if prepared_df is not None:
+            train_symbol(args, symbol, modeller, prepared_df)
+
+def predict(args):
+    cache = _cache(args)
+    for symbol in args.symbols:
+        modeller, prepared_df = _prepared_stored(args, symbol, cache)
+        if prepared_df is not None:
+            predict_symbol(args, symbol, modeller, prepared_df)
+
+def export(args):
+    from src.exporter import DashboardExporter
+    DashboardExporter(logger=logger).run(args.symbols, force=args.force)
+
+def serve(args):
+    from src.modeller import Modeller
+    from src.server import run_server
+    symbol = args.symbols[0]
+    history = _load_histories(args, [symbol])[symbol]
+    run_server(logger, Modeller(logger, symbol=symbol), history, port=args.port)
+
+def run_pipeline(args):
+    from src.collector import download_symbols
+    from src.enricher import Enricher
+    from src.timeframes import INTRADAY
+
+    if args.interval in INTRADAY:
+        logger.error(f"El pipeline completo usa historical.db (resolución horaria): use 'collect --interval {args.interval}' "
+                     f"y 'enrich --timeframe' para barras de minutos")
+        return
 
     # Inicializar componentes
-    collector = DataCollector()
+    source = _source(args)
     enricher = Enricher(logger)
-    modeller = Modeller(logger)
-
-    # Descargar datos
-    raw_data = collector.download_data(start_date=args.start_date, end_date=args.end_date)
-    
-    # Enriquecer datos con KPIs
-    enriched_data = enricher.enrich_data(raw_data)
-    
-    # Guardar datos enriquecidos
-    collector.save_to_db(enriched_data)
-    collector.save_to_csv(enriched_data)
 
-    # Convertir a DataFrame para el modelo
-    df = pd.DataFrame(enriched_data)
-    df.set_index('datetime', inplace=True)
+    # Descargar datos de todos los símbolos en paralelo
+    raw_frames = download_symbols(args.symbols, source=source, max_workers=args.workers, rate_limit=args.rate_limit,
+                                  store_format=args.store_format, interval=args.interval,
+                                  start_date=args.start_date, end_date=args.end_date, resume=args.resume)
+
+    # Validar y limpiar las barras antes de calcular ventanas móviles sobre ellas
+    raw_frames = _checked(args, raw_frames)
+
+    # Enriquecer datos con KPIs (un proceso por símbolo)
+    cache = _cache(args)
+    enriched_frames = enricher.enrich_many(raw_frames, max_workers=args.workers, cache=cache)
+
+    for symbol, enriched_df in enriched_frames.items():
+        run_symbol(args, symbol, enriched_df, source, cache)
+
+    if args.export:
+        from src.exporter import DashboardExporter
+        DashboardExporter(logger=logger).run(args.symbols)
+
+def run_symbol(args, symbol, enriched_df, source, cache):
+    collector = _collector(args, symbol, source)
+
+    # Guardar datos enriquecidos
+    collector.save_to_db(enriched_df)
+    collector.save_to_store(enriched_df)
+    collector.save_to_csv(enriched_df)
 
     # Preparar datos para el modelo
-    prepared_df, success = modeller.preparar_df(df)
-    if not success:
-        logger.error("Error al preparar los datos para el modelo")
+    modeller, prepared_df = _prepared(symbol, enriched_df, cache, backend=args.backend)
+    if prepared_df is None:
         return
 
-    if args.train:
-        # Entrenar el modelo
-        logger.info("Iniciando entrenamiento del modelo...")
-        _, success = modeller.entrenar_df(prepared_df)
-        if success:
-            logger.info("Modelo entrenado exitosamente")
-        else:
-            logger.error("Error en el entrenamiento del modelo")
-            return
+    if args.train and not train_symbol(args, symbol, modeller, prepared_df):
+        return
 
     if args.predict:
-        # Realizar predicciones
-        logger.info("Realizando predicciones...")
-        df_predicciones, success, ultimo_valor, ultima_fecha, _ = modeller.predecir_df(prepared_df)
-        if success:
-            logger.info(f"Última predicción de volatilidad: {ultimo_valor:.4f} para la fecha {ultima_fecha}")
-            # Guardar predicciones
-            df_predicciones.to_csv('src/palladium/static/data/predictions.csv')
-            logger.info("Predicciones guardadas en 'predictions.csv'")
+        predict_symbol(args, symbol, modeller, prepared_df)
+
+def train_symbol(args, symbol, modeller, prepared_df):
+    # Entrenar el modelo
+    logger.info(f"Iniciando entrenamiento del modelo de {symbol}...")
+    if args.incremental:
+        _, success = modeller.reentrenar_df(prepared_df, n_jobs=args.workers)
+    else:
+        _, success = modeller.entrenar_df(prepared_df, walk_forward=args.walk_forward,
+                                          n_folds=args.folds, n_jobs=args.workers)
+    if success:
+        logger.info("Modelo entrenado exitosamente")
+    else:
+        logger.error("Error en el entrenamiento del modelo")
+    return success
+
+def predict_symbol(args, symbol, modeller, prepared_df):
+    """Predice, guarda las predicciones y las devuelve (None si falla)"""
+    # Realizar predicciones
+    logger.info(f"Realizando predicciones de {symbol}...")
+    df_predicciones, success, ultimo_valor, ultima_fecha, _ = modeller.predecir_df(prepared_df)
+    if success:
+        logger.info(f"Última predicción de volatilidad de {symbol}: {ultimo_valor:.4f} para la fecha {ultima_fecha}")
+        # Guardar predicciones: solo se reescriben los meses que cambiaron; el CSV es la exportación
+        from src.storage import PartitionedStore
+        PartitionedStore(f'predictions-{symbol}', format=args.store_format, logger=logger).write(df_predicciones)
+        predictions_file = symbol_filename('predictions', symbol, 'csv')
+        df_predicciones.to_csv(f'src/palladium/static/data/{predictions_file}')
+        # Tabla predictions de historical.db, de la que sale el error por período de los tableros
+        _collector(args, symbol).save_predictions(df_predicciones, realized='target_volatility')
+        logger.info(f"Predicciones guardadas en '{predictions_file}'")
+        return df_predicciones
+    logger.error("Error al realizar las predicciones")
+    return None
+
+def _one_or_tuple(values):
+    """Salidas de una etapa: el valor si es uno solo, si no la tupla"""
+    return values[0] if len(values) == 1 else tuple(values)
+
+def _stage_enrich(args, symbol, raw_df, options):
+    from src.enricher import Enricher
+    checked = _checked(args, {symbol: raw_df})[symbol]
+    cache = _cache(args)
+    enricher = Enricher(logger)
+    return enricher.enrich_cached(checked, cache, f'kpis-{symbol}') if cache else enricher.enrich_data(checked)
+
+def _stage_prepare(args, symbol, enriched_df, backend):
+    _, prepared_df = _prepared(symbol, enriched_df, _cache(args), backend=backend)
+    if prepared_df is None:
+        raise RuntimeError(f'No se pudieron preparar las características de {symbol}')
+    return prepared_df
+
+def _stage_train(args, symbol, prepared_df, options):
+    from src.modeller import Modeller
+    modeller = Modeller(logger, symbol=symbol, backend=args.backend)
+    if not train_symbol(args, symbol, modeller, prepared_df):
+        raise RuntimeError(f'Falló el entrenamiento del modelo de {symbol}')
+    return modeller.registry.latest_version()
+
+def _model_version(args, symbol):
+    from src.modeller import Modeller
+    return Modeller(logger, symbol=symbol, backend=args.backend).registry.latest_version()
+
+def _stage_predict(args, symbol, prepared_df, version):
+    from src.modeller import Modeller
+    if predict_symbol(args, symbol, Modeller(logger, symbol=symbol, backend=args.backend), prepared_df) is None:
+        raise RuntimeError(f'Fallaron las predicciones de {symbol}')
+
+def _stage_export(args, *_):
+    from src.exporter import DashboardExporter
+    return DashboardExporter(logger=logger).run(args.symbols)
+
+def pipeline_stages(args):
+    """
+    Grafo de etapas del pipeline. Por símbolo: enrich -> (save_db, save_store,
+    save_csv, prepare) en paralelo -> train/model -> predict; al final, export.
+    """
+    from functools import partial
+    from src.collector import download_symbols
+    from src.pipeline import Stage
+
+    symbols = args.symbols
+    source = _source(args)
+
+    def download():
+        frames = download_symbols(symbols, source=source, max_workers=args.workers, rate_limit=args.rate_limit,
+                                  store_format=args.store_format, interval=args.interval,
+                                  start_date=args.start_date, end_date=args.end_date, resume=args.resume)
+        return _one_or_tuple([frames[symbol] for symbol in symbols])
+
+    def stored():
+        return _one_or_tuple([_collector(args, symbol).load_history() for symbol in symbols])
+
+    # La descarga siempre se ejecuta: sin barras nuevas, su salida no cambia y el resto se salta
+    stages = [Stage('download', download, outputs=[f'raw:{symbol}' for symbol in symbols], pool=None,
+                    always=True, load=stored)]
+    for symbol in symbols:
+        collector = _collector(args, symbol, source)
+        enriched = f'enriched:{symbol}'
+        stages += [
+            # Con varios símbolos el cálculo de KPIs va a un pool de procesos, como en enrich_many
+            Stage(f'enrich:{symbol}', partial(_stage_enrich, args, symbol), [f'raw:{symbol}', 'options:enrich'],
+                  [enriched], pool='process' if len(symbols) > 1 else 'thread'),
+            Stage(f'save_db:{symbol}', collector.save_to_db, [enriched], [f'db:{symbol}']),
+            Stage(f'save_store:{symbol}', collector.save_to_store, [enriched], [f'store:{symbol}']),
+            Stage(f'save_csv:{symbol}', collector.save_to_csv, [enriched], [f'csv:{symbol}']),
+        ]
+        if not (args.train or args.predict):
+            continue
+        stages.append(Stage(f'prepare:{symbol}', partial(_stage_prepare, args, symbol), [enriched, 'options:model'],
+                            [f'features:{symbol}']))
+        version = partial(_model_version, args, symbol)
+        if args.train:
+            # El entrenamiento ya reparte su trabajo en procesos (n_jobs): corre en el hilo principal
+            stages.append(Stage(f'train:{symbol}', partial(_stage_train, args, symbol),
+                                [f'features:{symbol}', 'options:train'], [f'model:{symbol}'], pool=None, load=version))
         else:
-            logger.error("Error al realizar las predicciones")
+            stages.append(Stage(f'model:{symbol}', version, outputs=[f'model:{symbol}'], pool=None, always=True))
+        if args.predict:
+            stages.append(Stage(f'predict:{symbol}', partial(_stage_predict, args, symbol),
+                                [f'features:{symbol}', f'model:{symbol}'], [f'predicted:{symbol}']))
+    if args.export:
+        # Las escrituras no devuelven valor: export solo depende de ellas, no recibe los datos
+        inputs = [f'db:{symbol}' for symbol in symbols] + [f'predicted:{symbol}' for symbol in symbols if args.predict]
+        stages.append(Stage('export', partial(_stage_export, args), inputs, ['dashboard']))
+    return stages
+
+def run_graph(args):
+    from src.pipeline import Pipeline
+    from src.timeframes import INTRADAY
+
+    if args.interval in INTRADAY:
+        logger.error(f"El pipeline usa historical.db (resolución horaria): use 'collect --interval {args.interval}' "
+                     f"y 'enrich --timeframe' para barras de minutos")
+        return
+    params = {
+        'options:enrich': {'fill': args.fill, 'resample': args.resample, 'drop_flat': args.drop_flat},
+        'options:model': args.backend,
+        'options:train': {'backend': args.backend, 'incremental': args.incremental,
+                          'walk_forward': args.walk_forward, 'folds': args.folds}
+    }
+    pipeline = Pipeline(pipeline_stages(args), logger, max_workers=args.workers)
+    try:
+        pipeline.run(params, only=args.only, start=args.from_stage, force=args.force)
+    except ValueError as e:
+        logger.error(f'Pipeline: {e}')
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -14,6 +14,9 @@ setup(
         "python-dotenv",
         "yfinance",
         "scikit-learn",
+        "scipy",
+        "joblib",
+        "pyarrow",
         "statsmodels",
         "matplotlib",
         "seaborn",     
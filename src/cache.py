@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from src.features import FEATURE_SPEC_VERSION
+from src.utils.helpers import symbol_slug
+
+CACHE_DIR = 'src/palladium/static/cache'
+
+# Resultado de una consulta al cache:
+# - frame: resultados guardados (alineados con las primeras filas de la entrada)
+# - rows: filas de la entrada cuyos resultados siguen siendo válidos
+# - complete: la entrada coincide completamente con la guardada
+# - state: estado incremental asociado a `rows` (por ejemplo el de OnlineEnricher)
+CacheHit = namedtuple('CacheHit', ['frame', 'rows', 'complete', 'state'])
+
+
+def fingerprint(df, columns, rows=None):
+    """Huella (blake2b) del índice y las columnas de las primeras `rows` filas"""
+    rows = len(df) if rows is None else rows
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(df.index[:rows].to_numpy(dtype='datetime64[ns]').tobytes())
+    for column in columns:
+        digest.update(np.ascontiguousarray(df[column].to_numpy(dtype='float64')[:rows]).tobytes())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Cache en disco (NPZ) de KPIs y características calculados sobre barras OHLCV.
+    Cada entrada se identifica por nombre, versión de las especificaciones y la
+    primera fecha del rango. Al agregar barras nuevas solo se invalida la cola: las
+    filas estables se reutilizan si su huella coincide. El tamaño total se limita
+    eliminando las entradas usadas hace más tiempo (LRU por fecha de modificación).
+    """
+
+    def __init__(self, logger, cache_dir=CACHE_DIR, max_bytes=512 * 1024 ** 2):
+        self.logger = logger
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, name, df, version):
+        first = str(df.index[0]) if len(df) else ''
+        key = hashlib.blake2b(f'{name}|{version}|{FEATURE_SPEC_VERSION}|{first}'.encode(), digest_size=8).hexdigest()
+        return os.path.join(self.cache_dir, f'{symbol_slug(name)}-{key}.npz')
+
+    def load(self, name, df, columns, version=''):
+        """Busca resultados para `df`; devuelve un CacheHit o None si no hay nada reutilizable"""
+        path = self._path(name, df, version)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as entry:
+                rows = int(entry['rows'])
+                stable_rows = int(entry['stable_rows'])
+                frame = pd.DataFrame(entry['values'], columns=entry['columns'].tolist(),
+                                     index=pd.DatetimeIndex(entry['index']))
+                meta = json.loads(str(entry['meta']))
+        except Exception as e:
+            self.logger.warning(f'Entrada de cache ilegible, se descarta: {path} ({e})')
+            os.remove(path)
+            return None
+
+        os.utime(path)
+        if len(df) == rows and fingerprint(df, columns) == meta['fingerprint']:
+            return CacheHit(frame, rows, True, meta['state'])
+        if len(df) >= stable_rows > 0 and fingerprint(df, columns, stable_rows) == meta['stable_fingerprint']:
+            return CacheHit(frame.iloc[:stable_rows], stable_rows, False, meta['state'])
+        return None
+
+    def save(self, name, df, columns, results, version='', stable_rows=None, state=None):
+        """
+        Guarda `results` (alineado con `df`). `stable_rows` indica cuántas filas de la
+        entrada se consideran definitivas (la última barra puede ser revisada por la fuente).
+        """
+        stable_rows = len(df) - 1 if stable_rows is None else stable_rows
+        path = self._path(name, df, version)
+        meta = {
+            'fingerprint': fingerprint(df, columns),
+            'stable_fingerprint': fingerprint(df, columns, stable_rows),
+            'state': state
+        }
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path,
+                 values=results.to_numpy(dtype='float64'),
+                 columns=np.array(results.columns, dtype=str),
+                 index=results.index.to_numpy(dtype='datetime64[ns]'),
+                 rows=len(df),
+                 stable_rows=stable_rows,
+                 meta=json.dumps(meta))
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self):
+        """Elimina las entradas menos usadas hasta respetar el tamaño máximo"""
+        entries = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir) if name.endswith('.npz')]
+        entries.sort(key=os.path.getmtime)
+        total = sum(os.path.getsize(path) for path in entries)
+        while entries and total > self.max_bytes:
+            path = entries.pop(0)
+            total -= os.path.getsize(path)
+            os.remove(path)
+            self.logger.info(f'Entrada de cache eliminada por tamaño: {path}')
@@ -1,142 +1,638 @@
 import sqlite3
+import numpy as np
 import pandas as pd
 import csv
 import logging
-from datetime import datetime
-import yfinance as yf
+from datetime import datetime, timedelta
 import os
 import argparse
-import time
-from src.logger import logger
-from src.utils.helpers import create_file
+from src.logger import add_bytes, logger, timed
+from src.quality import deduplicate
+from src.scheduler import DownloadScheduler
+from src.sources import LocalFileSource, YahooFinanceSource, exchange_time
+from src.storage import STORE_DIR, PartitionedStore
+from src.timeframes import INTRADAY, BarStore
+from src.utils.helpers import DEFAULT_SYMBOL, create_file, symbol_filename
+
+DATETIME_FORMAT = '%Y-%m-%d-%H'
+
+# Nombres de columnas de la fuente -> nombres usados en el pipeline
+COLUMN_MAPPING = {
+    'Open': 'open',
+    'High': 'high',
+    'Low': 'low',
+    'Close': 'close',
+    'Volume': 'volume',
+    'Dividends': 'dividends',
+    'Stock Splits': 'stock_splits'
+}
+
+DATA_DIR = 'src/palladium/static/data'
+
+DB_COLUMNS = ['datetime', 'open', 'high', 'low', 'close', 'volume', 'dividends', 'stock_splits',
+              'volatility', 'SMA_20', 'EMA_20', 'RSI', 'daily_return', 'cumulative_return', 'momentum']
+
+# Columnas que trae la fuente (sin KPIs): `collect` solo escribe estas
+RAW_COLUMNS = DB_COLUMNS[1:8]
+
+# Período descargado por resolución cuando no se indican fechas (límites de Yahoo para minutos)
+DEFAULT_PERIODS = {'1m': '7d', '5m': '60d', '15m': '60d', '30m': '60d', '1h': '1y', '1d': '1y'}
+
+# Migraciones del esquema (versión, sentencias). Solo se agregan al final, nunca se modifican.
+MIGRATIONS = [
+    (1, ['''CREATE TABLE IF NOT EXISTS historical (
+            datetime TEXT PRIMARY KEY,
+            open REAL,
+            high REAL,
+            low REAL,
+            close REAL,
+            volume REAL,
+            dividends REAL,
+            stock_splits REAL,
+            volatility REAL,
+            SMA_20 REAL,
+            EMA_20 REAL,
+            RSI REAL,
+            daily_return REAL,
+            cumulative_return REAL,
+            momentum REAL)''']),
+    # Clave por símbolo: se reconstruye la tabla conservando los datos existentes del paladio
+    (2, ['''CREATE TABLE historical_v2 (
+            symbol TEXT NOT NULL,
+            datetime TEXT NOT NULL,
+            open REAL,
+            high REAL,
+            low REAL,
+            close REAL,
+            volume REAL,
+            dividends REAL,
+            stock_splits REAL,
+            volatility REAL,
+            SMA_20 REAL,
+            EMA_20 REAL,
+            RSI REAL,
+            daily_return REAL,
+            cumulative_return REAL,
+            momentum REAL,
+            PRIMARY KEY (symbol, datetime))''',
+         f'''INSERT INTO historical_v2 (symbol, {", ".join(DB_COLUMNS)})
+             SELECT '{DEFAULT_SYMBOL}', {", ".join(DB_COLUMNS)} FROM historical''',
+         'DROP TABLE historical',
+         'ALTER TABLE historical_v2 RENAME TO historical']),
+    # Marca de tiempo entera (epoch en segundos) e índice de cobertura para lecturas por rango
+    (3, ['ALTER TABLE historical ADD COLUMN ts INTEGER',
+         '''UPDATE historical SET ts = CAST(strftime('%s', substr(datetime, 1, 10) || ' ' ||
+                                                       substr(datetime, 12, 2) || ':00:00') AS INTEGER)''',
+         'CREATE INDEX IF NOT EXISTS idx_historical_symbol_ts ON historical (symbol, ts, open, high, low, close, volume)']),
+    # Predicciones y tablas pre-agregadas para los tableros (src/exporter.py). dashboard_dirty guarda,
+    # por símbolo y origen, la barra más antigua escrita desde la última actualización de los tableros
+    (4, ['''CREATE TABLE IF NOT EXISTS predictions (
+            symbol TEXT NOT NULL,
+            datetime TEXT NOT NULL,
+            ts INTEGER NOT NULL,
+            prediction REAL,
+            realized REAL,
+            PRIMARY KEY (symbol, ts))''',
+         '''CREATE TABLE IF NOT EXISTS dashboard_dirty (
+            symbol TEXT NOT NULL,
+            source TEXT NOT NULL,
+            from_ts INTEGER NOT NULL,
+            PRIMARY KEY (symbol, source))''',
+         '''INSERT OR REPLACE INTO dashboard_dirty (symbol, source, from_ts)
+            SELECT symbol, 'historical', MIN(ts) FROM historical GROUP BY symbol''',
+         '''CREATE TABLE IF NOT EXISTS dashboard_ohlc (
+            symbol TEXT NOT NULL,
+            period TEXT NOT NULL,
+            bucket_ts INTEGER NOT NULL,
+            bucket TEXT,
+            open REAL,
+            high REAL,
+            low REAL,
+            close REAL,
+            volume REAL,
+            bars INTEGER,
+            PRIMARY KEY (symbol, period, bucket_ts))''',
+         '''CREATE TABLE IF NOT EXISTS dashboard_kpis (
+            symbol TEXT NOT NULL,
+            period TEXT NOT NULL,
+            bucket_ts INTEGER NOT NULL,
+            bucket TEXT,
+            period_return REAL,
+            volatility_mean REAL,
+            volatility_max REAL,
+            rsi_mean REAL,
+            rsi_min REAL,
+            rsi_max REAL,
+            SMA_20 REAL,
+            EMA_20 REAL,
+            momentum REAL,
+            cumulative_return REAL,
+            PRIMARY KEY (symbol, period, bucket_ts))''',
+         '''CREATE TABLE IF NOT EXISTS dashboard_prediction_error (
+            symbol TEXT NOT NULL,
+            period TEXT NOT NULL,
+            bucket_ts INTEGER NOT NULL,
+            bucket TEXT,
+            predictions INTEGER,
+            prediction_mean REAL,
+            realized_mean REAL,
+            mae REAL,
+            rmse REAL,
+            bias REAL,
+            PRIMARY KEY (symbol, period, bucket_ts))''',
+         '''CREATE TABLE IF NOT EXISTS dashboard_latest (
+            symbol TEXT PRIMARY KEY,
+            datetime TEXT,
+            close REAL,
+            daily_return REAL,
+            volatility REAL,
+            RSI REAL,
+            SMA_20 REAL,
+            EMA_20 REAL,
+            momentum REAL,
+            prediction_datetime TEXT,
+            prediction REAL,
+            updated_at TEXT)''']),
+]
+
+# Columnas OHLCV incluidas en el índice de cobertura (se leen sin tocar la tabla)
+OHLCV_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+# Agregaciones soportadas por resample: frecuencia -> (segundos del período, desplazamiento)
+# Las semanas empiezan el lunes: el epoch (1970-01-01) fue jueves, tres días después de un lunes
+RESAMPLE_PERIODS = {
+    '1D': (86400, 0),
+    '1W': (7 * 86400, 3 * 86400)
+}
 
 class DataCollector:
-    def __init__(self, db_path='src/palladium/static/data/historical.db', csv_path='src/palladium/static/data/historical.csv'):
+    def __init__(self, db_path='src/palladium/static/data/historical.db', csv_path=None, source=None, symbol=DEFAULT_SYMBOL,
+                 store_format='arrow', store_root=None):
+        self.symbol = symbol
         self.db_path = db_path
-        self.csv_path = csv_path
+        self.csv_path = csv_path or os.path.join(DATA_DIR, symbol_filename('historical', symbol, 'csv'))
+        self.source = source or YahooFinanceSource()
         self.logger = logger
+        # Copia columnar particionada por mes; store_format=None la desactiva
+        self.store = PartitionedStore(f'historical-{symbol}', root=store_root or STORE_DIR,
+                                      format=store_format, logger=logger) if store_format else None
+        self.store_root = store_root or STORE_DIR
+        self.store_format = store_format or 'arrow'
 
         db_dir = os.path.dirname(self.db_path)
-        if not os.path.exists(db_dir):
+        if db_dir and not os.path.exists(db_dir):
             os.makedirs(db_dir)
             self.logger.info(f'Directorio creado: {db_dir}')
-  
-    def download_data(self, start_date=None, end_date=None):
-        self.logger.info('Descargando datos históricos del paladio...')
-        palladium = yf.Ticker("PA=F")
-        
-
-        retries = 5
-        for attempt in range(retries):
-            try:
-                if start_date and end_date:
-                    data = palladium.history(start=start_date, end=end_date, interval="1h")
-                else:
-                    data = palladium.history(period="1y", interval="1d")
-                    
-
-                self.logger.info('Datos descargados correctamente.')
-                return [{
-                    'datetime': index.strftime('%Y-%m-%d-%H'),
-                    'open': row['Open'],
-                    'high': row['High'],
-                    'low': row['Low'],
-                    'close': row['Close'],
-                    'volume': row['Volume'],
-                    'dividends': row['Dividends'],
-                    'stock_splits': row['Stock Splits']
-                } for index, row in data.iterrows()]
-            except Exception as e:
-                if 'Rate limited' in str(e) and attempt < retries - 1:
-                    wait_time = 2 ** attempt
-                    self.logger.warning(f'Rate limit alcanzado. Reintentando en {wait_time} segundos...')
-                    time.sleep(wait_time)
-                else:
-                    self.logger.error(f'Error al descargar datos: {e}')
-                    raise
-
-    def save_to_db(self, data):
-        self.logger.info('Guardando datos en la base de datos SQLite...')
+
+    def bar_store(self, base='1m'):
+        """Barras multi-resolución del símbolo con `base` como la resolución más fina"""
+        return BarStore(self.symbol, base=base, root=self.store_root, format=self.store_format, logger=self.logger)
+
+    def last_stored_datetime(self):
+        """Devuelve la última fecha guardada en historical.db o None si no hay datos"""
+        if not os.path.exists(self.db_path):
+            return None
+        connection = self._connect()
+        try:
+            self._migrate(connection)
+            last = connection.execute('SELECT MAX(ts) FROM historical WHERE symbol = ?',
+                                      (self.symbol,)).fetchone()[0]
+        finally:
+            connection.close()
+        return pd.Timestamp(last, unit='s').to_pydatetime() if last is not None else None
+
+    @staticmethod
+    def _epoch(value):
+        return None if value is None else pd.Timestamp(value).value // 10 ** 9
+
+    def _range_clause(self, start, end):
+        """Condición por símbolo y rango [start, end] sobre ts (usa el índice de cobertura)"""
+        clause, params = 'symbol = ?', [self.symbol]
+        if start is not None:
+            clause += ' AND ts >= ?'
+            params.append(self._epoch(start))
+        if end is not None:
+            clause += ' AND ts <= ?'
+            params.append(self._epoch(end))
+        return clause, params
+
+    def load_range(self, start=None, end=None, columns=None, chunk_size=50_000, as_arrays=False):
+        """
+        Lee las barras de historical.db en [start, end] (fechas o Timestamps).
+        El resultado se copia por bloques de `chunk_size` filas a una matriz float64
+        reservada de antemano, sin pasar por objetos intermedios de pandas.
+        Devuelve un DataFrame o, con as_arrays=True, (índice datetime64, matriz).
+        """
+        columns = list(columns or OHLCV_COLUMNS)
+        unknown = set(columns) - set(DB_COLUMNS[1:])
+        if unknown:
+            raise ValueError(f'Columnas desconocidas: {sorted(unknown)}')
+        clause, params = self._range_clause(start, end)
+        connection = self._connect()
+        try:
+            self._migrate(connection)
+            rows = connection.execute(f'SELECT COUNT(*) FROM historical WHERE {clause}', params).fetchone()[0]
+            times = np.empty(rows, dtype='int64')
+            values = np.empty((rows, len(columns)), dtype='float64')
+            cursor = connection.execute(f'SELECT ts, {", ".join(columns)} FROM historical '
+                                        f'WHERE {clause} ORDER BY ts', params)
+            position = 0
+            while True:
+                chunk = cursor.fetchmany(chunk_size)
+                if not chunk:
+                    break
+                block = np.array(chunk, dtype='float64')
+                times[position:position + len(block)] = block[:, 0]
+                values[position:position + len(block)] = block[:, 1:]
+                position += len(block)
+        finally:
+            connection.close()
+        index = times[:position].astype('datetime64[s]').astype('datetime64[ns]')
+        if as_arrays:
+            return index, values[:position]
+        return pd.DataFrame(values[:position], index=pd.DatetimeIndex(index, name='datetime'), columns=columns)
+
+    def _context_bound(self, connection, moment, bars, before):
+        """ts de la barra que queda `bars` barras antes (o después) de `moment`"""
+        if moment is None or bars == 0:
+            return self._epoch(moment)
+        comparison, order = ('<', 'DESC') if before else ('>', 'ASC')
+        row = connection.execute(f'SELECT ts FROM historical WHERE symbol = ? AND ts {comparison} ? '
+                                 f'ORDER BY ts {order} LIMIT 1 OFFSET ?',
+                                 (self.symbol, self._epoch(moment), bars - 1)).fetchone()
+        if row is None:
+            return None
+        return row[0]
+
+    def iter_arrays(self, columns, chunk_rows, start=None, end=None, lookback=0, lookahead=0, dtype='float64'):
+        """
+        Recorre las barras guardadas en bloques de `chunk_rows` filas: del
+        almacenamiento columnar si existe (una partición a la vez) o de
+        historical.db con un cursor. `lookback`/`lookahead` agregan barras de
+        contexto antes de `start` y después de `end`. Produce (índice datetime64, {columna: arreglo}).
+        """
+        if self.store is not None and self.store.exists():
+            yield from self.store.iter_arrays(columns, chunk_rows, start, end, lookback, lookahead, dtype)
+            return
+        connection = self._connect()
+        try:
+            self._migrate(connection)
+            first = self._context_bound(connection, start, lookback, before=True)
+            last = self._context_bound(connection, end, lookahead, before=False)
+            clause, params = self._range_clause(None, None)
+            if first is not None:
+                clause += ' AND ts >= ?'
+                params.append(first)
+            if last is not None:
+                clause += ' AND ts <= ?'
+                params.append(last)
+            cursor = connection.execute(f'SELECT ts, {", ".join(columns)} FROM historical '
+                                        f'WHERE {clause} ORDER BY ts', params)
+            while True:
+                chunk = cursor.fetchmany(chunk_rows)
+                if not chunk:
+                    break
+                block = np.array(chunk, dtype='float64')
+                index = block[:, 0].astype('int64').astype('datetime64[s]').astype('datetime64[ns]')
+                yield index, {column: block[:, position + 1].astype(dtype) for position, column in enumerate(columns)}
+        finally:
+            connection.close()
+
+    def iter_history(self, chunk_rows, start=None, end=None, columns=None, dtype='float64'):
+        """iter_arrays como DataFrames con las columnas OHLCV (por defecto) en [start, end]"""
+        columns = list(columns or DB_COLUMNS[1:8])
+        for index, values in self.iter_arrays(columns, chunk_rows, start, end, dtype=dtype):
+            yield pd.DataFrame(values, index=pd.DatetimeIndex(index, name='datetime'), columns=columns)
+
+    def resample(self, freq='1D', start=None, end=None):
+        """
+        Agrega las barras horarias a OHLCV diario ('1D') o semanal ('1W', semanas
+        que empiezan el lunes) dentro de SQLite: apertura de la primera barra del
+        período, cierre de la última, máximo, mínimo y volumen total.
+        """
+        if freq not in RESAMPLE_PERIODS:
+            raise ValueError(f'Frecuencia no soportada: {freq} (use {", ".join(RESAMPLE_PERIODS)})')
+        period, offset = RESAMPLE_PERIODS[freq]
+        clause, params = self._range_clause(start, end)
+        query = f'''WITH buckets AS (
+                        SELECT (ts + {offset}) / {period} * {period} - {offset} AS bucket,
+                               MIN(ts) AS first_ts, MAX(ts) AS last_ts,
+                               MAX(high) AS high, MIN(low) AS low, SUM(volume) AS volume
+                        FROM historical WHERE {clause} GROUP BY bucket)
+                    SELECT b.bucket, o.open, b.high, b.low, c.close, b.volume
+                    FROM buckets b
+                    JOIN historical o ON o.symbol = ? AND o.ts = b.first_ts
+                    JOIN historical c ON c.symbol = ? AND c.ts = b.last_ts
+                    ORDER BY b.bucket'''
+        connection = self._connect()
+        try:
+            self._migrate(connection)
+            rows = connection.execute(query, params + [self.symbol, self.symbol]).fetchall()
+        finally:
+            connection.close()
+        data = np.array(rows, dtype='float64').reshape(-1, 6)
+        index = pd.DatetimeIndex(data[:, 0].astype('int64').astype('datetime64[s]').astype('datetime64[ns]'),
+                                 name='datetime')
+        return pd.DataFrame(data[:, 1:], index=index, columns=OHLCV_COLUMNS)
+
+    def load_history(self, start=None, end=None):
+        """
+        Lee las barras OHLCV ya guardadas: del almacenamiento columnar si existe
+        (solo las columnas y particiones del rango) o, si no, de historical.db
+        """
+        if self.store is not None and self.store.exists():
+            return self.store.read(DB_COLUMNS[1:8], start, end)
+        return self.load_range(start, end, DB_COLUMNS[1:8])
+
+    def _to_frame(self, data):
+        """Normaliza la respuesta de la fuente a columnas float64 con fechas sin zona horaria en la hora de la bolsa"""
+        df = data.rename(columns=COLUMN_MAPPING)[list(COLUMN_MAPPING.values())].astype('float64')
+        df.index = exchange_time(df.index).rename('datetime')
+        return df
+
+    def download_request(self, start_date=None, end_date=None, resume=False, interval=None):
+        """
+        Argumentos de descarga para el planificador: con resume=True solo se piden
+        las barras posteriores a la última guardada (en historical.db o, para
+        resoluciones de minutos, en el almacenamiento de barras)
+        """
+        interval = interval or ('1h' if start_date and end_date else '1d')
+        last = None
+        if resume:
+            last = self.bar_store(interval).last_datetime() if interval in INTRADAY else self.last_stored_datetime()
+        if last:
+            end = end_date or (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+            self.logger.info(f'Reanudando descarga de {self.symbol} desde {last} hasta {end}')
+            return {'start': last, 'end': end, 'interval': interval}, last
+        if start_date and end_date:
+            return {'start': start_date, 'end': end_date, 'interval': interval}, None
+        return {'period': DEFAULT_PERIODS[interval], 'interval': interval}, None
+
+    def finish_download(self, data, last=None, interval='1d'):
+        """
+        Normaliza lo descargado y, si se reanudó, lo combina con el histórico guardado.
+        Las barras de minutos no se combinan: el almacenamiento de barras fusiona
+        los meses parciales al escribir.
+        """
+        self.logger.info(f'Datos de {self.symbol} descargados correctamente ({len(data)} barras).')
+        df = self._to_frame(data)
+        if last and interval not in INTRADAY:
+            # Las barras nuevas reemplazan a las existentes
+            df = deduplicate(pd.concat([self.load_history(), df]))
+        return df
+
+    @timed('collector.download_data')
+    def download_data(self, start_date=None, end_date=None, resume=False, scheduler=None, interval=None):
+        """
+        Descarga los datos históricos del símbolo con el planificador asíncrono
+        (bloques concurrentes, límite de tasa, reintentos y checkpoints).
+        Con resume=True solo se piden las barras posteriores a la última guardada
+        en historical.db y se combinan con el histórico existente.
+        """
+        self.logger.info(f'Descargando datos históricos de {self.symbol}...')
+        request, last = self.download_request(start_date, end_date, resume, interval)
+        scheduler = scheduler or DownloadScheduler(self.source, logger=self.logger)
+        data = scheduler.run({self.symbol: request})[self.symbol]
+        return self.finish_download(data, last, request['interval'])
+
+    def _connect(self):
+        """Abre la conexión a SQLite con los pragmas de escritura ajustados"""
         connection = sqlite3.connect(self.db_path)
-        cursor = connection.cursor()
-
-        # Drop existing table to ensure clean schema
-        cursor.execute('DROP TABLE IF EXISTS historical')
-        
-        # Create table with proper schema
-        cursor.execute('''CREATE TABLE historical (
-                            datetime TEXT PRIMARY KEY,
-                            open REAL,
-                            high REAL,
-                            low REAL,
-                            close REAL,
-                            volume REAL,
-                            dividends REAL,
-                            stock_splits REAL,
-                            volatility REAL,
-                            SMA_20 REAL,
-                            EMA_20 REAL,
-                            RSI REAL,
-                            daily_return REAL,
-                            cumulative_return REAL,
-                            momentum REAL)''')
-        
-        duplicates = []
-        for record in data:
-            try:
-                # Redondear todos los valores numéricos a 2 decimales
-                rounded_record = {
-                    'datetime': record['datetime'],
-                    'open': round(record['open'], 4),
-                    'high': round(record['high'], 4),
-                    'low': round(record['low'], 4),
-                    'close': round(record['close'], 4),
-                    'volume': round(record['volume'], 4),
-                    'dividends': round(record['dividends'], 4),
-                    'stock_splits': round(record['stock_splits'], 4),
-                    'volatility': round(record.get('volatility', 0), 4),
-                    'SMA_20': round(record.get('SMA_20', 0), 4),
-                    'EMA_20': round(record.get('EMA_20', 0), 4),
-                    'RSI': round(record.get('RSI', 0), 4),
-                    'daily_return': round(record.get('daily_return', 0), 4),
-                    'cumulative_return': round(record.get('cumulative_return', 0), 4),
-                    'momentum': round(record.get('momentum', 0), 4)
-                }
-                
-                cursor.execute('''INSERT INTO historical 
-                    (datetime, open, high, low, close, volume, dividends, stock_splits,
-                     volatility, SMA_20, EMA_20, RSI, daily_return, cumulative_return, momentum) 
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                    (rounded_record['datetime'], rounded_record['open'], rounded_record['high'], 
-                     rounded_record['low'], rounded_record['close'], rounded_record['volume'], 
-                     rounded_record['dividends'], rounded_record['stock_splits'],
-                     rounded_record['volatility'], rounded_record['SMA_20'], 
-                     rounded_record['EMA_20'], rounded_record['RSI'], 
-                     rounded_record['daily_return'], rounded_record['cumulative_return'], 
-                     rounded_record['momentum']))
-            except sqlite3.IntegrityError:
-                duplicates.append(record['datetime'])
-        
-        if duplicates:
-            self.logger.warning(f'Se encontraron {len(duplicates)} registros duplicados. No fueron incertados en la base de datos.')
-        
-        connection.commit()
-        connection.close()
-        self.logger.info('Datos guardados en la base de datos correctamente.')
-
-    def save_to_csv(self, data):
-        self.logger.info('Guardando datos en el archivo CSV...')
-        df_api = pd.DataFrame(data)
-        create_file(df_api, self.csv_path, file_format='csv')
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute('PRAGMA temp_store=MEMORY')
+        connection.execute('PRAGMA cache_size=-64000')
+        return connection
+
+    def connect(self):
+        """Conexión a historical.db con el esquema al día (para otros módulos, p. ej. el exportador)"""
+        connection = self._connect()
+        self._migrate(connection)
+        return connection
+
+    def _mark_dirty(self, connection, source, from_ts):
+        """Registra la barra más antigua escrita en `source` para que los tableros recalculen desde ahí"""
+        connection.execute('INSERT INTO dashboard_dirty (symbol, source, from_ts) VALUES (?, ?, ?) '
+                           'ON CONFLICT(symbol, source) DO UPDATE SET from_ts = MIN(from_ts, excluded.from_ts)',
+                           (self.symbol, source, int(from_ts)))
+
+    def _migrate(self, connection):
+        """Aplica las migraciones pendientes del esquema sin borrar los datos existentes"""
+        connection.execute('''CREATE TABLE IF NOT EXISTS schema_version (
+                                version INTEGER PRIMARY KEY,
+                                applied_at TEXT)''')
+        current_version = 'SELECT COALESCE(MAX(version), 0) FROM schema_version'
+        if connection.execute(current_version).fetchone()[0] >= MIGRATIONS[-1][0]:
+            return
+        # Bloqueo de escritura para que dos procesos no apliquen la misma migración
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            current = connection.execute(current_version).fetchone()[0]
+            for version, statements in MIGRATIONS:
+                if version <= current:
+                    continue
+                for statement in statements:
+                    connection.execute(statement)
+                connection.execute('INSERT INTO schema_version (version, applied_at) VALUES (?, ?)',
+                                   (version, datetime.now().isoformat(timespec='seconds')))
+                self.logger.info(f'Migración de esquema aplicada: versión {version}')
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+
+    def _rows_to_write(self, connection, frame, columns=DB_COLUMNS[1:]):
+        """Filtra las filas nuevas o cuyos valores en `columns` cambiaron respecto a la base de datos"""
+        if frame.empty:
+            return frame
+        # Solo el rango de fechas del lote: escribir por bloques no relee todo el histórico
+        clause, params = self._range_clause(pd.Timestamp(frame['ts'].min(), unit='s'),
+                                            pd.Timestamp(frame['ts'].max(), unit='s'))
+        existing = pd.read_sql_query(f'SELECT {", ".join(DB_COLUMNS)} FROM historical WHERE {clause}',
+                                     connection, params=params, index_col='datetime')
+        common = frame.index.intersection(existing.index)
+        if common.empty:
+            return frame
+        old = existing.loc[common, columns].to_numpy()
+        new = frame.loc[common, columns].to_numpy()
+        unchanged = ((old == new) | (pd.isna(old) & pd.isna(new))).all(axis=1)
+        return frame.drop(common[unchanged])
+
+    def _db_size(self):
+        return sum(os.path.getsize(path) for path in (self.db_path, self.db_path + '-wal') if os.path.exists(path))
+
+    @timed('collector.save_to_db')
+    def save_to_db(self, df, incremental=True, columns=None):
+        """
+        Guarda el DataFrame en la tabla historical.
+        En modo incremental solo se escriben las barras nuevas o modificadas con un
+        upsert por lotes; en modo completo se reemplaza el contenido de la tabla.
+        Con `columns` (p. ej. RAW_COLUMNS) las barras ya guardadas solo actualizan
+        esas columnas y conservan sus KPIs; las nuevas los guardan en 0.
+        """
+        if columns is not None and not incremental:
+            raise ValueError('El modo completo reemplaza las filas: no admite columnas parciales')
+        updated = list(columns or DB_COLUMNS[1:])
+        self.logger.info(f'Guardando datos de {self.symbol} en la base de datos SQLite...')
+        # Las fechas repetidas se resuelven antes del upsert (gana la última), no fila a fila en SQLite
+        df = deduplicate(df)
+        size_before = self._db_size()
+        connection = self._connect()
+        try:
+            self._migrate(connection)
+
+            # Redondear todos los valores numéricos a 4 decimales; los KPIs ausentes se guardan en 0
+            frame = df.reindex(columns=DB_COLUMNS[1:], fill_value=0.0).astype('float64').round(4)
+            frame.index = df.index.strftime(DATETIME_FORMAT)
+            frame['ts'] = df.index.values.astype('datetime64[s]').astype('int64')
+            if incremental:
+                frame = self._rows_to_write(connection, frame, updated)
+
+            columns = [[self.symbol] * len(frame), frame.index.tolist()] + [frame[col].tolist() for col in DB_COLUMNS[1:] + ['ts']]
+            placeholders = ', '.join('?' for _ in columns)
+            updates = ', '.join(f'{col}=excluded.{col}' for col in updated + ['ts'])
+            with connection:
+                if not incremental:
+                    connection.execute('DELETE FROM historical WHERE symbol = ?', (self.symbol,))
+                connection.executemany(
+                    f'INSERT INTO historical (symbol, {", ".join(DB_COLUMNS)}, ts) VALUES ({placeholders}) '
+                    f'ON CONFLICT(symbol, datetime) DO UPDATE SET {updates}',
+                    zip(*columns))
+                if len(frame) or not incremental:
+                    self._mark_dirty(connection, 'historical', frame['ts'].min() if incremental else 0)
+        finally:
+            connection.close()
+        add_bytes(max(self._db_size() - size_before, 0))
+        self.logger.info(f'Datos guardados en la base de datos correctamente ({len(frame)} registros escritos).')
+
+    @timed('collector.save_predictions')
+    def save_predictions(self, df, prediction='prediccion', realized=None):
+        """
+        Guarda las predicciones (y, si se indica, el valor realizado) en la tabla
+        predictions. Solo se escriben las filas nuevas o modificadas y se marcan sus
+        períodos para recalcular el error en los tableros.
+        """
+        df = deduplicate(df)
+        frame = pd.DataFrame({'prediction': df[prediction].to_numpy(dtype='float64'),
+                              'realized': df[realized].to_numpy(dtype='float64') if realized else np.nan},
+                             index=df.index)
+        frame['ts'] = frame.index.values.astype('datetime64[s]').astype('int64')
+        connection = self.connect()
+        try:
+            if len(frame):
+                existing = pd.read_sql_query('SELECT ts, prediction, realized FROM predictions '
+                                             'WHERE symbol = ? AND ts BETWEEN ? AND ?', connection,
+                                             params=(self.symbol, int(frame['ts'].min()), int(frame['ts'].max())))
+                merged = frame.merge(existing, on='ts', how='left', suffixes=('', '_old'))
+                unchanged = ((merged['prediction'] == merged['prediction_old']) &
+                             ((merged['realized'] == merged['realized_old']) |
+                              (merged['realized'].isna() & merged['realized_old'].isna()))).to_numpy()
+                frame = frame[~unchanged]
+            with connection:
+                connection.executemany(
+                    'INSERT INTO predictions (symbol, datetime, ts, prediction, realized) VALUES (?, ?, ?, ?, ?) '
+                    'ON CONFLICT(symbol, ts) DO UPDATE SET prediction=excluded.prediction, realized=excluded.realized',
+                    zip([self.symbol] * len(frame), frame.index.strftime(DATETIME_FORMAT), frame['ts'].tolist(),
+                        frame['prediction'].tolist(), frame['realized'].where(frame['realized'].notna(), None).tolist()))
+                if len(frame):
+                    self._mark_dirty(connection, 'predictions', frame['ts'].min())
+        finally:
+            connection.close()
+        self.logger.info(f'Predicciones de {self.symbol} guardadas en la base de datos ({len(frame)} registros escritos).')
+        return len(frame)
+
+    @timed('collector.save_to_store')
+    def save_to_store(self, df, columns=None):
+        """
+        Guarda las barras en el almacenamiento columnar con las mismas columnas y
+        redondeo que historical.db; solo se reescriben los meses modificados.
+        La primera vez se siembra con el contenido de historical.db. Con `columns`,
+        como en save_to_db, las barras ya guardadas conservan las demás columnas.
+        """
+        if self.store is None:
+            return []
+        frame = df.reindex(columns=DB_COLUMNS[1:], fill_value=0.0).astype('float64').round(4)
+        frame.index = pd.DatetimeIndex(frame.index, name='datetime').as_unit('ns')
+        if columns is not None and len(frame):
+            kept = [col for col in DB_COLUMNS[1:] if col not in columns]
+            start, end = frame.index[0], frame.index[-1]
+            if self.store.exists():
+                existing = self.store.read(columns=kept, start=start, end=end)
+            elif os.path.exists(self.db_path):
+                existing = self.load_range(start, end, columns=kept)
+            else:
+                existing = None
+            if existing is not None and len(existing):
+                existing.index = pd.DatetimeIndex(existing.index).as_unit('ns')
+                common = frame.index.intersection(existing.index)
+                frame.loc[common, kept] = existing.loc[common, kept].to_numpy(dtype='float64')
+        if not self.store.exists() and os.path.exists(self.db_path):
+            stored = self.load_range(columns=DB_COLUMNS[1:])
+            frame = deduplicate(pd.concat([stored, frame]))
+        size_before = self.store.size()
+        written = self.store.write(frame)
+        add_bytes(max(self.store.size() - size_before, 0))
+        return written
+
+    @timed('collector.save_bars')
+    def save_bars(self, df, interval='1m'):
+        """
+        Guarda barras en el almacenamiento multi-resolución con `interval` como
+        base; las resoluciones mayores se derivan de ellas al leerlas
+        """
+        bars = self.bar_store(interval)
+        size_before = bars.raw.size()
+        written = bars.write(df)
+        add_bytes(max(bars.raw.size() - size_before, 0))
+        self.logger.info(f'Barras de {interval} de {self.symbol} guardadas ({len(written)} meses escritos).')
+        return written
+
+    @timed('collector.save_to_csv')
+    def save_to_csv(self, df, append=False):
+        """
+        Exporta el CSV completo (lo consumen los tableros; los lectores usan el
+        almacenamiento columnar). Con append=True agrega las filas al final, para
+        exportar por bloques.
+        """
+        self.logger.info(f'Guardando datos de {self.symbol} en el archivo CSV...')
+        size_before = os.path.getsize(self.csv_path) if append and os.path.exists(self.csv_path) else 0
+        options = {'mode': 'a', 'header': False} if append else {}
+        create_file(df, self.csv_path, file_format='csv', index=True, date_format=DATETIME_FORMAT, **options)
+        add_bytes(os.path.getsize(self.csv_path) - size_before)
         self.logger.info('Datos guardados en el archivo CSV correctamente.')
 
+@timed('collector.download_symbols')
+def download_symbols(symbols, source=None, max_workers=4, rate_limit=None, store_format='arrow', **kwargs):
+    """
+    Descarga varios símbolos con un solo planificador asíncrono: todos comparten
+    el token bucket y el límite de `max_workers` solicitudes simultáneas, y los
+    rangos largos se dividen en bloques que se descargan en paralelo.
+    Devuelve un diccionario símbolo -> DataFrame.
+    """
+    source = source or YahooFinanceSource()
+    collectors = {symbol: DataCollector(source=source, symbol=symbol, store_format=store_format) for symbol in symbols}
+    requests = {symbol: collector.download_request(**kwargs) for symbol, collector in collectors.items()}
+    scheduler = DownloadScheduler(source, rate=rate_limit, max_concurrency=max_workers, logger=logger)
+    frames = scheduler.run({symbol: request for symbol, (request, _) in requests.items()})
+    return {symbol: collectors[symbol].finish_download(frames[symbol], requests[symbol][1], requests[symbol][0]['interval'])
+            for symbol in symbols}
+
 if __name__ == '__main__':
-    parser = argparse.ArgumentParser(description='Descargar y guardar datos históricos del paladio.')
+    parser = argparse.ArgumentParser(description='Descargar y guardar datos históricos de metales preciosos.')
     parser.add_argument('--start_date', type=str, help='Fecha de inicio en formato YYYY-MM-DD')
     parser.add_argument('--end_date', type=str, help='Fecha de fin en formato YYYY-MM-DD')
+    parser.add_argument('--resume', action='store_true', help='Descargar solo las barras posteriores a la última guardada')
+    parser.add_argument('--source_file', type=str, help='CSV local a reproducir en lugar de Yahoo Finance')
+    parser.add_argument('--symbols', nargs='+', default=[DEFAULT_SYMBOL], help='Símbolos a descargar (ej. PA=F PL=F GC=F SI=F)')
+    parser.add_argument('--workers', type=int, default=4, help='Descargas concurrentes')
+    parser.add_argument('--rate_limit', type=float, help='Solicitudes por segundo a la fuente (por defecto, el de la fuente)')
     args = parser.parse_args()
 
-    collector = DataCollector()
-    data = collector.download_data(start_date=args.start_date, end_date=args.end_date)
-    collector.save_to_db(data)
-    collector.save_to_csv(data)
\ No newline at end of file
+    source = LocalFileSource(args.source_file) if args.source_file else None
+    frames = download_symbols(args.symbols, source=source, max_workers=args.workers, rate_limit=args.rate_limit,
+                              start_date=args.start_date, end_date=args.end_date, resume=args.resume)
+    for symbol, data in frames.items():
+        collector = DataCollector(source=source, symbol=symbol)
+        collector.save_to_db(data)
+        collector.save_to_store(data)
+        collector.save_to_csv(data)
\ No newline at end of file
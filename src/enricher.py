@@ -1,18 +1,50 @@
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
 import pandas as pd
 
+from src.features import (DAILY_RETURN, MOMENTUM, SMA_20, VOLATILITY, bar_seconds, build_feature_matrix, build_features,
+                          stream_feature_matrix, window_bars)
+from src.logger import merge_timings, timed, worker_timings
+
+KPI_COLUMNS = ['volatility', 'SMA_20', 'EMA_20', 'RSI', 'daily_return', 'cumulative_return', 'momentum']
+
+# Ventanas por defecto de los KPIs (en barras)
+DEFAULT_WINDOWS = (20, 14, 14)
+
 class Enricher:
-    def __init__(self,logger):
+    def __init__(self, logger, window=20, rsi_periods=14, momentum_period=14):
+        """
+        Las ventanas se pueden dar en barras (20) o en tiempo ('20h'); las de tiempo
+        se convierten en barras según la resolución de cada serie, de modo que el
+        mismo Enricher sirve para barras de minutos, horas o días.
+        """
         self.logger = logger
+        self.window = window
+        self.rsi_periods = rsi_periods
+        self.momentum_period = momentum_period
+
+    def windows(self, df):
+        """(volatilidad/medias, RSI, momentum) en barras para la resolución de `df`"""
+        configured = (self.window, self.rsi_periods, self.momentum_period)
+        if all(isinstance(window, int) for window in configured):
+            return configured
+        seconds = bar_seconds(df.index)
+        return tuple(window_bars(window, seconds) for window in configured)
+
+    def _cache_version(self, df):
+        windows = self.windows(df)
+        return '' if windows == DEFAULT_WINDOWS else str(windows)
         
     def calculate_volatility(self, df, window=20):
         """Calcula la volatilidad usando la desviación estándar"""
-        return df['close'].rolling(window=window).std()
+        return build_features(df, [VOLATILITY._replace(window=window)])['volatility']
 
-    def calculate_moving_averages(self, df):
+    def calculate_moving_averages(self, df, window=20):
         """Calcula medias móviles para identificar tendencias"""
-        df['SMA_20'] = df['close'].rolling(window=20).mean()
-        df['EMA_20'] = df['close'].ewm(span=20, adjust=False).mean()
+        df['SMA_20'] = build_features(df, [SMA_20._replace(window=window)])['SMA_20']
+        df['EMA_20'] = df['close'].ewm(span=window, adjust=False).mean()
         return df
 
     def calculate_rsi(self, df, periods=14):
@@ -26,13 +58,98 @@ class Enricher:
 
     def calculate_returns(self, df):
         """Calcula diferentes métricas de rendimiento"""
-        df['daily_return'] = df['close'].pct_change()
+        df['daily_return'] = build_features(df, [DAILY_RETURN])['daily_return']
         df['cumulative_return'] = (1 + df['daily_return']).cumprod()
         return df    
     def calculate_momentum(self, df, period=14):
         """Calcula el momentum para medir la fuerza del movimiento"""
-        return df['close'].diff(period)
+        return build_features(df, [MOMENTUM._replace(window=period)])['momentum']
         
+    @staticmethod
+    def _continue(values, seed, step):
+        """Aplica una recursión de pandas (ewm, cumprod) continuando desde `seed`, el último valor del bloque anterior"""
+        if seed is None:
+            return step(values)
+        seeded = step(pd.concat([pd.Series([seed]), values], ignore_index=True))
+        return seeded.iloc[1:].set_axis(values.index)
+
+    def _kpis(self, data, windows, context=0, ema=None, cumulative=None, rolling=None):
+        """
+        KPIs (sin redondear) de las barras data[context:]:
+        1. Volatilidad del precio
+        2. Tendencias del mercado (medias móviles)
+        3. Detección de sobrecompra/sobreventa
+        4. Rendimiento y riesgo
+        5. Fuerza del movimiento
+        Las `context` barras previas solo aportan historia a las ventanas; `ema` y
+        `cumulative` continúan la EMA y el rendimiento acumulado de un bloque anterior.
+        `rolling` trae la volatilidad y la SMA ya calculadas para data[context:].
+        """
+        window, rsi_periods, momentum_period = windows
+        close = data['close'].iloc[context:]
+        kpis = pd.DataFrame(index=close.index)
+        if rolling is None:
+            rolling = build_feature_matrix(data, self._rolling_specs(windows))[context:]
+        kpis['volatility'] = rolling[:, 0]
+        kpis['SMA_20'] = rolling[:, 1]
+        kpis['EMA_20'] = self._continue(close, ema, lambda values: values.ewm(span=window, adjust=False).mean())
+        kpis['RSI'] = self.calculate_rsi(data, rsi_periods).to_numpy()[context:]
+        kpis['daily_return'] = build_features(data, [DAILY_RETURN])['daily_return'].to_numpy()[context:]
+        kpis['cumulative_return'] = self._continue(1 + kpis['daily_return'], cumulative, lambda values: values.cumprod())
+        kpis['momentum'] = self.calculate_momentum(data, momentum_period).to_numpy()[context:]
+        return kpis[KPI_COLUMNS]
+
+    @staticmethod
+    def _rolling_specs(windows):
+        return [VOLATILITY._replace(window=windows[0]), SMA_20._replace(window=windows[0])]
+
+    def enrich_chunked(self, frames, dtype='float64'):
+        """
+        Enriquece un histórico que no cabe en memoria. Recibe los bloques en orden
+        (iterable de DataFrames, p. ej. DataCollector.iter_history) y produce bloques
+        enriquecidos con los mismos valores que enrich_data sobre la serie completa.
+        La volatilidad y la SMA se calculan con stream_feature_matrix, que solo emite
+        barras de bloques de _window_sums completos: los bloques producidos tienen
+        unas tantas barras como los recibidos pero no coinciden con ellos. Del resto
+        se arrastran las últimas barras que necesitan las ventanas y el último valor
+        de la EMA y del rendimiento acumulado.
+        Con dtype='float32' los bloques producidos ocupan la mitad de memoria.
+        """
+        frames = (frame for frame in frames if not frame.empty)
+        first = next(frames, None)
+        if first is None:
+            return
+        windows = self.windows(first)
+        pending = []  # bloques recibidos con barras que todavía no se emitieron
+
+        def arrays():
+            for frame in itertools.chain([first], frames):
+                pending.append(frame)
+                yield frame.index.values, {'close': frame['close'].to_numpy(dtype='float64')}
+
+        tail = ema = cumulative = None
+        # Ventana más larga de RSI/momentum, que miran una barra más atrás
+        carry = max(windows[1], windows[2]) + 1
+        for index, rolling in stream_feature_matrix(arrays(), self._rolling_specs(windows), chunk_rows=len(first)):
+            rows = pd.concat(pending)
+            frame, rest = rows.iloc[:len(index)], rows.iloc[len(index):]
+            pending[:] = [rest]
+            data = frame if tail is None else pd.concat([tail, frame])
+            kpis = self._kpis(data, windows, len(data) - len(frame), ema, cumulative, rolling)
+            ema = self._last(kpis['EMA_20'], ema)
+            cumulative = self._last(kpis['cumulative_return'], cumulative)
+            tail = data[['close']].iloc[-carry:]
+            enriched = frame.copy()
+            for col in KPI_COLUMNS:
+                enriched[col] = kpis[col].round(4).fillna(0).to_numpy()
+            yield enriched.astype(dtype)
+
+    @staticmethod
+    def _last(values, previous):
+        valid = values.dropna()
+        return valid.iloc[-1] if len(valid) else previous
+
+    @timed('enricher.enrich_data')
     def enrich_data(self, data):
         """
         Enriquece los datos con varios KPIs:
@@ -41,48 +158,116 @@ class Enricher:
         - RSI (sobrecompra/sobreventa)
         - Rendimientos
         - Momentum
+        Recibe un DataFrame con DatetimeIndex y agrega las columnas KPI en float64.
         """
         try:
-            # Convertir los datos a DataFrame
-            df = pd.DataFrame(data)
-            df.set_index('datetime', inplace=True)
-            
-            # Asegurarse de que los datos estén ordenados cronológicamente
-            df = df.sort_index()
-            
-            # 1. Volatilidad del precio
-            df['volatility'] = self.calculate_volatility(df)
-            
-            # 2. Tendencias del mercado (Medias móviles)
-            df = self.calculate_moving_averages(df)
-            
-            # 3. Detección de sobrecompra/sobreventa
-            df['RSI'] = self.calculate_rsi(df)
-            
-            # 4. Rendimiento y riesgo
-            df = self.calculate_returns(df)
+            df = data
+            if not isinstance(df, pd.DataFrame):
+                # Compatibilidad con listas de diccionarios
+                df = pd.DataFrame(df)
+                df.set_index('datetime', inplace=True)
+
+            # Asegurarse de que los datos estén ordenados cronológicamente. Los KPIs se
+            # agregan a una copia: la entrada puede ser la salida de otra etapa (la
+            # descarga en el pipeline) y no debe cambiar
+            if not df.index.is_monotonic_increasing:
+                df = df.sort_index()
+            else:
+                df = df.copy()
             
-            # 5. Fuerza del movimiento
-            df['momentum'] = self.calculate_momentum(df)
+            kpis = self._kpis(df, self.windows(df))
             
-            # Redondear KPIs a 4 decimales
-            kpi_cols = ['volatility', 'SMA_20', 'EMA_20', 'RSI', 'daily_return', 'cumulative_return', 'momentum']
-            for col in kpi_cols:
-                if col in df.columns:
-                    df[col] = df[col].round(4)
-        
-            # Llenar valores NaN con 0
-            df = df.fillna(0)
+            # Redondear KPIs a 4 decimales y llenar valores NaN con 0
+            for col in KPI_COLUMNS:
+                df[col] = kpis[col].round(4).fillna(0).to_numpy()
             
             self.logger.info('Datos enriquecidos exitosamente con KPIs')
-            
-            # Devolver el DataFrame como diccionario incluyendo el índice
-            return df.reset_index().to_dict('records')
+            return df
             
         except Exception as e:
             self.logger.error(f'Error al enriquecer los datos: {str(e)}')
             return data
 
+    def _enrich_from_cache(self, df, cache, name):
+        """
+        Reutiliza los KPIs guardados en el cache. Si solo se agregaron barras, calcula
+        las nuevas con el estado incremental guardado. Devuelve una copia de `df` con
+        los KPIs, o None si no hay acierto.
+        """
+        from src.online_enricher import OnlineEnricher
+
+        hit = cache.load(name, df, ['close'], version=self._cache_version(df))
+        if hit is None:
+            return None
+        df = df.copy()
+        if hit.complete:
+            df[KPI_COLUMNS] = hit.frame[KPI_COLUMNS].to_numpy()
+            self.logger.info(f'KPIs recuperados del cache ({len(df)} barras)')
+            return df
+        if hit.state is None or len(df) <= hit.rows:
+            return None
+
+        online = OnlineEnricher.from_dict(hit.state)
+        stable = online.update_batch(df.iloc[hit.rows:-1])
+        state = online.to_dict()
+        last = online.update_batch(df.iloc[-1:])
+        df[KPI_COLUMNS] = pd.concat([hit.frame[KPI_COLUMNS], stable, last]).to_numpy()
+        cache.save(name, df, ['close'], df[KPI_COLUMNS], version=self._cache_version(df), state=state)
+        self.logger.info(f'KPIs recuperados del cache; calculadas {len(df) - hit.rows} barras nuevas')
+        return df
+
+    def _save_to_cache(self, df, cache, name):
+        """Guarda los KPIs y el estado incremental hasta la penúltima barra"""
+        from src.online_enricher import OnlineEnricher
+
+        window, rsi_periods, momentum_period = self.windows(df)
+        state = OnlineEnricher.from_history(df.iloc[:-1], window=window, rsi_periods=rsi_periods,
+                                            momentum_period=momentum_period).to_dict()
+        cache.save(name, df, ['close'], df[KPI_COLUMNS], version=self._cache_version(df), state=state)
+
+    def enrich_cached(self, df, cache, name):
+        """Enriquece usando el cache de resultados cuando las barras no cambiaron"""
+        if not df.index.is_monotonic_increasing:
+            df = df.sort_index()
+        enriched = self._enrich_from_cache(df, cache, name)
+        if enriched is None:
+            enriched = self.enrich_data(df)
+            self._save_to_cache(enriched, cache, name)
+        return enriched
+
+    @timed('enricher.enrich_many')
+    def enrich_many(self, frames, max_workers=None, cache=None):
+        """
+        Enriquece varios símbolos en paralelo con un pool de procesos.
+        Recibe y devuelve un diccionario símbolo -> DataFrame. Con cache, solo los
+        símbolos sin resultados reutilizables se envían al pool.
+        """
+        results = {}
+        pending = {}
+        for symbol, df in frames.items():
+            if cache is not None:
+                if not df.index.is_monotonic_increasing:
+                    df = df.sort_index()
+                results[symbol] = self._enrich_from_cache(df, cache, f'kpis-{symbol}')
+            if results.get(symbol) is None:
+                pending[symbol] = df
+
+        if len(pending) <= 1:
+            computed = {symbol: self.enrich_data(df) for symbol, df in pending.items()}
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                tasks = executor.map(worker_timings, itertools.repeat(self.enrich_data), pending.values())
+                computed = {}
+                for symbol, (df, events) in zip(pending, tasks):
+                    merge_timings(events)
+                    computed[symbol] = df
+
+        for symbol, df in computed.items():
+            if cache is not None:
+                self._save_to_cache(df, cache, f'kpis-{symbol}')
+            results[symbol] = df
+        return {symbol: results[symbol] for symbol in frames}
+
   
 
     # def calcular_kpi(self,df=pd.DataFrame()): #mínimo 5 KPI (tasa de variación, media móvil, volatilidad, retorno acumulado, desviación estándar, etc.).
@@ -0,0 +1,168 @@
+import math
+import os
+from datetime import datetime
+
+import pandas as pd
+
+from src.collector import DataCollector
+from src.logger import logger as default_logger, stage_timer
+
+# Tablas pre-agregadas para los tableros de Power BI (src/dashboard). Viven en historical.db
+# y se exportan a Parquet, así los reportes leen unos cientos de filas en lugar de las
+# barras completas. Al guardar barras o predicciones, el colector anota en dashboard_dirty
+# la barra más antigua escrita: solo se recalculan los períodos desde esa barra.
+EXPORT_DIR = 'src/dashboard/data'
+
+# Inicio (epoch) del período de cada barra: día, semana (empieza el lunes) y mes calendario
+PERIODS = {
+    'D': 'ts / 86400 * 86400',
+    'W': '(ts + 259200) / 604800 * 604800 - 259200',
+    'M': "CAST(strftime('%s', ts, 'unixepoch', 'start of month') AS INTEGER)"
+}
+
+# Tablas que se recalculan según el origen de los cambios
+SOURCES = {
+    'historical': ['dashboard_ohlc', 'dashboard_kpis'],
+    'predictions': ['dashboard_prediction_error']
+}
+
+TABLES = ['dashboard_ohlc', 'dashboard_kpis', 'dashboard_prediction_error', 'dashboard_latest']
+
+# Agregados por período. Apertura y cierre salen de la primera y la última barra
+# (uniones por ts sobre la clave primaria), como en DataCollector.resample.
+QUERIES = {
+    'dashboard_ohlc': '''
+        WITH buckets AS (
+            SELECT {bucket} AS bucket_ts, MIN(ts) AS first_ts, MAX(ts) AS last_ts,
+                   MAX(high) AS high, MIN(low) AS low, SUM(volume) AS volume, COUNT(*) AS bars
+            FROM historical WHERE symbol = :symbol AND ts >= :from_ts GROUP BY bucket_ts)
+        INSERT INTO dashboard_ohlc (symbol, period, bucket_ts, bucket, open, high, low, close, volume, bars)
+        SELECT :symbol, :period, b.bucket_ts, date(b.bucket_ts, 'unixepoch'),
+               o.open, b.high, b.low, c.close, b.volume, b.bars
+        FROM buckets b
+        JOIN historical o ON o.symbol = :symbol AND o.ts = b.first_ts
+        JOIN historical c ON c.symbol = :symbol AND c.ts = b.last_ts''',
+    'dashboard_kpis': '''
+        WITH buckets AS (
+            SELECT {bucket} AS bucket_ts, MIN(ts) AS first_ts, MAX(ts) AS last_ts,
+                   AVG(volatility) AS volatility_mean, MAX(volatility) AS volatility_max,
+                   AVG(RSI) AS rsi_mean, MIN(RSI) AS rsi_min, MAX(RSI) AS rsi_max
+            FROM historical WHERE symbol = :symbol AND ts >= :from_ts GROUP BY bucket_ts)
+        INSERT INTO dashboard_kpis (symbol, period, bucket_ts, bucket, period_return, volatility_mean, volatility_max,
+                                    rsi_mean, rsi_min, rsi_max, SMA_20, EMA_20, momentum, cumulative_return)
+        SELECT :symbol, :period, b.bucket_ts, date(b.bucket_ts, 'unixepoch'),
+               CASE WHEN o.open != 0 THEN c.close / o.open - 1 END,
+               b.volatility_mean, b.volatility_max, b.rsi_mean, b.rsi_min, b.rsi_max,
+               c.SMA_20, c.EMA_20, c.momentum, c.cumulative_return
+        FROM buckets b
+        JOIN historical o ON o.symbol = :symbol AND o.ts = b.first_ts
+        JOIN historical c ON c.symbol = :symbol AND c.ts = b.last_ts''',
+    'dashboard_prediction_error': '''
+        INSERT INTO dashboard_prediction_error (symbol, period, bucket_ts, bucket, predictions, prediction_mean,
+                                                realized_mean, mae, rmse, bias)
+        SELECT :symbol, :period, {bucket} AS bucket_ts, date({bucket}, 'unixepoch'), COUNT(*),
+               AVG(prediction), AVG(realized), AVG(ABS(prediction - realized)),
+               sqrt(AVG((prediction - realized) * (prediction - realized))), AVG(prediction - realized)
+        FROM predictions
+        WHERE symbol = :symbol AND ts >= :from_ts AND prediction IS NOT NULL AND realized IS NOT NULL
+        GROUP BY bucket_ts'''
+}
+
+LATEST_QUERY = '''
+    INSERT INTO dashboard_latest (symbol, datetime, close, daily_return, volatility, RSI, SMA_20, EMA_20,
+                                  momentum, prediction_datetime, prediction, updated_at)
+    SELECT :symbol, h.datetime, h.close, h.daily_return, h.volatility, h.RSI, h.SMA_20, h.EMA_20, h.momentum,
+           p.datetime, p.prediction, :updated_at
+    FROM (SELECT * FROM historical WHERE symbol = :symbol ORDER BY ts DESC LIMIT 1) h
+    LEFT JOIN (SELECT * FROM predictions WHERE symbol = :symbol ORDER BY ts DESC LIMIT 1) p ON 1'''
+
+
+class DashboardExporter:
+    """
+    Mantiene las tablas de los tableros: velas OHLC, resumen de KPIs y error de
+    predicción por día/semana/mes, y una fila con el último valor de cada símbolo.
+    """
+
+    def __init__(self, db_path='src/palladium/static/data/historical.db', export_dir=EXPORT_DIR, logger=None):
+        self.db_path = db_path
+        self.export_dir = export_dir
+        self.logger = logger or default_logger
+
+    def _connect(self):
+        connection = DataCollector(db_path=self.db_path, store_format=None).connect()
+        # sqrt es nativa desde SQLite 3.35 solo si se compiló con las funciones matemáticas
+        connection.create_function('sqrt', 1, lambda value: None if value is None else math.sqrt(value),
+                                   deterministic=True)
+        return connection
+
+    @staticmethod
+    def _period_start(connection, period, ts):
+        return connection.execute(f'SELECT {PERIODS[period]} FROM (SELECT ? AS ts)', (int(ts),)).fetchone()[0]
+
+    def _refresh_symbol(self, connection, symbol, source, from_ts, counts):
+        """Borra y recalcula, en cada resolución, los períodos desde el que contiene from_ts"""
+        for period, bucket in PERIODS.items():
+            start = self._period_start(connection, period, from_ts)
+            for table in SOURCES.get(source, []):
+                connection.execute(f'DELETE FROM {table} WHERE symbol = ? AND period = ? AND bucket_ts >= ?',
+                                   (symbol, period, start))
+                # rowcount no se informa en sentencias que empiezan con WITH
+                before = connection.total_changes
+                connection.execute(QUERIES[table].format(bucket=bucket),
+                                   {'symbol': symbol, 'period': period, 'from_ts': start})
+                counts[table] = counts.get(table, 0) + connection.total_changes - before
+
+    def refresh(self, symbols=None):
+        """
+        Recalcula los períodos tocados desde la última actualización (solo de
+        `symbols`, si se indican). Devuelve las filas recalculadas por tabla.
+        """
+        counts = {}
+        connection = self._connect()
+        try:
+            pending = connection.execute('SELECT symbol, source, from_ts FROM dashboard_dirty').fetchall()
+            pending = [entry for entry in pending if symbols is None or entry[0] in symbols]
+            with stage_timer('exporter.refresh', len(pending)) as timer, connection:
+                for symbol, source, from_ts in pending:
+                    self._refresh_symbol(connection, symbol, source, from_ts, counts)
+                    connection.execute('DELETE FROM dashboard_dirty WHERE symbol = ? AND source = ?', (symbol, source))
+                updated_at = datetime.now().isoformat(timespec='seconds')
+                for symbol in sorted({entry[0] for entry in pending}):
+                    connection.execute('DELETE FROM dashboard_latest WHERE symbol = ?', (symbol,))
+                    cursor = connection.execute(LATEST_QUERY, {'symbol': symbol, 'updated_at': updated_at})
+                    counts['dashboard_latest'] = counts.get('dashboard_latest', 0) + cursor.rowcount
+                timer.fields.update(counts)
+        finally:
+            connection.close()
+        if counts:
+            self.logger.info('Tablas de los tableros actualizadas: ' +
+                             ', '.join(f'{table} {rows} filas' for table, rows in counts.items()))
+        else:
+            self.logger.info('Tablas de los tableros al día: no hay períodos para recalcular')
+        return counts
+
+    def export(self, tables=TABLES):
+        """Escribe cada tabla en Parquet (escritura atómica) para Power BI; devuelve las rutas"""
+        os.makedirs(self.export_dir, exist_ok=True)
+        paths = []
+        connection = self._connect()
+        try:
+            for table in tables:
+                order = 'symbol' if table == 'dashboard_latest' else 'symbol, period, bucket_ts'
+                df = pd.read_sql_query(f'SELECT * FROM {table} ORDER BY {order}', connection)
+                path = os.path.join(self.export_dir, f'{table}.parquet')
+                df.to_parquet(path + '.tmp', index=False)
+                os.replace(path + '.tmp', path)
+                paths.append(path)
+        finally:
+            connection.close()
+        self.logger.info(f'Tablas de los tableros exportadas en {self.export_dir}')
+        return paths
+
+    def run(self, symbols=None, force=False):
+        """Actualiza las tablas y las exporta si cambió algo (o faltan los archivos, o con force)"""
+        counts = self.refresh(symbols)
+        missing = not all(os.path.exists(os.path.join(self.export_dir, f'{table}.parquet')) for table in TABLES)
+        if counts or missing or force:
+            self.export()
+        return counts
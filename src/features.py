@@ -0,0 +1,290 @@
+from collections import defaultdict, namedtuple
+
+import numpy as np
+import pandas as pd
+
+# Versión de las fórmulas de características; cambiarla invalida los resultados guardados
+FEATURE_SPEC_VERSION = 1
+
+
+class FeatureSpec(namedtuple('FeatureSpec', ['kind', 'column', 'window', 'lag', 'name'])):
+    """
+    Especificación declarativa de una característica: (kind, column, window, lag).
+    - kind: 'value', 'mean', 'std', 'sum', 'diff', 'pct_change' o 'range'
+    - window: barras (20) o duración ('20h', '90min'), que se convierte en barras
+      según el espaciado del índice
+    - lag: desplazamiento en barras (positivo = pasado, negativo = futuro)
+    """
+    __slots__ = ()
+
+    def __new__(cls, kind, column, window=1, lag=0, name=None):
+        if name is None:
+            name = column if kind == 'value' else f'{column}_{kind}{window}'
+            if lag:
+                name += f'_lag{lag}'
+        return super().__new__(cls, kind, column, window, lag, name)
+
+
+# Especificaciones compartidas por el Enricher (KPIs) y el Modeller (características)
+VOLATILITY = FeatureSpec('std', 'close', 20, name='volatility')
+SMA_20 = FeatureSpec('mean', 'close', 20, name='SMA_20')
+DAILY_RETURN = FeatureSpec('pct_change', 'close', 1, name='daily_return')
+MOMENTUM = FeatureSpec('diff', 'close', 14, name='momentum')
+
+
+def bar_seconds(index):
+    """Espaciado típico (mediana) entre barras de un DatetimeIndex, en segundos"""
+    if len(index) < 2:
+        raise ValueError('Se necesitan al menos dos barras para inferir la resolución')
+    return float(np.median(np.diff(index.asi8))) / 1e9
+
+
+def window_bars(window, seconds):
+    """Convierte una ventana en barras: un entero se usa tal cual, una duración se divide por la resolución"""
+    if isinstance(window, (int, np.integer)):
+        return int(window)
+    return max(int(round(pd.Timedelta(window).total_seconds() / seconds)), 1)
+
+
+def resolve_windows(specs, seconds):
+    """Especificaciones con las ventanas expresadas en tiempo convertidas a barras"""
+    return [spec._replace(window=window_bars(spec.window, seconds)) for spec in specs]
+
+
+def _block_size(max_window, n):
+    """Bloque de _window_sums: las sumas se centran en la media de cada bloque"""
+    return max(4 * max_window, min(1024, n))
+
+
+def _window_sums(x, windows):
+    """
+    Sumas y sumas de cuadrados por ventana usando sumas acumuladas, para todas las
+    ventanas a la vez. La serie se parte en bloques (con el contexto de la ventana
+    más larga) y cada bloque se centra en su propia media, de modo que la precisión
+    no se degrada con la longitud del histórico ni con la deriva del precio.
+    Devuelve (sumas, sumas de cuadrados, máscara de ventanas completas, referencia por fila).
+    """
+    n = len(x)
+    max_window = int(windows.max())
+    block = _block_size(max_window, n)
+    n_blocks = max(-(-n // block), 1)
+    padded = np.concatenate((np.full(max_window - 1, np.nan), x, np.full(n_blocks * block - n, np.nan)))
+    segments = np.lib.stride_tricks.sliding_window_view(padded, block + max_window - 1)[::block]
+
+    valid = ~np.isnan(segments)
+    counts = valid.sum(axis=1)
+    ref = np.where(counts > 0, np.where(valid, segments, 0.0).sum(axis=1) / np.maximum(counts, 1), 0.0)
+    centered = np.where(valid, segments - ref[:, None], 0.0)
+    zeros = np.zeros((n_blocks, 1))
+    cs = np.concatenate((zeros, np.cumsum(centered, axis=1)), axis=1)
+    cs2 = np.concatenate((zeros, np.cumsum(centered * centered, axis=1)), axis=1)
+    cn = np.concatenate((zeros, np.cumsum(valid, axis=1)), axis=1)
+
+    # Fila p del bloque: ventana [p + max_window - w, p + max_window) en coordenadas del segmento
+    end = np.arange(block) + max_window
+    start = end[:, None] - windows[None, :]
+    shape = (n_blocks * block, len(windows))
+    s1 = (cs[:, end, None] - cs[:, start]).reshape(shape)[:n]
+    s2 = (cs2[:, end, None] - cs2[:, start]).reshape(shape)[:n]
+    full = ((cn[:, end, None] - cn[:, start]) == windows).reshape(shape)[:n]
+    return s1, s2, full, np.repeat(ref, block)[:n, None]
+
+
+def _lagged(x, windows):
+    """Valores de hace `window` barras para todas las ventanas"""
+    rows = np.arange(len(x))[:, None] - windows[None, :]
+    return np.where(rows >= 0, x[np.maximum(rows, 0)], np.nan)
+
+
+def _value(x, windows, df):
+    return np.repeat(x[:, None], len(windows), axis=1)
+
+
+def _mean(x, windows, df):
+    s1, _, full, ref = _window_sums(x, windows)
+    return np.where(full, s1 / windows + ref, np.nan)
+
+
+def _sum(x, windows, df):
+    s1, _, full, ref = _window_sums(x, windows)
+    return np.where(full, s1 + ref * windows, np.nan)
+
+
+def _std(x, windows, df):
+    s1, s2, full, _ = _window_sums(x, windows)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        var = (s2 - s1 * s1 / windows) / (windows - 1)
+    return np.where(full & (windows > 1), np.sqrt(np.maximum(var, 0.0)), np.nan)
+
+
+def _diff(x, windows, df):
+    return x[:, None] - _lagged(x, windows)
+
+
+def _pct_change(x, windows, df):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return x[:, None] / _lagged(x, windows) - 1
+
+
+def _range(x, windows, df):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        price_range = (np.asarray(df['high'], dtype='float64') - np.asarray(df['low'], dtype='float64')) / x
+    return _value(price_range, windows, df)
+
+
+KINDS = {
+    'value': _value,
+    'mean': _mean,
+    'sum': _sum,
+    'std': _std,
+    'diff': _diff,
+    'pct_change': _pct_change,
+    'range': _range
+}
+
+
+def build_feature_matrix(df, specs):
+    """
+    Calcula todas las características en una pasada vectorizada.
+    Las especificaciones se agrupan por (kind, column), de modo que cada grupo se
+    resuelve con una sola operación matricial sin importar cuántas ventanas tenga.
+    Acepta un DataFrame o un diccionario columna -> arreglo NumPy.
+    Devuelve una matriz float64 contigua de forma (filas, características).
+    """
+    n = len(df) if isinstance(df, pd.DataFrame) else len(next(iter(df.values())))
+    if any(not isinstance(spec.window, (int, np.integer)) for spec in specs):
+        if not isinstance(df, pd.DataFrame):
+            raise ValueError('Las ventanas en tiempo necesitan un DataFrame con DatetimeIndex')
+        specs = resolve_windows(specs, bar_seconds(df.index))
+    matrix = np.empty((n, len(specs)), dtype='float64')
+    groups = defaultdict(list)
+    for position, spec in enumerate(specs):
+        groups[(spec.kind, spec.column)].append(position)
+
+    for (kind, column), positions in groups.items():
+        x = np.ascontiguousarray(df[column], dtype='float64')
+        windows = np.array([specs[position].window for position in positions])
+        matrix[:, positions] = KINDS[kind](x, windows, df)
+
+    # Desplazamientos: un solo gather para todas las columnas con lag
+    lags = np.array([spec.lag for spec in specs], dtype='int64')
+    if lags.any():
+        rows = np.arange(n)[:, None] - lags[None, :]
+        inside = (rows >= 0) & (rows < n)
+        matrix = np.where(inside, matrix[np.clip(rows, 0, max(n - 1, 0)), np.arange(len(specs))], np.nan)
+    return matrix
+
+
+def build_features(df, specs):
+    """Igual que build_feature_matrix pero devuelve un DataFrame con el índice original"""
+    return pd.DataFrame(build_feature_matrix(df, specs), index=df.index, columns=[spec.name for spec in specs])
+
+
+def context_bars(specs):
+    """Barras previas y posteriores que necesitan las ventanas y los desplazamientos"""
+    lookback = max(max(spec.window, 1) + max(spec.lag, 0) for spec in specs)
+    lookahead = max(max(-spec.lag, 0) for spec in specs)
+    return lookback, lookahead
+
+
+def extend_features(df, specs, cached, stable_rows):
+    """
+    Completa un resultado guardado cuando se agregan barras: reutiliza las filas de
+    `cached` que no dependen de las barras nuevas y recalcula solo la cola, con el
+    contexto mínimo que exigen las ventanas y los desplazamientos.
+    """
+    lookback, lookahead = context_bars(specs)
+    first = max(stable_rows - lookahead, 0)
+    context = max(first - lookback, 0)
+    tail = build_features(df.iloc[context:], specs).iloc[first - context:]
+    return pd.concat([cached.iloc[:first], tail])
+
+
+def _chunk_layout(specs):
+    """
+    (alineación, barras de contexto, barras posteriores) para calcular por bloques
+    con resultados idénticos a la serie completa. Cada grupo (kind, column) se
+    centra por bloques de _window_sums contados desde la primera barra: si cada
+    bloque empieza en un múltiplo de esos bloques y trae uno completo antes (más el
+    desplazamiento máximo) y otro después, sus sumas son las mismas bit a bit.
+    """
+    lookback, lookahead = context_bars(specs)
+    windows = defaultdict(list)
+    for spec in specs:
+        windows[(spec.kind, spec.column)].append(spec.window)
+    blocks = [_block_size(max(group), 1024) for group in windows.values()]
+    alignment = int(np.lcm.reduce(blocks))
+    context = alignment * -(-(max(blocks) + lookback) // alignment)
+    ahead = max(blocks) if lookahead else 0
+    return alignment, context, ahead
+
+
+def stream_feature_matrix(blocks, specs, chunk_rows=None):
+    """
+    build_feature_matrix para una serie que llega por bloques (iterable de
+    (índice, {columna: arreglo}) en orden, p. ej. PartitionedStore.iter_arrays).
+    Entre un bloque y el siguiente solo se arrastra la cola que necesitan las
+    ventanas; el resultado se emite en tramos de unas `chunk_rows` barras y es
+    idéntico al de la serie completa. Produce (índice, matriz float64).
+    """
+    alignment = context = ahead = None
+    index, columns = None, None
+    emitted = 0  # barras de `index` ya emitidas (las anteriores son contexto)
+    for block_index, block_columns in blocks:
+        if alignment is None:
+            if any(not isinstance(spec.window, (int, np.integer)) for spec in specs):
+                specs = resolve_windows(specs, bar_seconds(pd.DatetimeIndex(block_index)))
+            alignment, context, ahead = _chunk_layout(specs)
+            step = alignment * max(-(-(chunk_rows or alignment) // alignment), 1)
+            index, columns = block_index, dict(block_columns)
+        else:
+            index = np.concatenate((index, block_index))
+            columns = {name: np.concatenate((columns[name], block_columns[name])) for name in columns}
+        while len(index) - emitted >= step + ahead:
+            first = max(emitted - context, 0)
+            stop = emitted + step
+            matrix = build_feature_matrix({name: values[first:stop + ahead] for name, values in columns.items()}, specs)
+            yield index[emitted:stop], matrix[emitted - first:stop - first]
+            # Se descarta todo lo anterior al contexto del próximo tramo
+            drop = max(stop - context, 0)
+            index, columns = index[drop:], {name: values[drop:] for name, values in columns.items()}
+            emitted = stop - drop
+    if index is not None and len(index) > emitted:
+        first = max(emitted - context, 0)
+        matrix = build_feature_matrix({name: values[first:] for name, values in columns.items()}, specs)
+        yield index[emitted:], matrix[emitted - first:]
+
+
+def latest_features(columns, specs):
+    """
+    Calcula solo la fila más reciente a partir de las últimas barras (diccionario
+    columna -> arreglo). Pensado para servir predicciones barra a barra, donde
+    construir la matriz completa sería desproporcionado.
+    """
+    row = np.full(len(specs), np.nan)
+    for position, spec in enumerate(specs):
+        x = np.asarray(columns[spec.column], dtype='float64')
+        end = len(x) - spec.lag
+        if spec.lag < 0 or end < 1:
+            continue
+        if spec.kind == 'value':
+            value = x[end - 1]
+        elif spec.kind == 'range':
+            value = (columns['high'][end - 1] - columns['low'][end - 1]) / x[end - 1]
+        elif spec.kind in ('diff', 'pct_change'):
+            if end - 1 < spec.window:
+                continue
+            current, previous = x[end - 1], x[end - 1 - spec.window]
+            value = current - previous if spec.kind == 'diff' else current / previous - 1
+        else:
+            if end < spec.window:
+                continue
+            window = x[end - spec.window:end]
+            if spec.kind == 'mean':
+                value = window.mean()
+            elif spec.kind == 'sum':
+                value = window.sum()
+            else:
+                value = window.std(ddof=1) if spec.window > 1 else np.nan
+        row[position] = value
+    return row
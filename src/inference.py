@@ -0,0 +1,119 @@
+import os
+
+import numpy as np
+
+
+def _float32_bound(threshold):
+    """
+    Límite en float64 tal que un valor x cumple float32(x) <= umbral exactamente
+    cuando x < límite: el punto medio entre el mayor float32 <= umbral y el
+    siguiente float32. Un x justo en el punto medio se redondea al de mantisa par;
+    si ese es el menor, el punto medio también va a la izquierda.
+    """
+    below = threshold.astype('float32')
+    below = np.where(below > threshold, np.nextafter(below, np.float32(-np.inf)), below)
+    above = np.nextafter(below, np.float32(np.inf))
+    middle = (below.astype('float64') + above.astype('float64')) / 2
+    return np.where(below.view('int32') & 1 == 0, np.nextafter(middle, np.inf), middle)
+
+
+class CompiledForest:
+    """
+    Bosque de regresión compilado a arreglos planos de NumPy. No necesita sklearn
+    ni pickle para predecir.
+    - Recibe las características sin escalar y aplica el StandardScaler con las
+      mismas operaciones que sklearn: plegarlo en los umbrales cambia el redondeo
+      y desvía las filas que caen justo en un umbral
+    - Los nodos de todos los árboles están en arreglos contiguos (feature,
+      threshold, children, value); las hojas apuntan a sí mismas, de modo que el
+      recorrido avanza nivel por nivel para todas las filas y árboles a la vez
+    """
+
+    def __init__(self, feature, threshold, children, value, roots, depth, features, mean=None, scale=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.value = value
+        self.roots = roots
+        self.depth = int(depth)
+        self.features = list(features)
+        # Sin mean/scale los umbrales ya están en la escala de las características
+        self.mean = mean
+        self.scale = scale
+
+    @classmethod
+    def from_sklearn(cls, modelo, scaler=None, features=None):
+        """Compila un RandomForestRegressor (y opcionalmente su StandardScaler)"""
+        feature, threshold, children, value, roots = [], [], [], [], []
+        offset = 0
+        depth = 0
+        for estimator in modelo.estimators_:
+            tree = estimator.tree_
+            nodes = np.arange(tree.node_count)
+            leaf = tree.children_left < 0
+            tree_feature = np.where(leaf, 0, tree.feature)
+            # sklearn compara float32(x_escalado) <= t, es decir x_escalado < límite de
+            # redondeo del mayor float32 <= t
+            tree_threshold = _float32_bound(tree.threshold)
+            tree_threshold = np.where(leaf, np.inf, tree_threshold)
+            left = np.where(leaf, nodes, tree.children_left) + offset
+            right = np.where(leaf, nodes, tree.children_right) + offset
+
+            feature.append(tree_feature)
+            threshold.append(tree_threshold)
+            children.append(np.stack([left, right], axis=1))
+            value.append(tree.value.reshape(tree.node_count, -1)[:, 0])
+            roots.append(offset)
+            offset += tree.node_count
+            depth = max(depth, tree.max_depth)
+
+        features = features if features is not None else [f'x{i}' for i in range(modelo.n_features_in_)]
+        return cls(np.concatenate(feature).astype('int32'),
+                   np.concatenate(threshold),
+                   np.concatenate(children).astype('int32'),
+                   np.concatenate(value).astype('float64'),
+                   np.array(roots, dtype='int32'),
+                   depth,
+                   features,
+                   scaler.mean_.astype('float64') if scaler is not None else None,
+                   scaler.scale_.astype('float64') if scaler is not None else None)
+
+    def predict(self, X, chunk=1024):
+        """
+        Predice para una matriz (filas, características) sin escalar. Las filas se
+        procesan en bloques para que los índices de nodos quepan en cache.
+        """
+        X = np.asarray(X, dtype='float64')
+        if X.ndim == 1:
+            X = X[None, :]
+        if self.mean is not None:
+            X = (X - self.mean) / self.scale
+        predictions = np.empty(len(X))
+        for start in range(0, len(X), chunk):
+            block = np.ascontiguousarray(X[start:start + chunk])
+            values = block.ravel()
+            offsets = (np.arange(len(block)) * block.shape[1])[:, None]
+            node = np.broadcast_to(self.roots, (len(block), len(self.roots)))
+            for _ in range(self.depth):
+                # A la izquierda si x < límite (NaN va a la derecha, igual que sklearn)
+                go_right = ~(values[offsets + self.feature[node]] < self.threshold[node])
+                node = self.children[node, go_right.view('int8')]
+            predictions[start:start + chunk] = self.value[node].mean(axis=1)
+        return predictions
+
+    def save(self, path):
+        """Guarda los arreglos en un .npz (sin pickle)"""
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, feature=self.feature, threshold=self.threshold, children=self.children,
+                 value=self.value, roots=self.roots, depth=self.depth,
+                 features=np.array(self.features, dtype=str),
+                 **({} if self.mean is None else {'mean': self.mean, 'scale': self.scale}))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as arrays:
+            # Los archivos compilados antes de guardar el scaler traen los umbrales ya plegados
+            scaler = (arrays['mean'], arrays['scale']) if 'mean' in arrays.files else (None, None)
+            return cls(arrays['feature'], arrays['threshold'], arrays['children'], arrays['value'],
+                       arrays['roots'], arrays['depth'], arrays['features'].tolist(), *scaler)
@@ -1,31 +1,283 @@
+import atexit
+import cProfile
+import functools
+import json
 import logging
+import logging.handlers
 import os
-from src.utils.helpers import create_file
+import queue
+import sys
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+
+LOG_DIR = os.path.join('docs', 'logs')
+TIMINGS_FILE = os.path.join(LOG_DIR, 'timings.jsonl')
+PROFILES_DIR = os.path.join(LOG_DIR, 'profiles')
+
+# Listeners activos (uno por logger con cola) y sus handlers reales
+_listeners = []
+
+# Eventos de las etapas de esta ejecución, para el resumen final
+TIMINGS = []
+
+# Modo de perfilado por etapa: None, 'cprofile' o 'tracemalloc'
+_profile_mode = None
+_profile_lock = threading.Lock()
+_stages = threading.local()
+
+
+def _queued(logger, handlers):
+    """
+    Conecta el logger a una cola: el pipeline solo encola los registros y un hilo
+    (QueueListener) los escribe en los handlers reales, así la E/S nunca lo bloquea.
+    """
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    _listeners.append((logger, listener, handlers))
+
+
+def _stop_listeners():
+    for _, listener, _ in _listeners:
+        listener.stop()
+
+
+def _direct_in_child():
+    """
+    En un proceso hijo (fork) el hilo del listener no existe: los loggers vuelven a
+    escribir directamente en sus handlers para no perder registros.
+    """
+    for logger, _, handlers in _listeners:
+        for handler in list(logger.handlers):
+            if isinstance(handler, logging.handlers.QueueHandler):
+                logger.removeHandler(handler)
+        for handler in handlers:
+            logger.addHandler(handler)
+    _listeners.clear()
+
 
 def setup_logger():
 
-    log_dir = os.path.join('docs', 'logs')
-    os.makedirs(log_dir, exist_ok=True)
+    os.makedirs(LOG_DIR, exist_ok=True)
 
-    log_file = os.path.join(log_dir, 'application.txt')
+    log_file = os.path.join(LOG_DIR, 'application.txt')
 
     logger = logging.getLogger('DataCollector')
     logger.setLevel(logging.INFO)
 
     if not logger.handlers:
-        file_handler = logging.FileHandler(log_file)
+        file_handler = logging.FileHandler(log_file, delay=True)
         file_handler.setLevel(logging.INFO)
-        
+
         console_handler = logging.StreamHandler()
         console_handler.setLevel(logging.INFO)
-        
+
         formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
         file_handler.setFormatter(formatter)
         console_handler.setFormatter(formatter)
-        
-        logger.addHandler(file_handler)
-        logger.addHandler(console_handler)
+
+        _queued(logger, [file_handler, console_handler])
+
+        # Eventos de tiempos: una línea JSON por etapa
+        timing_logger = logging.getLogger('DataCollector.timing')
+        timing_logger.setLevel(logging.INFO)
+        timing_logger.propagate = False
+        timing_handler = logging.FileHandler(TIMINGS_FILE, delay=True)
+        timing_handler.setFormatter(logging.Formatter('%(message)s'))
+        _queued(timing_logger, [timing_handler])
+
+        atexit.register(_stop_listeners)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=_direct_in_child)
 
     return logger
 
-logger = setup_logger()
\ No newline at end of file
+
+def _windows_rss():
+    """Working set del proceso con GetProcessMemoryInfo (psapi) en Windows"""
+    import ctypes
+    from ctypes import wintypes
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                    ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                    ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                    ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+    counters = ProcessMemoryCounters()
+    counters.cb = ctypes.sizeof(counters)
+    process = ctypes.windll.kernel32.GetCurrentProcess()
+    if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+        raise OSError('GetProcessMemoryInfo falló')
+    return counters.WorkingSetSize
+
+
+def current_rss():
+    """
+    RSS actual del proceso en bytes (máximo histórico si no hay /proc; working set
+    en Windows). Devuelve 0 si no se puede medir: la medición nunca detiene el pipeline.
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        if sys.platform == 'win32':
+            return _windows_rss()
+        import resource
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if sys.platform == 'darwin' else maxrss * 1024
+    except (ImportError, OSError, AttributeError, ValueError):
+        return 0
+
+
+def configure_profiling(mode=None):
+    """Activa el perfilado por etapa: 'cprofile', 'tracemalloc' o None"""
+    global _profile_mode
+    if mode not in (None, 'cprofile', 'tracemalloc'):
+        raise ValueError(f'Modo de perfilado desconocido: {mode}')
+    _profile_mode = mode
+    if mode == 'cprofile':
+        os.makedirs(PROFILES_DIR, exist_ok=True)
+
+
+class StageTimer:
+    """
+    Mide una etapa del pipeline y emite un evento JSON con: etapa, filas, duración,
+    bytes escritos y variación de memoria (RSS). Con el perfilado activo agrega el
+    pico de memoria de tracemalloc o la ruta del perfil de cProfile (una etapa a la
+    vez: la más externa del primer hilo que lo solicite, porque no se pueden anidar).
+    Se usa como context manager (`with stage_timer(...) as stage`) o con @timed.
+    """
+
+    def __init__(self, stage, rows=None, **fields):
+        self.stage = stage
+        self.rows = rows
+        self.bytes = 0
+        self.fields = fields
+
+    def add_bytes(self, count):
+        self.bytes += count
+
+    def __enter__(self):
+        stack = _stages.__dict__.setdefault('stack', [])
+        self.profiling = bool(_profile_mode) and not stack and _profile_lock.acquire(blocking=False)
+        stack.append(self)
+        self.profiler = None
+        if self.profiling and _profile_mode == 'cprofile':
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        elif self.profiling:
+            # Si ya hay rastreo activo (MemoryBudget con --max_memory_mb) se comparte y no se detiene al salir
+            self.started_tracing = not tracemalloc.is_tracing()
+            if self.started_tracing:
+                tracemalloc.start()
+        self.rss = current_rss()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        _stages.stack.pop()
+        event = OrderedDict(
+            ts=time.time(),
+            stage=self.stage,
+            rows=self.rows,
+            duration_s=round(duration, 6),
+            bytes=self.bytes,
+            rss_delta_bytes=current_rss() - self.rss,
+            pid=os.getpid(),
+            status='error' if exc_type else 'ok'
+        )
+        event.update(self.fields)
+        if self.profiler is not None:
+            self.profiler.disable()
+            profile_path = os.path.join(PROFILES_DIR, f'{self.stage}-{os.getpid()}-{int(event["ts"] * 1000)}.prof')
+            self.profiler.dump_stats(profile_path)
+            event['profile'] = profile_path
+        elif self.profiling:
+            # Con rastreo compartido el pico no se reinicia: es el pico desde que empezó el rastreo
+            event['traced_peak_bytes'] = tracemalloc.get_traced_memory()[1]
+            if self.started_tracing:
+                tracemalloc.stop()
+        if self.profiling:
+            _profile_lock.release()
+        TIMINGS.append(event)
+        logging.getLogger('DataCollector.timing').info(json.dumps(event, default=str))
+        return False
+
+
+def stage_timer(stage, rows=None, **fields):
+    return StageTimer(stage, rows, **fields)
+
+
+def add_bytes(count):
+    """Suma bytes escritos a la etapa en curso (si hay una)"""
+    stack = getattr(_stages, 'stack', None)
+    if stack:
+        stack[-1].add_bytes(count)
+
+
+def _rows_of(args, kwargs):
+    """Filas del primer argumento que sea un DataFrame (o una tabla con len y columns)"""
+    for value in list(args) + list(kwargs.values()):
+        if hasattr(value, 'columns') and hasattr(value, '__len__'):
+            return len(value)
+    return None
+
+
+def timed(stage):
+    """
+    Decorador: mide el método con StageTimer. Las filas se toman del DataFrame de
+    entrada o, si no hay, del DataFrame devuelto.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage_timer(stage, _rows_of(args, kwargs)) as timer:
+                result = func(*args, **kwargs)
+                if timer.rows is None:
+                    timer.rows = _rows_of(result if isinstance(result, tuple) else (result,), {})
+                return result
+        return wrapper
+    return decorator
+
+
+def worker_timings(function, *args):
+    """
+    Ejecuta function(*args) (en un proceso de un pool) y devuelve (resultado, eventos
+    de tiempos que registró): TIMINGS es propio de cada proceso, así que el proceso
+    principal los suma a su resumen con merge_timings
+    """
+    first = len(TIMINGS)
+    result = function(*args)
+    return result, TIMINGS[first:]
+
+
+def merge_timings(events):
+    """Agrega a TIMINGS los eventos de otros procesos (los de este proceso ya están)"""
+    pid = os.getpid()
+    TIMINGS.extend(event for event in events if event['pid'] != pid)
+
+
+def timing_summary(events=None):
+    """Tabla con llamadas, tiempo total, filas y bytes por etapa"""
+    summary = OrderedDict()
+    for event in TIMINGS if events is None else events:
+        entry = summary.setdefault(event['stage'], {'calls': 0, 'duration': 0.0, 'rows': 0, 'bytes': 0})
+        entry['calls'] += 1
+        entry['duration'] += event['duration_s']
+        entry['rows'] += event['rows'] or 0
+        entry['bytes'] += event['bytes']
+    lines = [f"{'etapa':<28}{'llamadas':>9}{'tiempo (s)':>12}{'filas':>12}{'bytes':>14}"]
+    for stage, entry in summary.items():
+        lines.append(f"{stage:<28}{entry['calls']:>9}{entry['duration']:>12.3f}{entry['rows']:>12}{entry['bytes']:>14}")
+    return '\n'.join(lines)
+
+
+logger = setup_logger()
@@ -1,34 +1,76 @@
+import copy
 import os
 import numpy as np
 import pandas as pd
 import pickle
 import json
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import mean_squared_error, r2_score
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.preprocessing import StandardScaler
-from .enricher import Enricher
-from .utils.helpers import create_file
+from .cache import fingerprint
+from .inference import CompiledForest
+from .logger import timed
+from .features import (VOLATILITY, FeatureSpec, build_feature_matrix, build_features, context_bars, extend_features,
+                       stream_feature_matrix)
+from .registry import REGISTRY_DIR, ModelRegistry
+from .utils.helpers import DEFAULT_SYMBOL, symbol_filename
+
+# sklearn y .training se importan dentro de los métodos de entrenamiento: preparar
+# datos y predecir con el modelo compilado no los necesitan
+
+MODELS_DIR = 'src/palladium/static/models'
+
+# Características del modelo (kind, column, window, lag)
+MODEL_FEATURES = [
+    FeatureSpec('value', 'close'),
+    FeatureSpec('value', 'open'),
+    FeatureSpec('value', 'high'),
+    FeatureSpec('value', 'low'),
+    FeatureSpec('value', 'volume'),
+    FeatureSpec('mean', 'volume', 5, name='volume_ma5'),
+    FeatureSpec('mean', 'volume', 20, name='volume_ma20'),
+    FeatureSpec('range', 'close', name='price_range'),
+    FeatureSpec('mean', 'close', 5, name='price_ma5'),
+    FeatureSpec('mean', 'close', 20, name='price_ma20')
+]
+
+# Columnas de entrada de las que dependen las características
+MODEL_INPUTS = ['open', 'high', 'low', 'close', 'volume']
+
+# Target: volatilidad de la siguiente barra
+TARGET = VOLATILITY._replace(lag=-1, name='target_volatility')
+
+# Modelos disponibles: el RandomForest sobre MODEL_FEATURES o un modelo econométrico
+# de volatilidad condicional (src/volatility.py) calibrado a la escala del target
+BACKENDS = ['forest', 'garch', 'gjr', 'ewma']
 
 
 class Modeller:
-    def __init__(self, logger, pkl_path='src/palladium/static/models/palladium_model.pkl'):
+    def __init__(self, logger, pkl_path=None, symbol=DEFAULT_SYMBOL, registry_root=REGISTRY_DIR, backend='forest'):
+        if backend not in BACKENDS:
+            raise ValueError(f"Backend desconocido: {backend} (use {', '.join(BACKENDS)})")
         self.logger = logger
-        self.pkl_ruta = pkl_path
-        self.enricher = Enricher(logger)
+        self.symbol = symbol
+        self.backend = backend
+        self.pkl_ruta = pkl_path or os.path.join(MODELS_DIR, symbol_filename('palladium_model', symbol, 'pkl'))
+        self.registry = ModelRegistry(logger, os.path.splitext(os.path.basename(self.pkl_ruta))[0], root=registry_root)
         self.logger.info(f"Ruta del modelo configurada en: {self.pkl_ruta}")
 
-    def preparar_df(self, df=pd.DataFrame()):
+    @timed('modeller.preparar_df')
+    def preparar_df(self, df=pd.DataFrame(), cache=None, store=None, start=None, end=None, chunk_rows=None,
+                    dtype='float64'):
         """
         Prepara los datos para predecir la volatilidad.
-        Utiliza el enricher existente para calcular la volatilidad.
+        Las características se declaran en MODEL_FEATURES y el target usa la misma
+        especificación de volatilidad que el Enricher, desplazada una barra al futuro.
+        Con cache, las filas ya calculadas se reutilizan y solo se recalcula la cola.
+        Con `store` (PartitionedStore) se leen del disco solo MODEL_INPUTS en el
+        rango [start, end] más el contexto de las ventanas, sin pasar por `df`.
+        Con `chunk_rows` se recorre `store` (PartitionedStore o DataCollector) por
+        bloques sin cargar el histórico. dtype='float32' reduce a la mitad la matriz resultante.
         """
-        df = df.copy()
+        if store is not None and chunk_rows:
+            return self._preparar_chunked(store, start, end, chunk_rows, dtype)
+        if store is not None:
+            return self._preparar_store(store, start, end, dtype)
         try:
-            # Asegurarse de que el índice es datetime
-            if not isinstance(df.index, pd.DatetimeIndex):
-                df.index = pd.to_datetime(df.index)
-
             # Renombrar columnas si es necesario para coincidir con el formato del enricher
             column_mapping = {
                 'Close': 'close',
@@ -37,64 +79,106 @@ class Modeller:
                 'Low': 'low',
                 'Volume': 'volume'
             }
-            df = df.rename(columns=column_mapping)
-            
-            # Usar el enricher para calcular la volatilidad
-            df['hist_volatility'] = self.enricher.calculate_volatility(df)
-            
-            # Características adicionales útiles para predecir volatilidad
-            df['volume_ma5'] = df['volume'].rolling(window=5).mean()
-            df['volume_ma20'] = df['volume'].rolling(window=20).mean()
-            df['price_range'] = (df['high'] - df['low']) / df['close']
-            df['price_ma5'] = df['close'].rolling(window=5).mean()
-            df['price_ma20'] = df['close'].rolling(window=20).mean()
-            
-            # Crear el target (volatilidad futura)
-            df['target_volatility'] = df['hist_volatility'].shift(-1)
-            
+            if any(col in df.columns for col in column_mapping):
+                df = df.rename(columns=column_mapping)
+
+            # Asegurarse de que el índice es datetime
+            index = df.index if isinstance(df.index, pd.DatetimeIndex) else pd.to_datetime(df.index)
+
+            # Características y target calculados en una sola pasada vectorizada
+            specs = MODEL_FEATURES + [TARGET]
+            cache_name = f'features-{self.symbol}'
+            hit = cache.load(cache_name, df, MODEL_INPUTS, version=str(specs)) if cache is not None else None
+            if hit is not None and hit.complete:
+                prepared = hit.frame
+                self.logger.info(f"Características recuperadas del cache ({len(prepared)} filas)")
+            elif hit is not None:
+                prepared = extend_features(df, specs, hit.frame, hit.rows)
+                self.logger.info(f"Características recuperadas del cache; recalculadas {len(df) - hit.rows} filas")
+            else:
+                prepared = build_features(df, specs)
+            if cache is not None and not (hit is not None and hit.complete):
+                cache.save(cache_name, df, MODEL_INPUTS, prepared, version=str(specs))
+            prepared.index = index
+
             # Eliminar filas con valores NaN
-            df = df.dropna()
-            
-            # Seleccionar las características para el modelo
-            features = [ 'close', 'open', 'high', 'low', 'volume',
-            'volume_ma5', 'volume_ma20',
-            'price_range', 'price_ma5', 'price_ma20']
-            
-            # Asegurarse de que todas las características estén presentes
-            df = df[features + ['target_volatility']]
+            prepared = prepared.dropna().astype(dtype, copy=False)
             
             self.logger.info("Datos preparados exitosamente para predicción de volatilidad")
-            return df, True
+            return prepared, True
         except Exception as e:
             self.logger.error(f"Error en la preparación de datos: {str(e)}")
             return df, False   
          
-    def guardar_modelo(self, modelo):
-        """Guarda el modelo entrenado usando pickle"""
+    @staticmethod
+    def _en_rango(index, matrix, start, end, dtype):
+        """Filas de [start, end] sin NaN: las barras de contexto no forman parte del resultado"""
+        first = 0 if start is None else int(np.searchsorted(index, np.datetime64(pd.Timestamp(start)), side='left'))
+        last = len(index) if end is None else int(np.searchsorted(index, np.datetime64(pd.Timestamp(end)), side='right'))
+        matrix = matrix[first:last]
+        complete = ~np.isnan(matrix).any(axis=1)
+        return pd.DataFrame(matrix[complete].astype(dtype, copy=False),
+                            index=pd.DatetimeIndex(index[first:last][complete], name='datetime'),
+                            columns=[spec.name for spec in MODEL_FEATURES + [TARGET]])
+
+    def _preparar_store(self, store, start, end, dtype='float64'):
+        """Características desde los arreglos memory-mapped del almacenamiento columnar"""
         try:
+            specs = MODEL_FEATURES + [TARGET]
+            lookback, lookahead = context_bars(specs)
+            index, columns = store.read_arrays(MODEL_INPUTS, start, end, lookback=lookback, lookahead=lookahead)
+            prepared = self._en_rango(index, build_feature_matrix(columns, specs), start, end, dtype)
+            self.logger.info(f"Datos preparados desde {store.path} ({len(prepared)} filas)")
+            return prepared, True
+        except Exception as e:
+            self.logger.error(f"Error en la preparación de datos: {str(e)}")
+            return pd.DataFrame(), False
 
-            self.logger.info(f"Intentando guardar modelo en: {self.pkl_ruta}")
-            
-            # Usar create_file para guardar el modelo
-            create_file(modelo,self.pkl_ruta, file_format='pkl')
+    def _preparar_chunked(self, store, start, end, chunk_rows, dtype='float64'):
+        """
+        Características por bloques de `chunk_rows` barras con stream_feature_matrix:
+        en memoria solo quedan el bloque en curso, la cola que arrastran las ventanas
+        y las filas ya preparadas (en `dtype`). El resultado es idéntico al de _preparar_store.
+        """
+        try:
+            specs = MODEL_FEATURES + [TARGET]
+            lookback, lookahead = context_bars(specs)
+            blocks = store.iter_arrays(MODEL_INPUTS, chunk_rows, start, end, lookback=lookback, lookahead=lookahead)
+            parts = [self._en_rango(index, matrix, start, end, dtype)
+                     for index, matrix in stream_feature_matrix(blocks, specs, chunk_rows)]
+            prepared = pd.concat(parts) if parts else pd.DataFrame(columns=[spec.name for spec in specs], dtype=dtype)
+            self.logger.info(f"Datos preparados por bloques de {chunk_rows} barras ({len(prepared)} filas)")
+            return prepared, True
+        except Exception as e:
+            self.logger.error(f"Error en la preparación de datos: {str(e)}")
+            return pd.DataFrame(), False
 
-            
-            # Verificar que el archivo se creó correctamente
-            if os.path.exists(self.pkl_ruta):
-                file_size = os.path.getsize(self.pkl_ruta)
-                self.logger.info(f"Modelo guardado exitosamente en {self.pkl_ruta} (Tamaño: {file_size/1024:.2f} KB)")
-                return True
-            else:
-                raise Exception("El archivo no se creó correctamente")
-                
+    def guardar_modelo(self, modelo, metadata=None):
+        """
+        Registra el modelo entrenado como una nueva versión en el registro de modelos,
+        junto con su versión compilada (solo NumPy)
+        """
+        try:
+            self.logger.info(f"Intentando registrar modelo en: {self.registry.path}")
+            compiled = CompiledForest.from_sklearn(modelo['model'], modelo['scaler'], modelo.get('features')) \
+                if 'model' in modelo else None
+            self.registry.register(modelo, metadata or {}, compiled=compiled)
+            return True
         except Exception as e:
             self.logger.error(f"Error al guardar el modelo: {str(e)}")
-            self.logger.error(f"Ruta intentada: {self.pkl_ruta}")
+            self.logger.error(f"Ruta intentada: {self.registry.path}")
             return False
 
     def cargar_modelo(self):
-        """Carga un modelo previamente guardado"""
+        """
+        Carga la versión vigente del registro (en memoria tras la primera carga).
+        Si el registro está vacío usa el pickle heredado.
+        """
         try:
+            modelo, metadata = self.registry.load()
+            if modelo is not None:
+                self.logger.info(f"Modelo cargado exitosamente (versión {metadata['version']})")
+                return modelo
             with open(self.pkl_ruta, 'rb') as archivo:
                 modelo = pickle.load(archivo)
             self.logger.info("Modelo cargado exitosamente")
@@ -106,79 +190,264 @@ class Modeller:
             self.logger.error(f"Error al cargar el modelo: {str(e)}")
             return None
 
-    def entrenar_df(self, df=pd.DataFrame()):
-        """Entrena el modelo con los datos proporcionados"""
-        df = df.copy()
+    @timed('modeller.entrenar_df')
+    def entrenar_df(self, df=pd.DataFrame(), walk_forward=False, grid=None, n_folds=5, n_jobs=None):
+        """
+        Entrena el modelo con los datos proporcionados.
+        La evaluación es cronológica: sin walk_forward se reserva el último 20% de las
+        barras; con walk_forward se evalúa la grilla de hiperparámetros con ventanas
+        expansivas en paralelo y se reentrena la mejor configuración con todo el histórico.
+        """
+        if self.backend != 'forest':
+            return self._entrenar_volatilidad(df, walk_forward=walk_forward, n_folds=n_folds, n_jobs=n_jobs)
+        from sklearn.metrics import mean_squared_error, r2_score
+        from sklearn.model_selection import train_test_split
+        from sklearn.preprocessing import StandardScaler
+        from .training import build_model, feature_columns, run_grid
         try:
             # Preparar los datos
-            # Asumimos que la última columna es el target (precio futuro)
+            # Asumimos que la última columna es el target (volatilidad futura)
             X = df.iloc[:, :-1]  # Todas las columnas excepto la última
             y = df.iloc[:, -1]   # Última columna como target
-            
-            # Dividir los datos en conjuntos de entrenamiento y prueba
-            X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-            
+
+            leaderboard = None
+            if walk_forward:
+                leaderboard = run_grid(self.logger, X, y, grid=grid, n_folds=n_folds, n_jobs=n_jobs)
+                self.logger.info("\nLeaderboard walk-forward:\n" + leaderboard.drop(columns='config').head(10).to_string())
+                best = leaderboard.iloc[0]
+                config = best['config']
+                metrics = {'r2': best['r2'], 'mse': best['mse'], 'rmse': best['rmse'], 'folds': int(best['folds'])}
+                features = feature_columns(config, X.columns)
+                X_train, y_train = X[features], y
+            else:
+                # Dividir cronológicamente: el futuro nunca entra al entrenamiento
+                config = {'n_estimators': 100, 'max_depth': 10, 'features': 'all'}
+                features = list(X.columns)
+                X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, shuffle=False)
+
             # Escalar los datos
             scaler = StandardScaler()
             X_train_scaled = scaler.fit_transform(X_train)
-            X_test_scaled = scaler.transform(X_test)
-            
+
             # Crear y entrenar el modelo
-            modelo = RandomForestRegressor(
-                n_estimators=100,  # número de árboles
-                max_depth=10,      # profundidad máxima de cada árbol
-                random_state=42    # para reproducibilidad
-            )
+            modelo = build_model(config, n_jobs=n_jobs)
             modelo.fit(X_train_scaled, y_train)
-            
-            # Guardar el modelo y el scaler
+
+            if not walk_forward:
+                # Evaluar el modelo
+                y_pred = modelo.predict(scaler.transform(X_test))
+                metrics = {'r2': r2_score(y_test, y_pred), 'mse': mean_squared_error(y_test, y_pred)}
+
+            # Registrar el modelo y el scaler con sus metadatos
             self.guardar_modelo({
                 'model': modelo,
-                'scaler': scaler
+                'scaler': scaler,
+                'features': features
+            }, {
+                'symbol': self.symbol,
+                'features': features,
+                'target': df.columns[-1],
+                'training_window': [str(df.index.min()), str(df.index.max())],
+                'rows': len(df),
+                'metrics': metrics,
+                'validation': 'walk_forward' if walk_forward else 'holdout_cronologico',
+                'leaderboard': leaderboard.drop(columns='config').head(10).to_dict('records') if leaderboard is not None else None,
+                'data_fingerprint': fingerprint(df, df.columns),
+                'params': modelo.get_params()
             })
-            
-            # Evaluar el modelo
-            y_pred = modelo.predict(X_test_scaled)
-            r2 = r2_score(y_test, y_pred)
-            mse = mean_squared_error(y_test, y_pred)
-            
+
             # Calcular la importancia de las características
             feature_importance = pd.DataFrame({
-                'feature': X.columns,
+                'feature': features,
                 'importance': modelo.feature_importances_
             }).sort_values('importance', ascending=False)
-            
-            self.logger.info(f"Modelo entrenado. R2: {r2:.4f}, MSE: {mse:.4f}")
+
+            self.logger.info(f"Modelo entrenado. R2: {metrics['r2']:.4f}, MSE: {metrics['mse']:.4f}")
             self.logger.info("\nImportancia de características:\n" + str(feature_importance))
-            
+
+            return df, True
+        except Exception as e:
+            self.logger.error(f"Error en el entrenamiento: {str(e)}")
+            return df, False
+
+    def _escala_volatilidad(self, df, sigma2):
+        """Volatilidad condicional en unidades de precio: cierre × σ del rendimiento siguiente"""
+        from .volatility import SCALE
+        return df['close'].to_numpy(dtype='float64') * np.sqrt(sigma2) / SCALE
+
+    def _entrenar_volatilidad(self, df, walk_forward=False, n_folds=5, n_jobs=None):
+        """
+        Ajusta el backend econométrico (GARCH, GJR o EWMA) sobre los rendimientos del
+        cierre. Para comparar con el RandomForest, la volatilidad condicional se lleva a
+        la escala del target (desviación de 20 barras del precio) con un factor de
+        calibración estimado por mínimos cuadrados en el tramo de entrenamiento.
+        Sin walk_forward se reserva el último 20%; con walk_forward se reajusta en
+        ventanas móviles (en paralelo) y cada ajuste pronostica las barras siguientes.
+        """
+        from .volatility import conditional_variance, fit, log_returns, rolling_fit, rolling_forecast
+        try:
+            target = df.iloc[:, -1].to_numpy(dtype='float64')
+            returns = log_returns(df['close'])
+            split = int(len(df) * 0.8)
+
+            if walk_forward:
+                window = len(returns) // 2
+                step = max((len(returns) - window) // (n_folds * 20), 1)
+                fits = rolling_fit(returns, self.backend, window=window, step=step, n_jobs=n_jobs)
+                positions, sigma2 = rolling_forecast(returns, fits, window, step)
+                # El rendimiento r_k va del cierre k al k+1: su varianza se pronostica en la fila k
+                x = self._escala_volatilidad(df.iloc[positions], sigma2)
+                y = target[positions]
+                calibration_rows = slice(0, max(len(x) // n_folds, 1))
+                evaluation_rows = slice(calibration_rows.stop, len(x))
+                modelo = fit(returns, self.backend, start=[fits[-1]['params'][name] for name in fits[-1]['params']])
+                validation = {'window': window, 'step': step, 'fits': len(fits)}
+            else:
+                modelo = fit(returns[:split - 1], self.backend)
+                x = self._escala_volatilidad(df, conditional_variance(modelo, returns)[:len(df)])
+                y = target
+                calibration_rows, evaluation_rows = slice(0, split), slice(split, len(df))
+                validation = None
+
+            calibration = float(np.dot(x[calibration_rows], y[calibration_rows]) /
+                                np.dot(x[calibration_rows], x[calibration_rows]))
+            errors = y[evaluation_rows] - calibration * x[evaluation_rows]
+            mse = float(np.mean(errors ** 2))
+            r2 = float(1 - np.sum(errors ** 2) / np.sum((y[evaluation_rows] - y[evaluation_rows].mean()) ** 2))
+            metrics = {'r2': r2, 'mse': mse, 'rmse': float(np.sqrt(mse))}
+
+            modelo['calibration'] = calibration
+            metadata = {
+                'symbol': self.symbol,
+                'backend': self.backend,
+                'features': ['close'],
+                'target': df.columns[-1],
+                'training_window': [str(df.index.min()), str(df.index.max())],
+                'rows': len(df),
+                'metrics': metrics,
+                'validation': 'walk_forward' if walk_forward else 'holdout_cronologico',
+                'rolling': validation,
+                'data_fingerprint': fingerprint(df, df.columns),
+                'volatility': modelo
+            }
+            if not self.guardar_modelo(dict(modelo, backend=self.backend), metadata):
+                return df, False
+            self.logger.info(f"Modelo {self.backend} entrenado. R2: {r2:.4f}, MSE: {mse:.4f}, "
+                             f"parámetros: {modelo['params']}, persistencia: {modelo['persistence']:.4f}")
             return df, True
         except Exception as e:
             self.logger.error(f"Error en el entrenamiento: {str(e)}")
             return df, False
 
+    def _predecir_volatilidad(self, df, modelo):
+        """Volatilidad de la siguiente barra (escala del target) con los parámetros guardados"""
+        from .volatility import conditional_variance, log_returns
+        sigma2 = conditional_variance(modelo, log_returns(df['close']))[:len(df)]
+        return modelo['calibration'] * self._escala_volatilidad(df, sigma2)
+
+    @timed('modeller.reentrenar_df')
+    def reentrenar_df(self, df=pd.DataFrame(), new_trees=10, min_window=500, drift_ratio=1.5, n_jobs=None):
+        """
+        Reentrenamiento incremental: solo procesa las barras posteriores a la ventana
+        de entrenamiento del modelo vigente.
+        - Evalúa el modelo con las barras nuevas (error fuera de muestra)
+        - Si el MSE supera `drift_ratio` veces el registrado, hace un reentrenamiento completo
+        - Si no, actualiza el scaler con partial_fit (ajustando los umbrales de los árboles),
+          agrega `new_trees` árboles entrenados con la ventana reciente y retira los más antiguos
+        Los backends econométricos se reajustan completos: un ajuste toma milisegundos.
+        """
+        if self.backend != 'forest':
+            return self._entrenar_volatilidad(df, n_jobs=n_jobs)
+        from sklearn.metrics import mean_squared_error
+        from .training import remap_thresholds, replace_oldest_trees
+        try:
+            modelo, metadata = self.registry.load()
+            if modelo is None or 'features' not in modelo:
+                self.logger.info("No hay un modelo versionado previo; se entrena desde cero")
+                return self.entrenar_df(df, n_jobs=n_jobs)
+
+            trained_until = pd.Timestamp(metadata['training_window'][1])
+            new_rows = df[df.index > trained_until]
+            if new_rows.empty:
+                self.logger.info("No hay barras nuevas desde el último entrenamiento")
+                return df, True
+
+            # Se trabaja sobre una copia: el artefacto cargado es la entrada del cache en memoria
+            # del registro (versión vigente) y no debe cambiar ni quedar a medio actualizar
+            modelo = copy.deepcopy(modelo)
+            features = modelo['features']
+            target = df.columns[-1]
+            scaler = modelo['scaler']
+            forest = modelo['model']
+
+            # Control de deriva con el error sobre las barras que el modelo no ha visto
+            y_pred = forest.predict(scaler.transform(new_rows[features]))
+            drift_mse = mean_squared_error(new_rows[target], y_pred)
+            baseline_mse = metadata['metrics']['mse']
+            if drift_mse > baseline_mse * drift_ratio:
+                self.logger.warning(f"Deriva detectada (MSE {drift_mse:.4f} vs {baseline_mse:.4f}); reentrenamiento completo")
+                return self.entrenar_df(df, n_jobs=n_jobs)
+
+            # Scaler con estadísticas acumuladas; los umbrales se trasladan a la nueva escala
+            old_mean, old_scale = scaler.mean_.copy(), scaler.scale_.copy()
+            scaler.partial_fit(new_rows[features])
+            remap_thresholds(forest, old_mean, old_scale, scaler.mean_, scaler.scale_)
+
+            # Árboles nuevos sobre la ventana reciente (al menos `min_window` filas)
+            recent = df.iloc[-max(len(new_rows), min_window):]
+            forest.set_params(n_jobs=n_jobs)
+            replace_oldest_trees(forest, scaler.transform(recent[features]), recent[target], new_trees)
+
+            self.guardar_modelo(modelo, dict(
+                metadata,
+                training_window=[metadata['training_window'][0], str(df.index.max())],
+                rows=metadata['rows'] + len(new_rows),
+                data_fingerprint=fingerprint(df, df.columns),
+                incremental={
+                    'base_version': metadata['version'],
+                    'new_rows': len(new_rows),
+                    'window_rows': len(recent),
+                    'trees_replaced': new_trees,
+                    'drift_mse': drift_mse,
+                    'scaler_samples': int(scaler.n_samples_seen_) if np.ndim(scaler.n_samples_seen_) == 0
+                    else int(scaler.n_samples_seen_.max())
+                }
+            ))
+            self.logger.info(f"Modelo actualizado con {len(new_rows)} barras nuevas "
+                             f"({new_trees} árboles reemplazados, MSE fuera de muestra {drift_mse:.4f})")
+            return df, True
+        except Exception as e:
+            self.logger.error(f"Error en el reentrenamiento incremental: {str(e)}")
+            return df, False
+
+    @timed('modeller.predecir_df')
     def predecir_df(self, df=pd.DataFrame()):
         """Realiza predicciones usando el modelo entrenado"""
-        df = df.copy()
         try:
-            # Cargar el modelo y el scaler
-            saved_objects = self.cargar_modelo()
-            if saved_objects is None:
-                raise Exception("No se encontró un modelo guardado")
-            
-            modelo = saved_objects['model']
-            scaler = saved_objects['scaler']
-            
-            # Preparar los datos para la predicción
-            X = df.iloc[:, :-1]  # Todas las columnas excepto la última
-            
-            # Escalar los datos
-            X_scaled = scaler.transform(X)
-            
-            # Realizar predicción
-            predicciones = modelo.predict(X_scaled)
-            
-            # Agregar las predicciones al DataFrame
-            df['prediccion'] = predicciones
+            # El modelo compilado predice sin sklearn; los modelos anteriores usan el scaler
+            compiled, _ = self.registry.load_compiled()
+            metadata = self.registry.metadata() if compiled is None and self.registry.latest_version() else {}
+            if compiled is not None:
+                predicciones = compiled.predict(df[compiled.features].to_numpy(dtype='float64'))
+            elif metadata.get('backend', 'forest') != 'forest':
+                # Los parámetros del modelo econométrico están en los metadatos: no se carga joblib
+                predicciones = self._predecir_volatilidad(df, metadata['volatility'])
+            else:
+                saved_objects = self.cargar_modelo()
+                if saved_objects is None:
+                    raise Exception("No se encontró un modelo guardado")
+
+                modelo = saved_objects['model']
+                scaler = saved_objects['scaler']
+
+                # Preparar los datos para la predicción (las columnas con las que se entrenó)
+                X = df[saved_objects['features']] if 'features' in saved_objects else df.iloc[:, :-1]
+
+                # Escalar los datos y realizar predicción
+                predicciones = modelo.predict(scaler.transform(X))
+
+            # Agregar las predicciones en un nuevo DataFrame
+            df = df.assign(prediccion=predicciones)
             
             # Obtener el último valor predicho y su fecha
             ultimo_valor = predicciones[-1]
@@ -0,0 +1,198 @@
+import json
+import math
+import os
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from src.enricher import KPI_COLUMNS
+
+
+class OnlineEnricher:
+    """
+    Calcula los mismos KPIs que Enricher.enrich_data barra a barra, con costo O(1)
+    por barra. Mantiene el estado de las ventanas móviles:
+    - Varianza de Welford deslizante para la volatilidad (20 barras)
+    - Suma acumulada para la SMA
+    - Arrastre de la EMA
+    - Ventanas de ganancias/pérdidas para el RSI
+    - Producto acumulado de rendimientos
+    - Buffer circular de cierres para el momentum
+    El estado se puede serializar para reanudar sin reprocesar el histórico.
+    """
+
+    def __init__(self, window=20, rsi_periods=14, momentum_period=14):
+        self.window = window
+        self.rsi_periods = rsi_periods
+        self.momentum_period = momentum_period
+        self.alpha = 2 / (window + 1)
+
+        self.count = 0
+        self.closes = deque(maxlen=max(window, momentum_period + 1))
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.ema = None
+        self.gains = deque(maxlen=rsi_periods)
+        self.losses = deque(maxlen=rsi_periods)
+        self.gain_sum = 0.0
+        self.loss_sum = 0.0
+        self.cumulative = math.nan
+        self.last_datetime = None
+
+    def _window_values(self):
+        return list(self.closes)[-self.window:]
+
+    def _resync(self):
+        """Recalcula las sumas desde los buffers para evitar la deriva numérica"""
+        values = self._window_values()
+        self.mean = sum(values) / len(values)
+        self.m2 = sum((value - self.mean) ** 2 for value in values)
+        self.gain_sum = sum(self.gains)
+        self.loss_sum = sum(self.losses)
+
+    def update(self, bar):
+        """Procesa una barra (diccionario o Series con 'close') y devuelve sus KPIs"""
+        close = float(bar['close'])
+        prev_close = self.closes[-1] if self.closes else None
+        filled = min(len(self.closes), self.window)
+
+        # Volatilidad (Welford deslizante) y SMA
+        if filled < self.window:
+            n = filled + 1
+            delta = close - self.mean
+            self.mean += delta / n
+            self.m2 += delta * (close - self.mean)
+        else:
+            n = self.window
+            oldest = self.closes[-self.window]
+            new_mean = self.mean + (close - oldest) / n
+            self.m2 += (close - oldest) * (close - new_mean + oldest - self.mean)
+            self.mean = new_mean
+
+        # RSI: la primera barra aporta ganancia y pérdida 0, igual que delta.where(...)
+        delta = close - prev_close if prev_close is not None else 0.0
+        if len(self.gains) == self.rsi_periods:
+            self.gain_sum -= self.gains[0]
+            self.loss_sum -= self.losses[0]
+        self.gains.append(max(delta, 0.0))
+        self.losses.append(max(-delta, 0.0))
+        self.gain_sum += self.gains[-1]
+        self.loss_sum += self.losses[-1]
+
+        # Momentum: cierre actual contra el de hace `momentum_period` barras
+        momentum = close - self.closes[-self.momentum_period] \
+            if len(self.closes) >= self.momentum_period else math.nan
+
+        self.closes.append(close)
+        self.count += 1
+        if self.count % self.window == 0:
+            self._resync()
+
+        # EMA (adjust=False)
+        self.ema = close if self.ema is None else (1 - self.alpha) * self.ema + self.alpha * close
+
+        # Rendimientos
+        daily_return = close / prev_close - 1 if prev_close is not None else math.nan
+        if not math.isnan(daily_return):
+            self.cumulative = (1 + daily_return) if math.isnan(self.cumulative) \
+                else self.cumulative * (1 + daily_return)
+
+        full = n == self.window
+        rsi = math.nan
+        if len(self.gains) == self.rsi_periods:
+            gain = self.gain_sum / self.rsi_periods
+            loss = self.loss_sum / self.rsi_periods
+            if loss > 0:
+                rsi = 100 - 100 / (1 + gain / loss)
+            elif gain > 0:
+                rsi = 100.0
+
+        if 'datetime' in bar:
+            self.last_datetime = str(bar['datetime'])
+        kpis = {
+            'volatility': math.sqrt(max(self.m2, 0.0) / (n - 1)) if full else math.nan,
+            'SMA_20': self.mean if full else math.nan,
+            'EMA_20': self.ema,
+            'RSI': rsi,
+            'daily_return': daily_return,
+            'cumulative_return': self.cumulative,
+            'momentum': momentum
+        }
+        # Redondear a 4 decimales y llenar NaN con 0, igual que el cálculo por lotes
+        return {key: 0.0 if math.isnan(value) else round(value, 4) for key, value in kpis.items()}
+
+    def update_batch(self, df):
+        """Procesa un micro-lote de barras y devuelve un DataFrame con los KPIs"""
+        rows = [self.update({'close': close}) for close in df['close'].to_numpy()]
+        if len(df):
+            self.last_datetime = str(df.index[-1])
+        return pd.DataFrame(rows, index=df.index, columns=KPI_COLUMNS)
+
+    @classmethod
+    def from_history(cls, df, **kwargs):
+        """Construye el estado a partir de un histórico sin recorrerlo barra a barra"""
+        enricher = cls(**kwargs)
+        close = df['close'].to_numpy(dtype='float64')
+        if len(close) == 0:
+            return enricher
+        enricher.count = len(close)
+        enricher.closes.extend(close[-enricher.closes.maxlen:].tolist())
+        # La primera barra del histórico aporta delta 0 al RSI
+        tail = close[-(enricher.rsi_periods + 1):]
+        delta = np.diff(tail) if len(close) > enricher.rsi_periods else np.diff(tail, prepend=tail[0])
+        enricher.gains.extend(np.where(delta > 0, delta, 0.0).tolist())
+        enricher.losses.extend(np.where(delta < 0, -delta, 0.0).tolist())
+        enricher.ema = float(df['close'].ewm(span=enricher.window, adjust=False).mean().iloc[-1])
+        enricher.cumulative = float((1 + df['close'].pct_change()).cumprod().iloc[-1])
+        enricher.last_datetime = str(df.index[-1])
+        enricher._resync()
+        return enricher
+
+    def to_dict(self):
+        """Serializa el estado a un diccionario compatible con JSON"""
+        return {
+            'window': self.window,
+            'rsi_periods': self.rsi_periods,
+            'momentum_period': self.momentum_period,
+            'count': self.count,
+            'closes': list(self.closes),
+            'mean': self.mean,
+            'm2': self.m2,
+            'ema': self.ema,
+            'gains': list(self.gains),
+            'losses': list(self.losses),
+            'gain_sum': self.gain_sum,
+            'loss_sum': self.loss_sum,
+            'cumulative': None if math.isnan(self.cumulative) else self.cumulative,
+            'last_datetime': self.last_datetime
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        """Reconstruye el enricher desde un estado serializado"""
+        enricher = cls(state['window'], state['rsi_periods'], state['momentum_period'])
+        enricher.count = state['count']
+        enricher.closes.extend(state['closes'])
+        enricher.mean = state['mean']
+        enricher.m2 = state['m2']
+        enricher.ema = state['ema']
+        enricher.gains.extend(state['gains'])
+        enricher.losses.extend(state['losses'])
+        enricher.gain_sum = state['gain_sum']
+        enricher.loss_sum = state['loss_sum']
+        enricher.cumulative = math.nan if state['cumulative'] is None else state['cumulative']
+        enricher.last_datetime = state['last_datetime']
+        return enricher
+
+    def save(self, path):
+        """Guarda el estado en un archivo JSON"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as state_file:
+            json.dump(self.to_dict(), state_file)
+
+    @classmethod
+    def load(cls, path):
+        """Carga el estado desde un archivo JSON"""
+        with open(path) as state_file:
+            return cls.from_dict(json.load(state_file))
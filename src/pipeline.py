@@ -0,0 +1,290 @@
+import hashlib
+import json
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from src.cache import CACHE_DIR
+from src.logger import logger as default_logger, merge_timings, stage_timer, worker_timings
+
+# Ejecutor del pipeline como grafo de etapas. Cada etapa declara las entradas que
+# consume y las salidas que produce; las etapas sin dependencias entre sí (escrituras
+# en la base, el CSV y la preparación de características) corren a la vez en un pool.
+# La huella de las entradas de cada etapa se guarda al terminar: en la siguiente
+# ejecución las etapas cuyas entradas no cambiaron se saltan y sus salidas solo se
+# materializan si alguna etapa posterior tiene que ejecutarse.
+STATE_FILE = os.path.join(CACHE_DIR, 'pipeline_state.json')
+
+POOLS = (None, 'thread', 'process')
+
+
+class Stage(namedtuple('Stage', ['name', 'function', 'inputs', 'outputs', 'pool', 'always', 'load', 'version'])):
+    """
+    Etapa del grafo:
+    - function(*entradas): devuelve el valor de la salida o una tupla con una por salida
+    - inputs / outputs: nombres de valores; las entradas que ninguna etapa produce son
+      parámetros de la ejecución (Pipeline.run(params=...))
+    - pool: 'thread' (E/S), 'process' (cálculo; función y valores serializables) o None
+      (en el hilo principal, para etapas que ya paralelizan por su cuenta)
+    - always: se ejecuta aunque sus entradas no cambien (p. ej. la descarga)
+    - load(): salidas recuperadas sin ejecutar la etapa (lo ya guardado), cuando
+      repetirla sería caro o tendría efectos (registrar otro modelo)
+    - version: cambiarla invalida las ejecuciones anteriores de la etapa
+    El nombre puede llevar un sufijo ':<símbolo>'; --only/--from usan la parte anterior.
+    """
+    __slots__ = ()
+
+    def __new__(cls, name, function, inputs=(), outputs=(), pool='thread', always=False, load=None, version=''):
+        if pool not in POOLS:
+            raise ValueError(f'Pool desconocido para la etapa {name}: {pool}')
+        return super().__new__(cls, name, function, tuple(inputs), tuple(outputs), pool, always, load, version)
+
+    @property
+    def base(self):
+        return self.name.split(':')[0]
+
+
+def content_hash(value):
+    """Huella (blake2b) del contenido de un valor: DataFrame, Series, arreglo o valor serializable en JSON"""
+    digest = hashlib.blake2b(digest_size=16)
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        names = value.columns if isinstance(value, pd.DataFrame) else [value.name]
+        digest.update(json.dumps([str(name) for name in names]).encode())
+        digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, np.ndarray):
+        digest.update(str(value.dtype).encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    else:
+        digest.update(json.dumps(value, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+def _call(stage, values):
+    """Ejecuta la etapa (en el hilo o proceso del pool) y devuelve (salidas, segundos)"""
+    start = time.perf_counter()
+    with stage_timer(f'pipeline.{stage.base}', name=stage.name):
+        result = stage.function(*values)
+    outputs = result if len(stage.outputs) > 1 else (result,)
+    return dict(zip(stage.outputs, outputs)), time.perf_counter() - start
+
+
+class Pipeline:
+    """
+    Ejecuta un grafo de etapas en orden topológico con un pool de hilos y, para las
+    etapas que lo pidan, uno de procesos. Las huellas de entradas y salidas de cada
+    etapa terminada se guardan en `state_path`.
+    """
+
+    def __init__(self, stages, logger=None, state_path=STATE_FILE, max_workers=4):
+        self.stages = {stage.name: stage for stage in stages}
+        if len(self.stages) != len(stages):
+            raise ValueError('Hay etapas con el mismo nombre')
+        self.producers = {}
+        for stage in stages:
+            for output in stage.outputs:
+                if output in self.producers:
+                    raise ValueError(f'La salida {output} la producen {self.producers[output].name} y {stage.name}')
+                self.producers[output] = stage
+        self.logger = logger or default_logger
+        self.state_path = state_path
+        self.max_workers = max_workers
+        self.order = self._topological()
+
+    def dependencies(self, stage):
+        return [self.producers[name].name for name in stage.inputs if name in self.producers]
+
+    def _topological(self):
+        order, visiting, done = [], set(), set()
+
+        def visit(name):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f'El grafo de etapas tiene un ciclo en {name}')
+            visiting.add(name)
+            for dependency in self.dependencies(self.stages[name]):
+                visit(dependency)
+            visiting.discard(name)
+            done.add(name)
+            order.append(name)
+
+        for name in self.stages:
+            visit(name)
+        return order
+
+    def descendants(self, names):
+        """Etapas alcanzables desde `names` (incluidas)"""
+        reached = set(names)
+        for name in self.order:
+            if any(dependency in reached for dependency in self.dependencies(self.stages[name])):
+                reached.add(name)
+        return reached
+
+    def select(self, only=None, start=None):
+        """Etapas a ejecutar: las de `only` (nombres base o completos) o `start` y todas las posteriores"""
+        known = {name for stage in self.stages.values() for name in (stage.name, stage.base)}
+        for name in list(only or []) + ([start] if start else []):
+            if name not in known:
+                raise ValueError(f'Etapa desconocida: {name} (etapas: {", ".join(sorted(known))})')
+        selected = set(self.stages)
+        if only:
+            selected = {name for name, stage in self.stages.items() if name in only or stage.base in only}
+        if start:
+            selected &= self.descendants(name for name, stage in self.stages.items() if start in (name, stage.base))
+        return selected
+
+    def _load_state(self):
+        if not os.path.exists(self.state_path):
+            return {}
+        try:
+            with open(self.state_path) as state_file:
+                return json.load(state_file)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f'Estado del pipeline ilegible, se ejecutan todas las etapas: {e}')
+            return {}
+
+    def _save_state(self, state):
+        os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w') as state_file:
+            json.dump(state, state_file, indent=4)
+        os.replace(tmp_path, self.state_path)
+
+    def _input_key(self, stage, hashes):
+        return content_hash([stage.name, stage.version] + [hashes[name] for name in stage.inputs])
+
+    def _materialize(self, name, values, hashes, state):
+        """Valor de `name`: si su etapa se saltó, lo recupera con load() o la vuelve a ejecutar aquí"""
+        if name in values:
+            return values[name]
+        stage = self.producers[name]
+        if name in state.get(stage.name, {}).get('empty', []):
+            # Salida sin valor (la etapa solo tiene efectos, p. ej. una escritura): no hace falta repetirla
+            values[name] = None
+            return None
+        if stage.load is not None:
+            self.logger.info(f'Recuperando las salidas guardadas de la etapa {stage.name}')
+            outputs = stage.load()
+            outputs = dict(zip(stage.outputs, outputs if len(stage.outputs) > 1 else (outputs,)))
+        else:
+            self.logger.info(f'Repitiendo la etapa {stage.name} para obtener {name}')
+            outputs, _ = _call(stage, [self._materialize(input_name, values, hashes, state)
+                                       for input_name in stage.inputs])
+        values.update(outputs)
+        for output, value in outputs.items():
+            hashes.setdefault(output, content_hash(value))
+        return values[name]
+
+    def run(self, params=None, only=None, start=None, force=False):
+        """
+        Ejecuta el grafo. `params` da los valores de las entradas que no produce
+        ninguna etapa; con `force` no se salta ninguna etapa seleccionada.
+        Devuelve una lista de resultados por etapa: (etapa, estado, segundos).
+        """
+        params = dict(params or {})
+        missing = {name for stage in self.stages.values() for name in stage.inputs
+                   if name not in self.producers and name not in params}
+        if missing:
+            raise ValueError(f'Faltan parámetros del pipeline: {", ".join(sorted(missing))}')
+        selected = self.select(only, start)
+        state = self._load_state()
+        values = dict(params)
+        hashes = {name: content_hash(value) for name, value in params.items()}
+        status, seconds = {}, {}
+        pending = list(self.order)
+        running = {}
+        started = time.perf_counter()
+
+        threads = ThreadPoolExecutor(max_workers=self.max_workers)
+        processes = None
+        try:
+            while pending or running:
+                for name in list(pending):
+                    stage = self.stages[name]
+                    dependencies = self.dependencies(stage)
+                    if any(status.get(dependency, 'ejecutando') == 'ejecutando' for dependency in dependencies):
+                        continue
+                    pending.remove(name)
+                    if any(status[dependency] in ('error', 'cancelada') for dependency in dependencies):
+                        status[name] = 'cancelada'
+                        continue
+                    # Salidas de una etapa saltada: las huellas de la última ejecución
+                    recorded = state.get(name, {}).get('outputs', {})
+                    has_record = set(stage.outputs) <= set(recorded)
+                    if name not in selected and has_record:
+                        hashes.update({output: recorded[output] for output in stage.outputs})
+                        status[name] = 'no seleccionada'
+                        continue
+                    if name not in selected:
+                        for output in stage.outputs:
+                            self._materialize(output, values, hashes, state)
+                        status[name] = 'recuperada'
+                        continue
+                    key = self._input_key(stage, hashes)
+                    if not force and not stage.always and has_record and state[name].get('inputs') == key:
+                        hashes.update({output: recorded[output] for output in stage.outputs})
+                        status[name] = 'sin cambios'
+                        continue
+                    inputs = [self._materialize(input_name, values, hashes, state) for input_name in stage.inputs]
+                    # Cada etapa devuelve también sus eventos de tiempos: los de un proceso
+                    # del pool no llegan de otro modo al resumen de esta ejecución
+                    if stage.pool == 'process':
+                        processes = processes or ProcessPoolExecutor(max_workers=self.max_workers)
+                        future = processes.submit(worker_timings, _call, stage, inputs)
+                    elif stage.pool == 'thread':
+                        future = threads.submit(worker_timings, _call, stage, inputs)
+                    else:
+                        # En el hilo principal; las etapas ya enviadas al pool siguen corriendo
+                        future = Future()
+                        try:
+                            future.set_result(worker_timings(_call, stage, inputs))
+                        except Exception as e:
+                            future.set_exception(e)
+                    running[future] = (name, key)
+                    status[name] = 'ejecutando'
+
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, key = running.pop(future)
+                    try:
+                        (outputs, seconds[name]), events = future.result()
+                    except Exception as e:
+                        status[name] = 'error'
+                        self.logger.error(f'Error en la etapa {name}: {e}')
+                        continue
+                    merge_timings(events)
+                    values.update(outputs)
+                    # Una salida sin valor se identifica por las entradas con que se ejecutó la etapa
+                    output_hashes = {output: key if value is None else content_hash(value)
+                                     for output, value in outputs.items()}
+                    hashes.update(output_hashes)
+                    state[name] = {'inputs': key, 'outputs': output_hashes,
+                                   'empty': [output for output, value in outputs.items() if value is None],
+                                   'finished_at': datetime.now().isoformat(timespec='seconds')}
+                    status[name] = 'ejecutada'
+                    # El estado se guarda tras cada etapa: una falla posterior no obliga a repetirla
+                    self._save_state(state)
+        finally:
+            threads.shutdown(wait=True)
+            if processes is not None:
+                processes.shutdown(wait=True)
+
+        results = [(name, status[name], seconds.get(name)) for name in self.order]
+        self.logger.info(f'Pipeline terminado en {time.perf_counter() - started:.2f}s:\n' + pipeline_summary(results))
+        return results
+
+
+def pipeline_summary(results):
+    """Tabla con el estado y el tiempo de cada etapa (y la suma, para compararla con el tiempo total)"""
+    lines = [f"{'etapa':<28}{'estado':>16}{'tiempo (s)':>12}"]
+    for name, status, seconds in results:
+        lines.append(f"{name:<28}{status:>16}{'-' if seconds is None else f'{seconds:.3f}':>12}")
+    lines.append(f"{'suma de etapas':<28}{'':>16}{sum(seconds or 0 for _, _, seconds in results):>12.3f}")
+    return '\n'.join(lines)
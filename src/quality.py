@@ -0,0 +1,231 @@
+import numpy as np
+import pandas as pd
+from pandas.tseries.holiday import (AbstractHolidayCalendar, GoodFriday, Holiday, USLaborDay, USMartinLutherKingJr,
+                                    USMemorialDay, USPresidentsDay, USThanksgivingDay, nearest_workday)
+
+from src.logger import stage_timer
+from src.timeframes import TIMEFRAMES, resample_ohlcv
+
+# Etapa de calidad entre la recolección y el enriquecimiento. Todo se calcula con
+# NumPy sobre los timestamps en int64 (sin excepciones por fila): orden, duplicados,
+# barras planas sin volumen (relleno de la fuente) y huecos contra el calendario de
+# negociación de los futuros.
+
+FILL_METHODS = ['ffill']
+
+HOUR = 3600 * 10 ** 9
+DAY = 24 * HOUR
+
+OHLC = ['open', 'high', 'low', 'close']
+
+
+class FuturesClosures(AbstractHolidayCalendar):
+    """Días sin sesión en CME Globex"""
+    rules = [
+        Holiday('Año Nuevo', month=1, day=1, observance=nearest_workday),
+        GoodFriday,
+        Holiday('Navidad', month=12, day=25, observance=nearest_workday)
+    ]
+
+
+class FuturesSettlementHolidays(AbstractHolidayCalendar):
+    """Días sin liquidación: la sesión corta del feriado se asigna al día hábil siguiente"""
+    rules = FuturesClosures.rules + [
+        USMartinLutherKingJr,
+        USPresidentsDay,
+        USMemorialDay,
+        Holiday('Juneteenth', month=6, day=19, start_date='2022-06-19', observance=nearest_workday),
+        Holiday('Independencia', month=7, day=4, observance=nearest_workday),
+        USLaborDay,
+        USThanksgivingDay
+    ]
+
+
+class FuturesCalendar:
+    """
+    Calendario de los futuros de metales. Las barras se guardan sin zona horaria en
+    la hora de la bolsa (EXCHANGE_TIMEZONE de src.utils.helpers), así que las sesiones se evalúan sobre las
+    fechas tal como están: de domingo 18:00 a viernes 17:00 con una pausa diaria de
+    17:00 a 18:00. Los cambios de horario caen el domingo de madrugada, con la bolsa
+    cerrada. Las barras diarias llevan la fecha de la sesión (lunes a viernes, sin los
+    días sin liquidación).
+    """
+
+    def __init__(self, open_hour=18, close_hour=17):
+        self.open_hour = open_hour
+        self.close_hour = close_hour
+
+    def holidays(self, start, end, daily=True):
+        calendar = FuturesSettlementHolidays() if daily else FuturesClosures()
+        return calendar.holidays(start - pd.Timedelta(days=7), end + pd.Timedelta(days=7)).values.astype('datetime64[D]')
+
+    def sessions(self, start, end, seconds):
+        """Barras esperadas en [start, end] para barras de `seconds` segundos (datetime64[ns])"""
+        start, end = pd.Timestamp(start).as_unit('ns'), pd.Timestamp(end).as_unit('ns')
+        if seconds >= 86400:
+            days = np.arange(start.floor('D').to_datetime64().astype('datetime64[D]'),
+                             end.floor('D').to_datetime64().astype('datetime64[D]') + 1)
+            days = days[np.is_busday(days, holidays=self.holidays(start, end))]
+            return days.astype('datetime64[ns]')
+        period = int(seconds * 10 ** 9)
+        first = start.value // period * period
+        # El largo se calcula en enteros: np.arange con pasos en ns redondea en punto flotante
+        grid = first + period * np.arange(max((end.value - first) // period + 1, 0), dtype='int64')
+        if len(grid) == 0:
+            return grid.astype('datetime64[ns]')
+        hours = grid // HOUR % 24
+        # Desde la apertura del domingo la barra pertenece a la sesión del día siguiente
+        session = grid // DAY + (hours >= self.open_hour)
+        calendar = np.arange(session[0], session[-1] + 1).astype('datetime64[D]')
+        open_days = np.is_busday(calendar, holidays=self.holidays(start, end, daily=False))
+        closed = (hours >= self.close_hour) & (hours < self.open_hour)
+        return grid[~closed & open_days[session - session[0]]].astype('datetime64[ns]')
+
+
+FUTURES_CALENDAR = FuturesCalendar()
+
+
+def _nanoseconds(index):
+    """Timestamps en ns como int64 (pandas 3 usa microsegundos por defecto)"""
+    return np.asarray(index.values, dtype='datetime64[ns]').view('int64')
+
+
+def _positions(times):
+    """
+    Posiciones que ordenan las barras conservando la última de cada fecha repetida,
+    el número de barras fuera de orden y de duplicadas. None si ya están limpias.
+    """
+    steps = np.diff(times)
+    out_of_order = int(np.count_nonzero(steps < 0))
+    if not out_of_order and np.all(steps > 0):
+        return None, 0, 0
+    order = np.argsort(times, kind='stable') if out_of_order else np.arange(len(times))
+    ordered = times[order]
+    keep = np.ones(len(times), dtype=bool)
+    keep[:-1] = ordered[1:] != ordered[:-1]
+    return order[keep], out_of_order, len(times) - int(np.count_nonzero(keep))
+
+
+def deduplicate(df):
+    """Ordena las barras y conserva la última de cada fecha repetida (sin copiar si ya están limpias)"""
+    positions, _, _ = _positions(_nanoseconds(df.index))
+    return df if positions is None else df.iloc[positions]
+
+
+def flat_bars(df):
+    """Máscara de barras de relleno: open == high == low == close y volumen 0"""
+    if not set(OHLC + ['volume']).issubset(df.columns):
+        return np.zeros(len(df), dtype=bool)
+    o, h, l, c, v = (df[name].to_numpy() for name in OHLC + ['volume'])
+    return (o == h) & (h == l) & (l == c) & (v == 0)
+
+
+def _timeframe(times, timeframe):
+    if timeframe is not None:
+        return timeframe
+    if len(times) < 2:
+        return None
+    seconds = float(np.median(np.diff(times))) / 1e9
+    matches = [name for name, value in TIMEFRAMES.items() if value == seconds]
+    # Las barras diarias saltan los fines de semana: la mediana puede no ser exacta
+    return matches[0] if matches else ('1d' if seconds >= 86400 else None)
+
+
+def _largest_gap(missing, period):
+    """(inicio, barras) del tramo consecutivo más largo de barras faltantes"""
+    if len(missing) == 0:
+        return None
+    runs = np.flatnonzero(np.diff(missing) > period) + 1
+    starts = np.concatenate(([0], runs))
+    lengths = np.diff(np.concatenate((starts, [len(missing)])))
+    largest = int(np.argmax(lengths))
+    return str(pd.Timestamp(missing[starts[largest]])), int(lengths[largest])
+
+
+def _forward_fill(df, missing):
+    """Inserta las barras faltantes: cierre anterior en OHLC, volumen y eventos en 0, resto arrastrado"""
+    index = pd.DatetimeIndex(np.sort(np.concatenate((df.index.values, missing))), name=df.index.name)
+    filled = df.reindex(index)
+    columns = {}
+    for name in filled.columns:
+        if name in ('volume', 'dividends', 'stock_splits'):
+            columns[name] = filled[name].fillna(0.0)
+        elif name not in OHLC:
+            columns[name] = filled[name].ffill()
+    close = filled['close'].ffill() if 'close' in filled.columns else None
+    for name in OHLC:
+        if name in filled.columns:
+            columns[name] = filled[name].fillna(close)
+    return pd.DataFrame(columns, index=index)[list(df.columns)]
+
+
+def check_bars(df, timeframe=None, fill=None, resample=None, drop_flat=False, calendar=FUTURES_CALENDAR):
+    """
+    Valida y limpia las barras de un símbolo antes de enriquecerlas:
+    - ordena y elimina fechas repetidas (gana la última)
+    - marca las barras planas sin volumen y, con drop_flat, las descarta
+    - compara contra el calendario de negociación y cuenta las barras faltantes
+      y las que caen fuera de sesión
+    - con fill='ffill' inserta las barras faltantes; con `resample` agrega a otra resolución
+    Devuelve (DataFrame, reporte) con contadores serializables en JSON.
+    """
+    if fill not in (None, *FILL_METHODS):
+        raise ValueError(f'Método de relleno desconocido: {fill} (use {", ".join(FILL_METHODS)})')
+    report = {'rows_in': len(df)}
+    times = _nanoseconds(df.index)
+    positions, report['out_of_order'], report['duplicates'] = _positions(times)
+    if positions is not None:
+        df, times = df.iloc[positions], times[positions]
+
+    flat = flat_bars(df)
+    report['flat'] = int(np.count_nonzero(flat))
+    if drop_flat and report['flat']:
+        df, times = df[~flat], times[~flat]
+
+    timeframe = report['timeframe'] = _timeframe(times, timeframe)
+    report.update(expected=None, missing=0, off_calendar=0, largest_gap=None, filled=0)
+    if timeframe is not None and len(times):
+        seconds = TIMEFRAMES[timeframe]
+        expected = calendar.sessions(df.index[0], df.index[-1], seconds).astype('int64')
+        slots = np.searchsorted(times, expected).clip(max=len(times) - 1)
+        present = times[slots] == expected
+        missing = expected[~present]
+        report.update(expected=len(expected), missing=len(missing),
+                      off_calendar=len(times) - int(np.count_nonzero(present)),
+                      largest_gap=_largest_gap(missing, seconds * 10 ** 9))
+        if fill == 'ffill' and len(missing):
+            df = _forward_fill(df, missing.astype('datetime64[ns]'))
+            report['filled'] = len(missing)
+
+    if resample is not None:
+        df = resample_ohlcv(df, resample)
+        report['resampled'] = resample
+    report['rows_out'] = len(df)
+    return df, report
+
+
+def check_frames(frames, logger=None, **options):
+    """
+    check_bars para varios símbolos. Cada reporte queda en el registro de etapas
+    (timings.jsonl, etapa quality.check_bars) y, con logger, se resume en una tabla.
+    Devuelve (diccionario símbolo -> DataFrame, diccionario símbolo -> reporte).
+    """
+    cleaned, reports = {}, {}
+    for symbol, df in frames.items():
+        with stage_timer('quality.check_bars', len(df), symbol=symbol) as timer:
+            cleaned[symbol], reports[symbol] = check_bars(df, **options)
+            timer.fields.update(reports[symbol])
+    if logger is not None and reports:
+        logger.info('Calidad de datos:\n' + quality_summary(reports))
+    return cleaned, reports
+
+
+def quality_summary(reports):
+    """Tabla compacta con los contadores de calidad por símbolo"""
+    lines = [f"{'símbolo':<10}{'filas':>9}{'fuera orden':>12}{'repetidas':>10}{'planas':>8}"
+             f"{'faltantes':>10}{'fuera sesión':>13}{'rellenadas':>11}  hueco mayor"]
+    for symbol, report in reports.items():
+        gap = f'{report["largest_gap"][1]} desde {report["largest_gap"][0]}' if report['largest_gap'] else '-'
+        lines.append(f"{symbol:<10}{report['rows_in']:>9}{report['out_of_order']:>12}{report['duplicates']:>10}"
+                     f"{report['flat']:>8}{report['missing']:>10}{report['off_calendar']:>13}{report['filled']:>11}  {gap}")
+    return '\n'.join(lines)
@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+
+from src.inference import CompiledForest
+
+REGISTRY_DIR = 'src/palladium/static/models/registry'
+
+# Artefactos ya cargados en este proceso: ruta -> (checksum, artefacto, metadatos)
+_LOADED = {}
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as artifact_file:
+        for block in iter(lambda: artifact_file.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ModelRegistry:
+    """
+    Registro versionado de modelos. Cada versión es un directorio con:
+    - model.joblib: el artefacto (comprimido, o sin comprimir para cargarlo con mmap)
+    - compiled.npz: el bosque compilado a arreglos NumPy (opcional), que se carga sin sklearn
+    - metadata.json: características, ventana de entrenamiento, métricas, huella de
+      los datos, tamaño y checksum de los artefactos
+    Las escrituras son atómicas (directorio temporal + os.replace) y el archivo
+    LATEST apunta a la versión vigente.
+    """
+
+    def __init__(self, logger, name, root=REGISTRY_DIR, compress=3, keep=5):
+        self.logger = logger
+        self.path = os.path.join(root, name)
+        self.compress = compress
+        self.keep = keep
+        os.makedirs(self.path, exist_ok=True)
+
+    def versions(self):
+        """Versiones registradas, de la más antigua a la más reciente"""
+        return sorted(entry for entry in os.listdir(self.path) if entry.startswith('v'))
+
+    def latest_version(self):
+        latest_file = os.path.join(self.path, 'LATEST')
+        if not os.path.exists(latest_file):
+            return None
+        with open(latest_file) as latest:
+            return latest.read().strip() or None
+
+    def register(self, artifact, metadata, compiled=None):
+        """Guarda una nueva versión del artefacto (y su versión compilada) y la marca como vigente"""
+        versions = self.versions()
+        number = int(versions[-1][1:]) + 1 if versions else 1
+        version = f'v{number:04d}'
+        tmp_dir = os.path.join(self.path, f'.tmp-{version}-{os.getpid()}')
+        os.makedirs(tmp_dir, exist_ok=True)
+        try:
+            import joblib
+            artifact_path = os.path.join(tmp_dir, 'model.joblib')
+            joblib.dump(artifact, artifact_path, compress=self.compress)
+            if compiled is not None:
+                compiled_path = os.path.join(tmp_dir, 'compiled.npz')
+                compiled.save(compiled_path)
+                metadata = dict(metadata, compiled_sha256=_sha256(compiled_path))
+            metadata = dict(metadata,
+                            version=version,
+                            created_at=datetime.now().isoformat(timespec='seconds'),
+                            compress=self.compress,
+                            size_bytes=os.path.getsize(artifact_path),
+                            sha256=_sha256(artifact_path))
+            with open(os.path.join(tmp_dir, 'metadata.json'), 'w') as metadata_file:
+                json.dump(metadata, metadata_file, indent=4, default=str)
+            os.replace(tmp_dir, os.path.join(self.path, version))
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        latest_tmp = os.path.join(self.path, f'.LATEST-{os.getpid()}')
+        with open(latest_tmp, 'w') as latest:
+            latest.write(version)
+        os.replace(latest_tmp, os.path.join(self.path, 'LATEST'))
+        self.logger.info(f"Modelo registrado: {self.path} {version} (Tamaño: {metadata['size_bytes']/1024:.2f} KB)")
+        self._prune()
+        return version
+
+    def metadata(self, version=None):
+        version = version or self.latest_version()
+        if version is None:
+            return None
+        with open(os.path.join(self.path, version, 'metadata.json')) as metadata_file:
+            return json.load(metadata_file)
+
+    def load(self, version=None):
+        """
+        Carga un artefacto verificando su checksum. Las cargas posteriores en el mismo
+        proceso se sirven desde memoria. Devuelve (artefacto, metadatos) o (None, None).
+        """
+        version = version or self.latest_version()
+        if version is None:
+            return None, None
+        metadata = self.metadata(version)
+        artifact_path = os.path.join(self.path, version, 'model.joblib')
+        cached = _LOADED.get(artifact_path)
+        if cached is not None and cached[0] == metadata['sha256']:
+            return cached[1], cached[2]
+
+        if _sha256(artifact_path) != metadata['sha256']:
+            raise ValueError(f'Checksum inválido para el artefacto {artifact_path}')
+        # joblib (y sklearn al deserializar) solo se importan si se necesita el artefacto completo
+        import joblib
+        start = time.perf_counter()
+        artifact = joblib.load(artifact_path, mmap_mode=None if metadata['compress'] else 'r')
+        elapsed = (time.perf_counter() - start) * 1000
+        self.logger.info(f"Modelo {version} cargado en {elapsed:.1f} ms ({metadata['size_bytes']/1024:.2f} KB)")
+        _LOADED[artifact_path] = (metadata['sha256'], artifact, metadata)
+        return artifact, metadata
+
+    def load_compiled(self, version=None):
+        """
+        Carga el bosque compilado (solo NumPy) verificando su checksum.
+        Devuelve (CompiledForest, metadatos) o (None, None) si la versión no lo tiene.
+        """
+        version = version or self.latest_version()
+        if version is None:
+            return None, None
+        metadata = self.metadata(version)
+        compiled_path = os.path.join(self.path, version, 'compiled.npz')
+        if 'compiled_sha256' not in metadata:
+            return None, None
+        cached = _LOADED.get(compiled_path)
+        if cached is not None and cached[0] == metadata['compiled_sha256']:
+            return cached[1], cached[2]
+
+        if _sha256(compiled_path) != metadata['compiled_sha256']:
+            raise ValueError(f'Checksum inválido para el artefacto {compiled_path}')
+        start = time.perf_counter()
+        compiled = CompiledForest.load(compiled_path)
+        elapsed = (time.perf_counter() - start) * 1000
+        self.logger.info(f"Modelo compilado {version} cargado en {elapsed:.1f} ms")
+        _LOADED[compiled_path] = (metadata['compiled_sha256'], compiled, metadata)
+        return compiled, metadata
+
+    def _prune(self):
+        """Conserva solo las últimas `keep` versiones"""
+        for version in self.versions()[:-self.keep]:
+            shutil.rmtree(os.path.join(self.path, version), ignore_errors=True)
+            _LOADED.pop(os.path.join(self.path, version, 'model.joblib'), None)
+            _LOADED.pop(os.path.join(self.path, version, 'compiled.npz'), None)
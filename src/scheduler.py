@@ -0,0 +1,188 @@
+import asyncio
+import os
+import random
+import shutil
+import time
+
+import pandas as pd
+
+from src.sources import SOURCE_COLUMNS, is_retryable
+from src.utils.helpers import symbol_slug
+
+CHECKPOINT_DIR = 'src/palladium/static/cache/downloads'
+
+
+class TokenBucket:
+    """
+    Limitador de tasa asíncrono: `rate` solicitudes por segundo (None = sin
+    límite) con ráfagas de hasta `capacity`. `pause` bloquea a todos los
+    consumidores (p. ej. tras un 'Rate limited' de la fuente) hasta que pase la
+    espera indicada.
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now):
+        if self.rate is None:
+            self.tokens = float(self.capacity)
+        else:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+
+class DownloadScheduler:
+    """
+    Planificador asíncrono de descargas. Divide los rangos largos en bloques del
+    tamaño máximo que acepta la fuente y los descarga en paralelo (hasta
+    `max_concurrency` a la vez) bajo un token bucket compartido por todos los
+    símbolos. Los errores transitorios se reintentan con back-off exponencial con
+    jitter; los bloques terminados se guardan como checkpoint, de modo que una
+    ejecución interrumpida retoma solo los bloques que faltan.
+    """
+
+    def __init__(self, source, rate=None, burst=None, max_concurrency=None, retries=5, base_delay=0.5,
+                 max_delay=30.0, checkpoint_dir=CHECKPOINT_DIR, logger=None, seed=None):
+        self.source = source
+        self.rate = rate or source.rate_limit
+        self.burst = burst or max(1, int(self.rate or 1))
+        self.max_concurrency = max_concurrency or source.max_concurrency
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.checkpoint_dir = checkpoint_dir
+        self.logger = logger
+        self._random = random.Random(seed)
+        self.stats = {'chunks': 0, 'requests': 0, 'retries': 0, 'checkpoints': 0, 'rows': 0}
+
+    def plan(self, start, end, interval):
+        """Bloques [inicio, fin) que respetan el rango máximo de la fuente para el intervalo"""
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        max_days = self.source.max_range_days.get(interval)
+        step = pd.Timedelta(days=max_days) if max_days else end - start
+        chunks = []
+        chunk_start = start
+        while chunk_start < end:
+            chunk_end = min(chunk_start + step, end)
+            chunks.append((chunk_start, chunk_end))
+            chunk_start = chunk_end
+        return chunks
+
+    def _checkpoint_path(self, symbol, interval, chunk):
+        start, end = (moment.strftime('%Y%m%d%H') for moment in chunk)
+        return os.path.join(self.checkpoint_dir, symbol_slug(symbol), f'{interval}-{start}-{end}.arrow')
+
+    def _load_checkpoint(self, path):
+        if self.checkpoint_dir is None or not os.path.exists(path):
+            return None
+        frame = pd.read_feather(path)
+        return frame.set_index('datetime')
+
+    def _save_checkpoint(self, path, chunk, frame):
+        # Un bloque que llega hasta hoy todavía puede recibir barras nuevas: no se guarda
+        if self.checkpoint_dir is None or chunk[1] > pd.Timestamp.now().normalize():
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        frame.rename_axis('datetime').reset_index().to_feather(tmp_path)
+        os.replace(tmp_path, path)
+
+    def clear_checkpoints(self, symbol):
+        if self.checkpoint_dir is not None:
+            shutil.rmtree(os.path.join(self.checkpoint_dir, symbol_slug(symbol)), ignore_errors=True)
+
+    async def _request(self, bucket, semaphore, symbol, **kwargs):
+        """Una solicitud a la fuente con límite de tasa, concurrencia y reintentos"""
+        for attempt in range(self.retries):
+            await bucket.acquire()
+            try:
+                async with semaphore:
+                    self.stats['requests'] += 1
+                    return await asyncio.to_thread(self.source.history, symbol, **kwargs)
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.retries - 1:
+                    if self.logger is not None:
+                        self.logger.error(f'Error al descargar datos de {symbol}: {e}')
+                    raise
+                # Back-off exponencial con jitter completo: los reintentos no se sincronizan
+                wait_time = self._random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                if 'RateLimit' in type(e).__name__ or 'Rate limited' in str(e):
+                    bucket.pause(wait_time)
+                self.stats['retries'] += 1
+                if self.logger is not None:
+                    self.logger.warning(f'{e}. Reintentando {symbol} en {wait_time:.2f} segundos...')
+                await asyncio.sleep(wait_time)
+
+    async def _chunk(self, bucket, semaphore, symbol, interval, chunk):
+        path = self._checkpoint_path(symbol, interval, chunk)
+        frame = self._load_checkpoint(path)
+        if frame is not None:
+            self.stats['checkpoints'] += 1
+            return frame
+        frame = await self._request(bucket, semaphore, symbol, start=chunk[0], end=chunk[1], interval=interval)
+        self.stats['chunks'] += 1
+        self._save_checkpoint(path, chunk, frame)
+        return frame
+
+    async def download(self, symbol, start=None, end=None, interval='1d', period=None, bucket=None, semaphore=None):
+        """
+        Descarga un símbolo: por `period` (una solicitud) o por rango [start, end)
+        en bloques concurrentes. Devuelve el DataFrame con las columnas de la fuente.
+        """
+        bucket = bucket or TokenBucket(self.rate, self.burst)
+        semaphore = semaphore or asyncio.Semaphore(self.max_concurrency)
+        if period:
+            return await self._request(bucket, semaphore, symbol, period=period, interval=interval)
+        frames = await asyncio.gather(*(self._chunk(bucket, semaphore, symbol, interval, chunk)
+                                        for chunk in self.plan(start, end, interval)))
+        frames = [frame for frame in frames if not frame.empty]
+        if not frames:
+            return pd.DataFrame(columns=SOURCE_COLUMNS, index=pd.DatetimeIndex([]))
+        data = pd.concat(frames)
+        data = data[~data.index.duplicated(keep='last')].sort_index()
+        self.stats['rows'] += len(data)
+        # Completado: los checkpoints del símbolo ya no son necesarios
+        self.clear_checkpoints(symbol)
+        return data
+
+    async def download_many(self, requests):
+        """
+        Descarga varios símbolos en paralelo con el mismo token bucket y límite de
+        concurrencia. `requests` es un diccionario símbolo -> argumentos de download.
+        """
+        bucket = TokenBucket(self.rate, self.burst)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        frames = await asyncio.gather(*(self.download(symbol, bucket=bucket, semaphore=semaphore, **kwargs)
+                                        for symbol, kwargs in requests.items()))
+        return dict(zip(requests, frames))
+
+    def run(self, requests):
+        """Versión síncrona de download_many"""
+        start = time.perf_counter()
+        frames = asyncio.run(self.download_many(requests))
+        if self.logger is not None:
+            self.logger.info(f"Descargas: {self.stats['requests']} solicitudes, {self.stats['retries']} reintentos, "
+                             f"{self.stats['checkpoints']} bloques desde checkpoint en {time.perf_counter() - start:.2f}s")
+        return frames
@@ -0,0 +1,215 @@
+import asyncio
+import json
+import time
+from collections import deque
+
+import numpy as np
+
+from src.features import latest_features
+from src.inference import CompiledForest
+from src.modeller import MODEL_FEATURES, MODEL_INPUTS
+
+# Barras que se conservan para calcular las características de la barra nueva
+HISTORY_BARS = max(max(spec.window, 1) + max(spec.lag, 0) for spec in MODEL_FEATURES)
+
+
+class LatencyTracker:
+    """Guarda las últimas latencias (ms) y reporta percentiles"""
+
+    def __init__(self, size=10000):
+        self.samples = deque(maxlen=size)
+        self.count = 0
+
+    def add(self, milliseconds):
+        self.samples.append(milliseconds)
+        self.count += 1
+
+    def summary(self):
+        if not self.samples:
+            return {'count': 0}
+        values = np.fromiter(self.samples, dtype='float64')
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        return {'count': self.count, 'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99, 'max_ms': values.max()}
+
+
+class PredictionServer:
+    """
+    Servidor HTTP asíncrono (sin dependencias externas) que mantiene el modelo y el
+    scaler en memoria junto con las últimas barras, y predice la volatilidad de la
+    siguiente barra para cada barra nueva.
+    Endpoints:
+    - POST /predict: una barra {datetime, open, high, low, close, volume}
+    - POST /predict/batch: {"bars": [...]} en una sola llamada al modelo
+    - GET /stats: latencias p50/p95/p99 por endpoint
+    - GET /health
+    Las solicitudes concurrentes a /predict se agrupan en micro-lotes para hacer una
+    sola llamada a model.predict.
+    """
+
+    def __init__(self, logger, modelo, history, max_batch=64, batch_wait_ms=0.5):
+        self.logger = logger
+        names = [spec.name for spec in MODEL_FEATURES]
+        if isinstance(modelo, CompiledForest):
+            self.model = modelo.predict
+            features = modelo.features
+        else:
+            # Modelos sin versión compilada: se escala sin la validación de sklearn
+            scaler = modelo['scaler']
+            self.model = lambda X: modelo['model'].predict((X - scaler.mean_) / scaler.scale_)
+            features = modelo.get('features', names)
+        self.positions = [names.index(name) for name in features]
+        self.max_batch = max_batch
+        self.batch_wait = batch_wait_ms / 1000
+        self.bars = {column: deque(history[column].to_numpy()[-HISTORY_BARS:].tolist(), maxlen=HISTORY_BARS)
+                     for column in MODEL_INPUTS}
+        self.last_datetime = str(history.index[-1]) if len(history) else None
+        self.latency = {'predict': LatencyTracker(), 'batch': LatencyTracker(), 'model': LatencyTracker()}
+        self.queue = None
+
+    def _predict_matrix(self, X):
+        """Una sola llamada al modelo para todas las filas"""
+        start = time.perf_counter()
+        predictions = self.model(X)
+        self.latency['model'].add((time.perf_counter() - start) * 1000)
+        return predictions
+
+    @staticmethod
+    def _parse_bar(bar):
+        """Valores de MODEL_INPUTS de la barra; ValueError si falta alguno o no es un número finito"""
+        try:
+            values = tuple(float(bar[column]) for column in MODEL_INPUTS)
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f'Barra inválida: se requieren valores numéricos en {", ".join(MODEL_INPUTS)} ({e!r})')
+        if not all(np.isfinite(values)):
+            raise ValueError(f'Barra inválida: valores no finitos en {dict(zip(MODEL_INPUTS, values))}')
+        return values
+
+    def _append_bar(self, bar, values=None):
+        """
+        Agrega la barra al estado y devuelve sus características. La barra se valida
+        completa antes de tocar el historial: una barra inválida no desalinea las columnas.
+        """
+        values = self._parse_bar(bar) if values is None else values
+        for column, value in zip(MODEL_INPUTS, values):
+            self.bars[column].append(value)
+        self.last_datetime = bar.get('datetime', self.last_datetime)
+        return latest_features({column: np.fromiter(values, dtype='float64')
+                                for column, values in self.bars.items()}, MODEL_FEATURES)[self.positions]
+
+    async def _batcher(self):
+        """Agrupa las solicitudes pendientes y las resuelve con una sola predicción"""
+        while True:
+            items = [await self.queue.get()]
+            deadline = time.perf_counter() + self.batch_wait
+            while len(items) < self.max_batch:
+                try:
+                    items.append(self.queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    # Espera la siguiente solicitud sin ocupar la CPU hasta el fin de la ventana del lote
+                    try:
+                        items.append(await asyncio.wait_for(self.queue.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+            try:
+                predictions = self._predict_matrix(np.vstack([features for features, _ in items]))
+                for (_, future), prediction in zip(items, predictions):
+                    future.set_result(float(prediction))
+            except Exception as e:
+                for _, future in items:
+                    future.set_exception(e)
+
+    async def predict(self, bar):
+        features = self._append_bar(bar)
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((features, future))
+        return {'datetime': self.last_datetime, 'prediction': await future}
+
+    def predict_batch(self, bars):
+        # Se validan todas las barras antes de agregar ninguna
+        parsed = [self._parse_bar(bar) for bar in bars]
+        features = np.vstack([self._append_bar(bar, values) for bar, values in zip(bars, parsed)])
+        predictions = self._predict_matrix(features)
+        return {'datetime': self.last_datetime, 'predictions': predictions.tolist()}
+
+    async def _route(self, method, path, body):
+        if method == 'GET' and path == '/health':
+            return 200, {'status': 'ok', 'last_datetime': self.last_datetime}
+        if method == 'GET' and path == '/stats':
+            return 200, {name: tracker.summary() for name, tracker in self.latency.items()}
+        if method == 'POST' and path == '/predict':
+            return 200, await self.predict(json.loads(body))
+        if method == 'POST' and path == '/predict/batch':
+            return 200, self.predict_batch(json.loads(body)['bars'])
+        return 404, {'error': f'Ruta no encontrada: {method} {path}'}
+
+    async def _handle(self, reader, writer):
+        """Atiende una conexión HTTP/1.1 con keep-alive"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    key, _, value = line.decode('latin-1').partition(':')
+                    headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                start = time.perf_counter()
+                try:
+                    status, payload = await self._route(method, path, body)
+                except Exception as e:
+                    status, payload = 400, {'error': str(e)}
+                elapsed = (time.perf_counter() - start) * 1000
+                if path == '/predict':
+                    self.latency['predict'].add(elapsed)
+                elif path == '/predict/batch':
+                    self.latency['batch'].add(elapsed)
+
+                response = json.dumps(payload).encode()
+                writer.write(f'HTTP/1.1 {status} {"OK" if status == 200 else "Error"}\r\n'
+                             f'Content-Type: application/json\r\nContent-Length: {len(response)}\r\n\r\n'
+                             .encode() + response)
+                await writer.drain()
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8000):
+        self.queue = asyncio.Queue()
+        batcher = asyncio.create_task(self._batcher())
+        server = await asyncio.start_server(self._handle, host, port)
+        self.logger.info(f'Servidor de predicción escuchando en http://{host}:{port}')
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+            self.logger.info(f'Latencias del servidor: {json.dumps(self.latency["predict"].summary())}')
+
+
+def run_server(logger, modeller, history, host='127.0.0.1', port=8000):
+    """Carga el modelo una sola vez (el compilado si existe) y atiende solicitudes hasta que se interrumpa"""
+    modelo, _ = modeller.registry.load_compiled()
+    if modelo is None:
+        metadata = modeller.registry.metadata() or {}
+        if metadata.get('backend', 'forest') != 'forest':
+            raise RuntimeError(f"El servidor solo sirve modelos RandomForest (el vigente es {metadata['backend']})")
+        modelo = modeller.cargar_modelo()
+    if modelo is None:
+        raise RuntimeError('No se encontró un modelo guardado para servir predicciones')
+    server = PredictionServer(logger, modelo, history)
+    try:
+        asyncio.run(server.serve(host, port))
+    except KeyboardInterrupt:
+        logger.info('Servidor detenido')
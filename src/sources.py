@@ -0,0 +1,168 @@
+import random
+import threading
+import time
+
+import pandas as pd
+
+from src.utils.helpers import EXCHANGE_TIMEZONE, symbol_slug
+
+# Columnas que entregan las fuentes, con el mismo formato que yfinance
+SOURCE_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume', 'Dividends', 'Stock Splits']
+
+
+def _period_offset(period):
+    """Convierte un periodo estilo yfinance ('5d', '6mo', '1y') en un DateOffset"""
+    for suffix, unit in (('mo', 'months'), ('y', 'years'), ('d', 'days')):
+        if period.endswith(suffix):
+            return pd.DateOffset(**{unit: int(period[:-len(suffix)])})
+    raise ValueError(f'Periodo no soportado: {period}')
+
+
+def exchange_time(values):
+    """
+    Fechas de una fuente como DatetimeIndex sin zona horaria en la hora de la bolsa
+    (EXCHANGE_TIMEZONE): las que traen zona horaria se convierten y las que no la
+    traen se toman como ya expresadas en la hora de la bolsa
+    """
+    if not isinstance(values, pd.DatetimeIndex):
+        try:
+            values = pd.to_datetime(values)
+        except ValueError:
+            # Desfases distintos en el mismo archivo (cambio de horario): se unifican en UTC
+            values = pd.to_datetime(values, utc=True)
+    index = pd.DatetimeIndex(values)
+    if index.tz is not None:
+        index = index.tz_convert(EXCHANGE_TIMEZONE).tz_localize(None)
+    return index
+
+
+class RateLimitError(Exception):
+    """La fuente rechazó la solicitud por exceso de peticiones"""
+
+
+def is_retryable(error):
+    """
+    Errores transitorios que vale la pena reintentar: límites de tasa (propios,
+    de yfinance o con el mensaje 'Rate limited'), timeouts y fallas de conexión
+    """
+    return (isinstance(error, (RateLimitError, TimeoutError, ConnectionError))
+            or 'RateLimit' in type(error).__name__ or 'Rate limited' in str(error))
+
+
+class DataSource:
+    """Interfaz común para las fuentes de datos históricos"""
+
+    # Máximo rango en días que acepta la fuente por solicitud (None = sin límite)
+    max_range_days = {}
+
+    # Solicitudes por segundo que tolera la fuente (None = sin límite)
+    rate_limit = None
+
+    def __init__(self, max_concurrency=2):
+        # Límite de solicitudes simultáneas a la fuente, compartido entre símbolos
+        self.max_concurrency = max_concurrency
+
+    def history(self, symbol, start=None, end=None, interval='1d', period=None):
+        """Devuelve un DataFrame con índice de fechas y las columnas SOURCE_COLUMNS"""
+        raise NotImplementedError
+
+
+class YahooFinanceSource(DataSource):
+    """Fuente de datos de Yahoo Finance mediante yfinance"""
+
+    # Yahoo solo entrega barras de minutos recientes (1m: 7 días por solicitud, 5m-30m: 60 días)
+    max_range_days = {'1m': 7, '5m': 59, '15m': 59, '30m': 59, '1h': 729, '1d': None}
+    rate_limit = 2.0
+
+    def history(self, symbol, start=None, end=None, interval='1d', period=None):
+        import yfinance as yf
+        ticker = yf.Ticker(symbol)
+        if period:
+            return ticker.history(period=period, interval=interval)
+        return ticker.history(start=start, end=end, interval=interval)
+
+
+class LocalFileSource(DataSource):
+    """
+    Fuente que reproduce un archivo CSV local (exportado de yfinance o con el
+    formato de historical.csv). Útil para pruebas sin conexión. La ruta puede
+    incluir '{symbol}' para usar un archivo por símbolo.
+    """
+
+    def __init__(self, path, max_concurrency=8):
+        super().__init__(max_concurrency)
+        self.path = path
+        self._data = {}
+
+    def _load(self, symbol):
+        path = self.path.format(symbol=symbol_slug(symbol))
+        if path not in self._data:
+            df = pd.read_csv(path)
+            date_col = next(col for col in ('datetime', 'Datetime', 'Date') if col in df.columns)
+            index = pd.to_datetime(df[date_col], format='%Y-%m-%d-%H', errors='coerce')
+            if index.isna().any():
+                index = exchange_time(df[date_col])
+            df = df.rename(columns={col.lower().replace(' ', '_'): col for col in SOURCE_COLUMNS})
+            for col in SOURCE_COLUMNS:
+                if col not in df.columns:
+                    df[col] = 0.0
+            df = df[SOURCE_COLUMNS]
+            df.index = pd.DatetimeIndex(index, name='datetime')
+            self._data[path] = df.sort_index()
+        return self._data[path]
+
+    def history(self, symbol, start=None, end=None, interval='1d', period=None):
+        df = self._load(symbol)
+        if period:
+            start = df.index.max() - _period_offset(period)
+        if start is not None:
+            df = df[df.index >= pd.Timestamp(start)]
+        if end is not None:
+            df = df[df.index < pd.Timestamp(end)]
+        return df
+
+
+class FakeSource(LocalFileSource):
+    """
+    Proveedor simulado en proceso que sirve datos grabados (un CSV como
+    LocalFileSource o DataFrames por símbolo) con latencia, límite de tasa y
+    fallas transitorias configurables. Permite medir el rendimiento y los
+    reintentos del planificador de descargas sin red.
+    """
+
+    max_range_days = {'1m': 5, '5m': 30, '1h': 30, '1d': 365}
+
+    def __init__(self, path=None, frames=None, latency=0.01, rate_limit=None, failure_rate=0.0,
+                 max_concurrency=8, seed=0):
+        super().__init__(path, max_concurrency)
+        for symbol, frame in (frames or {}).items():
+            self._data[symbol] = frame.sort_index()
+        self.latency = latency
+        self.limit = rate_limit
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._window = []
+        self.calls = 0
+        self.rejected = 0
+        self.failed = 0
+
+    def _load(self, symbol):
+        return self._data[symbol] if symbol in self._data else super()._load(symbol)
+
+    def history(self, symbol, start=None, end=None, interval='1d', period=None):
+        with self._lock:
+            self.calls += 1
+            now = time.monotonic()
+            # Ventana deslizante de un segundo: por encima del límite se rechaza
+            self._window = [moment for moment in self._window if now - moment < 1.0]
+            if self.limit is not None and len(self._window) >= self.limit:
+                self.rejected += 1
+                raise RateLimitError(f'Too Many Requests. Rate limited ({symbol})')
+            self._window.append(now)
+            fail = self._random.random() < self.failure_rate
+        time.sleep(self.latency)
+        if fail:
+            self.failed += 1
+            raise ConnectionError(f'Conexión interrumpida ({symbol})')
+        return super().history(symbol, start=start, end=end, interval=interval, period=period)
@@ -0,0 +1,254 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from src.cache import fingerprint
+from src.utils.helpers import symbol_slug
+
+STORE_DIR = 'src/palladium/static/data/store'
+FORMATS = {'parquet': 'parquet', 'arrow': 'arrow'}
+
+
+class PartitionedStore:
+    """
+    Almacenamiento columnar particionado por año/mes (`year=YYYY/month=MM`).
+    - format='parquet': archivos comprimidos, lectura con proyección de columnas y
+      filtro de fechas aplicado con las estadísticas de cada archivo
+    - format='arrow': Arrow IPC sin comprimir, que se lee con memory-map sin copiar
+    Un manifiesto guarda la huella de cada partición: al escribir solo se reescriben
+    las particiones nuevas o modificadas; las demás no se tocan.
+    """
+
+    def __init__(self, name, root=STORE_DIR, format='arrow', logger=None):
+        if format not in FORMATS:
+            raise ValueError(f'Formato de almacenamiento desconocido: {format}')
+        self.path = os.path.join(root, symbol_slug(name))
+        self.format = format
+        self.logger = logger
+        self.manifest_path = os.path.join(self.path, '_manifest.json')
+
+    def _manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {'format': self.format, 'partitions': {}}
+        with open(self.manifest_path) as manifest_file:
+            manifest = json.load(manifest_file)
+        if manifest['format'] != self.format:
+            raise ValueError(f"El almacenamiento {self.path} usa formato {manifest['format']}, no {self.format}")
+        return manifest
+
+    def _save_manifest(self, manifest):
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w') as manifest_file:
+            json.dump(manifest, manifest_file, indent=4)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _partition_file(self, key):
+        year, month = key.split('-')
+        return os.path.join(self.path, f'year={year}', f'month={month}', f'data.{FORMATS[self.format]}')
+
+    def exists(self):
+        return bool(self._manifest()['partitions'])
+
+    def partitions(self):
+        """Particiones del manifiesto: clave 'YYYY-MM' -> filas, inicio, fin y huella"""
+        return self._manifest()['partitions']
+
+    def size(self):
+        """Bytes ocupados en disco por las particiones y el manifiesto"""
+        return sum(os.path.getsize(os.path.join(directory, name))
+                   for directory, _, names in os.walk(self.path) for name in names)
+
+    def _write_partition(self, key, frame):
+        import pyarrow as pa
+        path = self._partition_file(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        table = pa.Table.from_pandas(frame.rename_axis('datetime').reset_index(), preserve_index=False)
+        tmp_path = path + '.tmp'
+        if self.format == 'parquet':
+            import pyarrow.parquet as pq
+            pq.write_table(table, tmp_path, compression='zstd')
+        else:
+            with pa.OSFile(tmp_path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+
+    def write(self, df, sources=None):
+        """
+        Escribe las barras (DataFrame con DatetimeIndex ordenado). Las particiones
+        cuya huella no cambió se omiten; si `df` solo trae parte de un mes ya
+        guardado, se combina con lo existente. `sources` (clave -> huella) registra
+        de qué datos se derivó cada partición. Devuelve las particiones escritas.
+        """
+        if df.empty:
+            return []
+        manifest = self._manifest()
+        columns = list(df.columns)
+        keys = df.index.year * 100 + df.index.month
+        bounds = np.flatnonzero(np.diff(keys)) + 1
+        written = []
+        for start, end in zip(np.concatenate(([0], bounds)), np.concatenate((bounds, [len(df)]))):
+            part = df.iloc[start:end]
+            key = f'{part.index[0].year:04d}-{part.index[0].month:02d}'
+            stored = manifest['partitions'].get(key)
+            covers = stored is not None and part.index[0] <= pd.Timestamp(stored['start']) \
+                and part.index[-1] >= pd.Timestamp(stored['end'])
+            if stored is not None and not covers:
+                # Datos parciales del mes (empiezan después o terminan antes de lo guardado):
+                # se combinan con la partición y las barras nuevas reemplazan a las guardadas
+                existing = self._read_partition(key, None)
+                part = pd.concat([existing, part])
+                part = part[~part.index.duplicated(keep='last')].sort_index()
+            part_fingerprint = fingerprint(part, columns)
+            if stored is None or stored['fingerprint'] != part_fingerprint:
+                self._write_partition(key, part)
+                manifest['partitions'][key] = {'rows': len(part), 'start': str(part.index[0]),
+                                               'end': str(part.index[-1]), 'fingerprint': part_fingerprint}
+                written.append(key)
+            if sources and key in sources:
+                manifest['partitions'][key]['source'] = sources[key]
+        manifest['columns'] = columns
+        self._save_manifest(manifest)
+        if self.logger is not None:
+            self.logger.info(f'Almacenamiento {self.path}: {len(written)} particiones escritas')
+        return written
+
+    def _partitions(self, start=None, end=None):
+        """Particiones que se solapan con [start, end] (poda por el manifiesto)"""
+        partitions = self._manifest()['partitions']
+        return [key for key in sorted(partitions)
+                if (start is None or partitions[key]['end'] >= str(pd.Timestamp(start)))
+                and (end is None or partitions[key]['start'] <= str(pd.Timestamp(end)))]
+
+    def _read_table(self, key, columns):
+        """Tabla Arrow de una partición (memory-map en formato arrow)"""
+        import pyarrow as pa
+        path = self._partition_file(key)
+        names = None if columns is None else ['datetime'] + [column for column in columns if column != 'datetime']
+        if self.format == 'parquet':
+            import pyarrow.parquet as pq
+            return pq.read_table(path, columns=names)
+        table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+        return table if names is None else table.select(names)
+
+    def _slice(self, table, start, end):
+        """Recorta la tabla al rango de fechas con búsqueda binaria (sin copiar)"""
+        if start is None and end is None:
+            return table
+        times = table.column('datetime').to_numpy()
+        first = 0 if start is None else np.searchsorted(times, np.datetime64(pd.Timestamp(start)), side='left')
+        last = len(times) if end is None else np.searchsorted(times, np.datetime64(pd.Timestamp(end)), side='right')
+        return table.slice(first, max(last - first, 0))
+
+    def _read_partition(self, key, columns, start=None, end=None):
+        return self._to_frame(self._slice(self._read_table(key, columns), start, end))
+
+    @staticmethod
+    def _to_frame(table):
+        df = table.to_pandas()
+        df.index = pd.DatetimeIndex(df.pop('datetime'), name='datetime')
+        return df
+
+    def read(self, columns=None, start=None, end=None):
+        """
+        Lee las columnas pedidas en el rango [start, end]: solo se abren las
+        particiones del rango y, dentro de ellas, solo las columnas pedidas.
+        """
+        import pyarrow as pa
+        tables = [self._slice(self._read_table(key, columns), start, end) for key in self._partitions(start, end)]
+        if not tables:
+            return pd.DataFrame(columns=columns or [], index=pd.DatetimeIndex([], name='datetime'), dtype='float64')
+        return self._to_frame(pa.concat_tables(tables))
+
+    def _context_partitions(self, start, end, lookback=0, lookahead=0):
+        """Particiones del rango más las vecinas que cubren las barras de contexto"""
+        keys = self._partitions(start, end)
+        if keys:
+            partitions = self._manifest()['partitions']
+            previous = [key for key in sorted(partitions) if key < keys[0]] if start is not None else []
+            following = [key for key in sorted(partitions) if key > keys[-1]] if end is not None else []
+            needed = lookback
+            while previous and needed > 0:
+                keys.insert(0, previous.pop())
+                needed -= partitions[keys[0]]['rows']
+            needed = lookahead
+            while following and needed > 0:
+                keys.append(following.pop(0))
+                needed -= partitions[keys[-1]]['rows']
+        return keys
+
+    def read_arrays(self, columns, start=None, end=None, lookback=0, lookahead=0):
+        """
+        Camino de lectura sin copia: devuelve (índice datetime64, {columna: arreglo})
+        con vistas sobre los archivos memory-mapped cuando el rango cae en una sola
+        partición (con varias, NumPy concatena). `lookback` y `lookahead` agregan las
+        barras anteriores a `start` y posteriores a `end` que necesitan las ventanas.
+        """
+        import pyarrow as pa
+        keys = self._context_partitions(start, end, lookback, lookahead)
+        tables = [self._read_table(key, columns) for key in keys]
+        table = pa.concat_tables(tables) if tables else None
+        if table is None or table.num_rows == 0:
+            return np.array([], dtype='datetime64[ns]'), {column: np.array([]) for column in columns}
+        times = table.column('datetime').to_numpy()
+        first = 0 if start is None else max(
+            np.searchsorted(times, np.datetime64(pd.Timestamp(start)), side='left') - lookback, 0)
+        last = len(times) if end is None else min(
+            np.searchsorted(times, np.datetime64(pd.Timestamp(end)), side='right') + lookahead, len(times))
+        table = table.slice(first, max(last - first, 0))
+
+        def column_array(name):
+            chunked = table.column(name)
+            if chunked.num_chunks == 1:
+                return chunked.chunk(0).to_numpy(zero_copy_only=False)
+            return np.concatenate([chunk.to_numpy(zero_copy_only=False) for chunk in chunked.chunks])
+
+        return column_array('datetime'), {column: column_array(column) for column in columns}
+
+    def iter_arrays(self, columns, chunk_rows, start=None, end=None, lookback=0, lookahead=0, dtype='float64'):
+        """
+        Recorre el rango en bloques de `chunk_rows` barras (el último puede ser menor),
+        con una partición abierta a la vez: la memoria depende del bloque y de un mes
+        de datos, no del histórico. `lookback`/`lookahead` agregan barras de contexto
+        como en read_arrays. Produce (índice datetime64, {columna: arreglo}).
+        """
+        keys = self._context_partitions(start, end, lookback, lookahead)
+        inner = self._partitions(start, end)
+        partitions = self._manifest()['partitions']
+        # Fila global en que empieza cada partición: el contexto se cuenta en barras
+        offsets = np.cumsum([0] + [partitions[key]['rows'] for key in keys])
+        skip, limit = 0, offsets[-1]
+        if start is not None and inner:
+            position = keys.index(inner[0])
+            inner_times = self._read_table(inner[0], []).column('datetime').to_numpy()
+            skip = max(offsets[position] + np.searchsorted(inner_times, np.datetime64(pd.Timestamp(start)),
+                                                           side='left') - lookback, 0)
+        if end is not None and inner:
+            position = keys.index(inner[-1])
+            inner_times = self._read_table(inner[-1], []).column('datetime').to_numpy()
+            limit = min(offsets[position] + np.searchsorted(inner_times, np.datetime64(pd.Timestamp(end)),
+                                                            side='right') + lookahead, offsets[-1])
+
+        times, pending, buffered = [], {column: [] for column in columns}, 0
+        for position, key in enumerate(keys):
+            first = int(np.clip(skip - offsets[position], 0, offsets[position + 1] - offsets[position]))
+            last = int(np.clip(limit - offsets[position], 0, offsets[position + 1] - offsets[position]))
+            if last > first:
+                table = self._read_table(key, columns).slice(first, last - first)
+                times.append(table.column('datetime').to_numpy())
+                for column in columns:
+                    pending[column].append(table.column(column).to_numpy().astype(dtype, copy=False))
+                buffered += last - first
+            while buffered >= chunk_rows or (buffered and position == len(keys) - 1):
+                merged = np.concatenate(times)
+                block = {column: np.concatenate(pending[column]) for column in columns}
+                size = min(chunk_rows, buffered)
+                yield merged[:size], {column: values[:size] for column, values in block.items()}
+                times = [merged[size:]]
+                pending = {column: [values[size:]] for column, values in block.items()}
+                buffered -= size
+
+    def clear(self):
+        shutil.rmtree(self.path, ignore_errors=True)
@@ -0,0 +1,146 @@
+import numpy as np
+import pandas as pd
+
+from src.storage import STORE_DIR, PartitionedStore
+
+# Resoluciones soportadas -> segundos por barra
+TIMEFRAMES = {
+    '1m': 60,
+    '5m': 300,
+    '15m': 900,
+    '30m': 1800,
+    '1h': 3600,
+    '4h': 4 * 3600,
+    '1d': 86400
+}
+
+# Resoluciones menores a una hora: historical.db guarda fechas con resolución horaria,
+# así que estas barras solo viven en el almacenamiento columnar
+INTRADAY = [timeframe for timeframe, seconds in TIMEFRAMES.items() if seconds < 3600]
+
+# Regla de agregación por columna; las demás conservan el último valor del período
+AGGREGATIONS = {
+    'open': 'first',
+    'high': 'max',
+    'low': 'min',
+    'close': 'last',
+    'volume': 'sum',
+    'dividends': 'sum',
+    'stock_splits': 'sum'
+}
+
+BAR_COLUMNS = list(AGGREGATIONS)
+
+
+def timeframe_seconds(timeframe):
+    if timeframe not in TIMEFRAMES:
+        raise ValueError(f'Resolución no soportada: {timeframe} (use {", ".join(TIMEFRAMES)})')
+    return TIMEFRAMES[timeframe]
+
+
+def resample_arrays(times, columns, timeframe):
+    """
+    Agrega barras ordenadas a una resolución mayor en una pasada vectorizada:
+    cada período empieza en un múltiplo de la resolución (desde el epoch) y se
+    reduce con np.*.reduceat sobre los límites de los grupos.
+    Recibe (datetime64[ns], {columna: arreglo}) y devuelve lo mismo.
+    """
+    period = timeframe_seconds(timeframe) * 10 ** 9
+    buckets = np.asarray(times, dtype='datetime64[ns]').astype('int64') // period
+    if len(buckets) == 0:
+        return np.array([], dtype='datetime64[ns]'), {name: np.array([]) for name in columns}
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+    ends = np.concatenate((starts[1:], [len(buckets)])) - 1
+    result = {}
+    for name, values in columns.items():
+        values = np.asarray(values, dtype='float64')
+        rule = AGGREGATIONS.get(name, 'last')
+        if rule == 'first':
+            result[name] = values[starts]
+        elif rule == 'last':
+            result[name] = values[ends]
+        elif rule == 'max':
+            result[name] = np.maximum.reduceat(values, starts)
+        elif rule == 'min':
+            result[name] = np.minimum.reduceat(values, starts)
+        else:
+            result[name] = np.add.reduceat(values, starts)
+    return (buckets[starts] * period).astype('datetime64[ns]'), result
+
+
+def resample_ohlcv(df, timeframe):
+    """resample_arrays para un DataFrame con DatetimeIndex"""
+    times, columns = resample_arrays(df.index.values, {name: df[name].to_numpy() for name in df.columns}, timeframe)
+    return pd.DataFrame(columns, index=pd.DatetimeIndex(times, name='datetime'), columns=list(df.columns))
+
+
+class BarStore:
+    """
+    Serie de un símbolo en varias resoluciones. Las barras se guardan una sola vez
+    en la resolución más fina (`base`) y cada resolución mayor se deriva con
+    resample_arrays y se cachea en su propio almacenamiento particionado.
+    Al refrescar solo se recalculan los meses cuyo dato base cambió (cada mes
+    derivado guarda la huella del mes base), procesando un mes a la vez: la
+    memoria no crece con el histórico de minutos.
+    """
+
+    def __init__(self, symbol, base='1m', root=STORE_DIR, format='arrow', logger=None):
+        timeframe_seconds(base)
+        self.symbol = symbol
+        self.base = base
+        self.root = root
+        self.format = format
+        self.logger = logger
+        self.raw = PartitionedStore(f'bars-{symbol}-{base}', root=root, format=format, logger=logger)
+
+    def _derived(self, timeframe):
+        seconds = timeframe_seconds(timeframe)
+        if seconds % TIMEFRAMES[self.base] or 86400 % seconds:
+            # Los períodos deben contener barras base enteras y no cruzar días (ni meses)
+            raise ValueError(f'No se puede derivar {timeframe} de barras de {self.base}')
+        return PartitionedStore(f'bars-{self.symbol}-{timeframe}', root=self.root, format=self.format,
+                                logger=self.logger)
+
+    def write(self, df):
+        """Guarda barras en la resolución base; devuelve los meses escritos"""
+        frame = df.reindex(columns=BAR_COLUMNS, fill_value=0.0).astype('float64')
+        frame.index = pd.DatetimeIndex(frame.index, name='datetime').as_unit('ns')
+        return self.raw.write(frame)
+
+    def last_datetime(self):
+        """Última barra base guardada o None"""
+        partitions = self.raw.partitions()
+        return pd.Timestamp(partitions[max(partitions)]['end']).to_pydatetime() if partitions else None
+
+    def refresh(self, timeframe):
+        """Recalcula los meses de `timeframe` cuyo mes base cambió; devuelve los meses escritos"""
+        derived = self._derived(timeframe)
+        built = derived.partitions()
+        written = []
+        for key, partition in self.raw.partitions().items():
+            if built.get(key, {}).get('source') == partition['fingerprint']:
+                continue
+            month = pd.Timestamp(partition['start'])
+            times, columns = self.raw.read_arrays(BAR_COLUMNS, month, partition['end'])
+            times, columns = resample_arrays(times, columns, timeframe)
+            frame = pd.DataFrame(columns, index=pd.DatetimeIndex(times, name='datetime'), columns=BAR_COLUMNS)
+            written += derived.write(frame, sources={key: partition['fingerprint']})
+        return written
+
+    def iter_bars(self, timeframe=None, chunk_rows=100_000, start=None, end=None, dtype='float64'):
+        """bars() por bloques de `chunk_rows` barras (DataFrames), sin cargar todo el rango"""
+        timeframe = timeframe or self.base
+        store = self.raw
+        if timeframe != self.base:
+            self.refresh(timeframe)
+            store = self._derived(timeframe)
+        for index, columns in store.iter_arrays(BAR_COLUMNS, chunk_rows, start, end, dtype=dtype):
+            yield pd.DataFrame(columns, index=pd.DatetimeIndex(index, name='datetime'), columns=BAR_COLUMNS)
+
+    def bars(self, timeframe=None, columns=None, start=None, end=None):
+        """Barras en `timeframe` (por defecto la base) en el rango [start, end]"""
+        timeframe = timeframe or self.base
+        if timeframe == self.base:
+            return self.raw.read(columns, start, end)
+        self.refresh(timeframe)
+        return self._derived(timeframe).read(columns, start, end)
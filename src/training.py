@@ -0,0 +1,148 @@
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_squared_error, r2_score
+
+# Subconjuntos de características que se pueden combinar en la grilla
+FEATURE_SUBSETS = {
+    'all': None,
+    'prices': ['close', 'open', 'high', 'low', 'price_range', 'price_ma5', 'price_ma20'],
+    'no_levels': ['volume', 'volume_ma5', 'volume_ma20', 'price_range', 'price_ma5', 'price_ma20']
+}
+
+# Grilla de hiperparámetros por defecto
+DEFAULT_GRID = {
+    'n_estimators': [100, 200],
+    'max_depth': [6, 10, 14],
+    'features': ['all', 'prices']
+}
+
+# Datos compartidos por los procesos del pool (se envían una sola vez por proceso)
+_X = None
+_y = None
+
+
+def _init_worker(X, y):
+    global _X, _y
+    _X, _y = X, y
+
+
+def expand_grid(grid):
+    """Todas las combinaciones de la grilla como lista de diccionarios"""
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[key] for key in keys))]
+
+
+def walk_forward_splits(n_rows, n_folds=5, min_train=0.5, gap=1):
+    """
+    Particiones de ventana expansiva: el primer fold entrena con `min_train` del
+    histórico y cada fold prueba el bloque siguiente. Se dejan `gap` filas entre
+    entrenamiento y prueba porque el target mira barras futuras.
+    Devuelve una lista de (fin_entrenamiento, inicio_prueba, fin_prueba).
+    """
+    start = int(n_rows * min_train)
+    size = (n_rows - start) // n_folds
+    if size < 1:
+        raise ValueError(f'Muy pocas filas ({n_rows}) para {n_folds} folds')
+    return [(start + k * size - gap, start + k * size, start + (k + 1) * size) for k in range(n_folds)]
+
+
+def feature_columns(config, columns):
+    """Columnas que usa una configuración (en el orden original)"""
+    subset = FEATURE_SUBSETS[config.get('features', 'all')]
+    return list(columns) if subset is None else [column for column in columns if column in subset]
+
+
+def build_model(config, n_jobs=1):
+    return RandomForestRegressor(n_estimators=config['n_estimators'],
+                                 max_depth=config['max_depth'],
+                                 random_state=42,
+                                 n_jobs=n_jobs)
+
+
+def _fit_fold(task):
+    """Entrena y evalúa una configuración en un fold (se ejecuta en el pool)"""
+    index, config, positions, (train_end, test_start, test_end) = task
+    # Los árboles son invariantes al escalado, así que no hace falta el StandardScaler aquí
+    modelo = build_model(config)
+    modelo.fit(_X[:train_end, positions], _y[:train_end])
+    y_pred = modelo.predict(_X[test_start:test_end, positions])
+    y_test = _y[test_start:test_end]
+    return index, mean_squared_error(y_test, y_pred), r2_score(y_test, y_pred)
+
+
+def run_grid(logger, X, y, grid=None, n_folds=5, n_jobs=None, abandon_ratio=1.25):
+    """
+    Evalúa la grilla con validación walk-forward en un pool de procesos.
+    Los folds se recorren en rondas: en cada ronda se evalúan en paralelo todas las
+    configuraciones que siguen en carrera, y se abandonan las que tengan un RMSE
+    medio peor que `abandon_ratio` veces el de la mejor.
+    Devuelve el leaderboard ordenado por RMSE fuera de muestra (la columna `config`
+    conserva el diccionario original de cada configuración).
+    """
+    configs = expand_grid(grid or DEFAULT_GRID)
+    folds = walk_forward_splits(len(X), n_folds)
+    positions = [[X.columns.get_loc(column) for column in feature_columns(config, X.columns)] for config in configs]
+    mse = [[] for _ in configs]
+    r2 = [[] for _ in configs]
+    alive = list(range(len(configs)))
+
+    values = np.ascontiguousarray(X.to_numpy(dtype='float64'))
+    target = y.to_numpy(dtype='float64')
+    with ProcessPoolExecutor(max_workers=n_jobs or os.cpu_count(), initializer=_init_worker,
+                             initargs=(values, target)) as executor:
+        for fold_number, fold in enumerate(folds, start=1):
+            tasks = [(index, configs[index], positions[index], fold) for index in alive]
+            for index, fold_mse, fold_r2 in executor.map(_fit_fold, tasks):
+                mse[index].append(fold_mse)
+                r2[index].append(fold_r2)
+
+            rmse = {index: np.sqrt(np.mean(mse[index])) for index in alive}
+            best = min(rmse.values())
+            abandoned = [index for index in alive if rmse[index] > best * abandon_ratio]
+            alive = [index for index in alive if index not in abandoned]
+            logger.info(f"Fold {fold_number}/{len(folds)}: mejor RMSE {best:.4f}, "
+                        f"{len(abandoned)} configuraciones abandonadas, {len(alive)} en carrera")
+
+    leaderboard = pd.DataFrame([dict(config,
+                                     config=config,
+                                     rmse=np.sqrt(np.mean(mse[index])),
+                                     mse=np.mean(mse[index]),
+                                     r2=np.mean(r2[index]),
+                                     folds=len(mse[index]),
+                                     completed=len(mse[index]) == len(folds))
+                                for index, config in enumerate(configs)])
+    # Las configuraciones completas primero; dentro de cada grupo, por RMSE
+    return leaderboard.sort_values(['completed', 'rmse'], ascending=[False, True]).reset_index(drop=True)
+
+
+def remap_thresholds(modelo, old_mean, old_scale, new_mean, new_scale):
+    """
+    Ajusta en sitio los umbrales de los árboles cuando cambia el StandardScaler:
+    el umbral escalado t equivale al valor crudo t * old_scale + old_mean, que en la
+    nueva escala es (crudo - new_mean) / new_scale. Las predicciones no cambian, salvo
+    para valores a menos de un paso de float32 (en la nueva escala) de algún umbral.
+    """
+    for estimator in modelo.estimators_:
+        tree = estimator.tree_
+        split = tree.feature >= 0
+        features = tree.feature[split]
+        raw = tree.threshold[split] * old_scale[features] + old_mean[features]
+        tree.threshold[split] = (raw - new_mean[features]) / new_scale[features]
+
+
+def replace_oldest_trees(modelo, X, y, new_trees):
+    """
+    Warm start: agrega `new_trees` árboles entrenados con (X, y) y retira los
+    `new_trees` más antiguos, de modo que el bosque conserva su tamaño.
+    """
+    n_estimators = modelo.n_estimators
+    modelo.set_params(warm_start=True, n_estimators=n_estimators + new_trees)
+    modelo.fit(X, y)
+    del modelo.estimators_[:new_trees]
+    modelo.set_params(warm_start=False, n_estimators=n_estimators)
+    return modelo
@@ -1,12 +1,14 @@
 import json
+import tracemalloc
 import os
 import io
-import pandas as pd
 import pickle
 from datetime import datetime
 
 
-def create_file(data, filename, file_format='json'):
+def create_file(data, filename, file_format='json', **kwargs):
+    # pandas se importa aquí para que importar las utilidades no lo cargue
+    import pandas as pd
     os.makedirs(os.path.dirname(filename), exist_ok=True)
 
     if file_format == 'json':
@@ -16,18 +18,32 @@ def create_file(data, filename, file_format='json'):
 
     elif file_format == 'xlsx':
         if isinstance(data, pd.DataFrame):
-            data.to_excel(filename, index=False)
+            kwargs.setdefault('index', False)
+            data.to_excel(filename, **kwargs)
             print(f"Archivo Excel '{filename}' generado exitosamente.")
         else:
             raise ValueError("Los datos deben ser un DataFrame para guardar como Excel.")
 
     elif file_format == 'csv':
         if isinstance(data, pd.DataFrame):
-            data.to_csv(filename, index=False)
+            kwargs.setdefault('index', False)
+            data.to_csv(filename, **kwargs)
             print(f"Archivo CSV '{filename}' generado exitosamente.")
         else:
             raise ValueError("Los datos deben ser un DataFrame para guardar como CSV.")
             
+    elif file_format == 'parquet' or file_format == 'arrow':
+        # Formatos columnares (requieren pyarrow); el índice se conserva como columna
+        if isinstance(data, pd.DataFrame):
+            if file_format == 'parquet':
+                kwargs.setdefault('compression', 'zstd')
+                data.to_parquet(filename, **kwargs)
+            else:
+                data.reset_index().to_feather(filename, **kwargs)
+            print(f"Archivo {file_format} '{filename}' generado exitosamente.")
+        else:
+            raise ValueError(f"Los datos deben ser un DataFrame para guardar como {file_format}.")
+
     elif file_format == 'pkl' or file_format == 'pickle':
         with open(filename, 'wb') as pickle_file:
             pickle.dump(data, pickle_file)
@@ -44,7 +60,28 @@ def create_file(data, filename, file_format='json'):
         raise ValueError(f"Formato de archivo no soportado: {file_format}")
     
 
+# Símbolo principal del proyecto (futuros de paladio)
+DEFAULT_SYMBOL = 'PA=F'
+
+# Zona horaria de la bolsa (CME). Las fechas de las barras se guardan sin zona
+# horaria en la hora local de la bolsa, como las entrega yfinance
+EXCHANGE_TIMEZONE = 'America/New_York'
+
+
+def symbol_slug(symbol):
+    """Convierte un símbolo como 'PA=F' en un nombre seguro para archivos ('pa_f')"""
+    return ''.join(char if char.isalnum() else '_' for char in symbol.lower())
+
+
+def symbol_filename(base, symbol, extension):
+    """Nombre de archivo por símbolo; el símbolo por defecto conserva el nombre original"""
+    if symbol == DEFAULT_SYMBOL:
+        return f"{base}.{extension}"
+    return f"{base}_{symbol_slug(symbol)}.{extension}"
+
+
 def convert_to_numeric(df, numeric_columns):
+    import pandas as pd
     for column in numeric_columns:
         df[column] = pd.to_numeric(df[column], errors='coerce')
     return df
@@ -52,4 +89,33 @@ def convert_to_numeric(df, numeric_columns):
 def convert_to_lowercase(df, text_lowercase_columns):
     for column in text_lowercase_columns:
         df[column] = df[column].str.lower()
-    return df
\ No newline at end of file
+    return df
+
+
+class MemoryBudget:
+    """
+    Context manager que mide el pico de memoria asignada dentro del bloque con
+    tracemalloc y lanza MemoryError si supera el presupuesto en bytes.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.peak = 0
+
+    def __enter__(self):
+        self._was_tracing = tracemalloc.is_tracing()
+        if not self._was_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        self._start, _ = tracemalloc.get_traced_memory()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _, peak = tracemalloc.get_traced_memory()
+        self.peak = peak - self._start
+        if not self._was_tracing:
+            tracemalloc.stop()
+        if exc_type is None and self.peak > self.max_bytes:
+            raise MemoryError(f"Pico de memoria {self.peak / 1024 ** 2:.1f} MB supera el presupuesto de "
+                              f"{self.max_bytes / 1024 ** 2:.1f} MB")
+        return False
@@ -0,0 +1,241 @@
+import math
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Modelos de volatilidad condicional: GARCH(1,1), GJR-GARCH(1,1,1) y EWMA (RiskMetrics).
+# La recursión de la varianza es lineal en σ² para los tres:
+#     σ²_t = ω + α r²_{t-1} + γ 1[r_{t-1} < 0] r²_{t-1} + β σ²_{t-1}
+# así que se evalúa con un filtro IIR (scipy.signal.lfilter) en lugar de un bucle, y las
+# derivadas respecto a cada parámetro siguen la misma recursión: el gradiente analítico
+# de la verosimilitud sale de un solo lfilter sobre todas las columnas.
+MODELS = ('garch', 'gjr', 'ewma')
+
+PARAMETERS = {
+    'garch': ['omega', 'alpha', 'beta'],
+    'gjr': ['omega', 'alpha', 'gamma', 'beta'],
+    'ewma': ['lam']
+}
+
+# Decaimiento de RiskMetrics para datos diarios; se usa como punto de partida del EWMA
+RISKMETRICS_LAMBDA = 0.94
+
+# Los rendimientos se expresan en porcentaje: la optimización queda mejor condicionada
+SCALE = 100.0
+
+# Persistencia máxima (α + β + γ/2) antes de penalizar la no estacionariedad
+MAX_PERSISTENCE = 0.9999
+PENALTY = 1e6
+
+
+def log_returns(close):
+    """Rendimientos logarítmicos en porcentaje"""
+    close = np.asarray(close, dtype='float64')
+    return SCALE * np.diff(np.log(close))
+
+
+def backcast(returns, span=75):
+    """Varianza inicial: promedio exponencial (λ = 0.94) de los primeros rendimientos al cuadrado"""
+    head = np.asarray(returns[:span], dtype='float64') ** 2
+    if len(head) == 0:
+        return 1.0
+    weights = RISKMETRICS_LAMBDA ** np.arange(len(head))
+    return float(max(np.dot(weights, head) / weights.sum(), 1e-12))
+
+
+def _coefficients(kind, theta):
+    """(ω, α, γ, β) de cada modelo"""
+    if kind == 'garch':
+        omega, alpha, beta = theta
+        return omega, alpha, 0.0, beta
+    if kind == 'gjr':
+        omega, alpha, gamma, beta = theta
+        return omega, alpha, gamma, beta
+    if kind == 'ewma':
+        lam = theta[0]
+        return 0.0, 1.0 - lam, 0.0, lam
+    raise ValueError(f'Modelo de volatilidad desconocido: {kind} (use {", ".join(MODELS)})')
+
+
+def variance(kind, theta, returns, initial=None, gradient=False):
+    """
+    Varianzas condicionales σ²_0..σ²_n de los n rendimientos; la última es el
+    pronóstico a un paso. Con gradient=True devuelve también ∂σ²/∂θ (n+1, k).
+    """
+    from scipy.signal import lfilter
+
+    returns = np.asarray(returns, dtype='float64')
+    omega, alpha, gamma, beta = _coefficients(kind, theta)
+    initial = backcast(returns) if initial is None else initial
+    squared = returns * returns
+    negative = np.where(returns < 0, squared, 0.0)
+    drive = omega + alpha * squared + gamma * negative
+    tail, _ = lfilter([1.0], [1.0, -beta], drive, zi=[beta * initial])
+    sigma2 = np.concatenate(([initial], tail))
+    if not gradient:
+        return sigma2
+
+    # ∂σ²_t/∂θ = g_t + β ∂σ²_{t-1}/∂θ, con σ²_0 fijo (backcast)
+    previous = sigma2[:-1]
+    if kind == 'garch':
+        drivers = [np.ones_like(squared), squared, previous]
+    elif kind == 'gjr':
+        drivers = [np.ones_like(squared), squared, negative, previous]
+    else:
+        drivers = [previous - squared]
+    derivatives = lfilter([1.0], [1.0, -beta], np.column_stack(drivers), axis=0)
+    return sigma2, np.vstack((np.zeros(len(drivers)), derivatives))
+
+
+def persistence(kind, theta):
+    omega, alpha, gamma, beta = _coefficients(kind, theta)
+    return alpha + beta + gamma / 2
+
+
+def negative_loglik(theta, kind, returns, initial):
+    """-log verosimilitud gaussiana (sin la constante) y su gradiente analítico"""
+    sigma2, derivatives = variance(kind, theta, returns, initial, gradient=True)
+    sigma2, derivatives = sigma2[:-1], derivatives[:-1]
+    squared = returns * returns
+    value = 0.5 * np.sum(np.log(sigma2) + squared / sigma2)
+    grad = 0.5 * ((1.0 / sigma2 - squared / (sigma2 * sigma2)) @ derivatives)
+    if kind != 'ewma':
+        # Penalización suave de la no estacionariedad
+        excess = persistence(kind, theta) - MAX_PERSISTENCE
+        if excess > 0:
+            value += PENALTY * excess ** 2
+            weights = {'alpha': 1.0, 'beta': 1.0, 'gamma': 0.5, 'omega': 0.0}
+            grad = grad + 2 * PENALTY * excess * np.array([weights[name] for name in PARAMETERS[kind]])
+    return value, grad
+
+
+def _start(kind, returns):
+    var = float(np.var(returns)) or 1.0
+    if kind == 'garch':
+        return np.array([0.05 * var, 0.05, 0.90])
+    if kind == 'gjr':
+        return np.array([0.05 * var, 0.03, 0.04, 0.90])
+    return np.array([RISKMETRICS_LAMBDA])
+
+
+def _bounds(kind, returns):
+    var = float(np.var(returns)) or 1.0
+    if kind == 'ewma':
+        return [(0.5, 0.9999)]
+    return [(1e-8 * var, 10 * var)] + [(0.0, 1.0)] * (len(PARAMETERS[kind]) - 1)
+
+
+def fit(returns, kind='garch', start=None, maxiter=200):
+    """
+    Estima el modelo por máxima verosimilitud con L-BFGS-B y gradiente analítico.
+    `start` (parámetros de un ajuste anterior) acelera los reajustes en ventanas
+    móviles. Devuelve un diccionario serializable en JSON.
+    """
+    from scipy.optimize import minimize
+
+    returns = np.asarray(returns, dtype='float64')
+    initial = backcast(returns)
+    theta0 = _start(kind, returns) if start is None else np.asarray(start, dtype='float64')
+    result = minimize(negative_loglik, theta0, args=(kind, returns, initial), jac=True, method='L-BFGS-B',
+                      bounds=_bounds(kind, returns), options={'maxiter': maxiter})
+    return {
+        'kind': kind,
+        'params': dict(zip(PARAMETERS[kind], map(float, result.x))),
+        'loglik': float(-result.fun - 0.5 * len(returns) * math.log(2 * math.pi)),
+        'converged': bool(result.success),
+        'iterations': int(result.nit),
+        'rows': len(returns),
+        'persistence': float(persistence(kind, result.x))
+    }
+
+
+def _theta(model):
+    return np.array([model['params'][name] for name in PARAMETERS[model['kind']]])
+
+
+def conditional_variance(model, returns):
+    """σ²_0..σ²_n de un modelo ajustado sobre `returns` (la última es el pronóstico a un paso)"""
+    return variance(model['kind'], _theta(model), returns)
+
+
+def forecast(model, returns, horizon=1):
+    """
+    Pronóstico de varianza a 1..horizon pasos. Para GARCH/GJR la varianza revierte
+    geométricamente a la de largo plazo ω / (1 - persistencia); EWMA es plana.
+    """
+    next_variance = conditional_variance(model, returns)[-1]
+    steps = np.arange(horizon)
+    if model['kind'] == 'ewma':
+        return np.full(horizon, next_variance)
+    theta = _theta(model)
+    rho = persistence(model['kind'], theta)
+    long_run = theta[0] / (1 - rho) if rho < 1 else next_variance
+    return long_run + rho ** steps * (next_variance - long_run)
+
+
+def _fit_block(task):
+    """Ajusta en secuencia las ventanas de un bloque, cada una partiendo de la anterior"""
+    returns, kind, window, ends, offset = task
+    fits, start = [], None
+    for end in ends:
+        model = fit(returns[end - window - offset:end - offset], kind, start=start)
+        model['end'] = int(end)
+        start = _theta(model)
+        fits.append(model)
+    return fits
+
+
+def rolling_fit(returns, kind='garch', window=2000, step=24, n_jobs=None):
+    """
+    Reajusta el modelo en ventanas móviles de `window` rendimientos cada `step`
+    barras. Las ventanas se reparten en bloques contiguos entre procesos; dentro
+    de cada bloque cada ajuste arranca de los parámetros del anterior.
+    Devuelve la lista de ajustes con la posición `end` (exclusiva) de cada ventana.
+    """
+    returns = np.asarray(returns, dtype='float64')
+    ends = list(range(window, len(returns) + 1, step))
+    if not ends:
+        raise ValueError(f'Se necesitan al menos {window} rendimientos para la ventana móvil')
+    n_jobs = max(1, min(n_jobs or 1, len(ends)))
+    blocks = [block.tolist() for block in np.array_split(np.array(ends), n_jobs)]
+    # Cada proceso recibe solo los rendimientos que cubren sus ventanas
+    tasks = [(returns[block[0] - window:block[-1]], kind, window, block, block[0] - window) for block in blocks]
+    if n_jobs == 1:
+        return _fit_block(tasks[0])
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        return [model for fits in executor.map(_fit_block, tasks) for model in fits]
+
+
+def rolling_forecast(returns, fits, window, step):
+    """
+    Varianza fuera de muestra a un paso: cada ajuste de rolling_fit pronostica las
+    `step` barras que siguen a su ventana. Devuelve (posiciones, varianzas).
+    """
+    returns = np.asarray(returns, dtype='float64')
+    positions, variances = [], []
+    for model in fits:
+        end = model['end']
+        horizon = min(step, len(returns) - end)
+        if horizon <= 0:
+            continue
+        sigma2 = conditional_variance(model, returns[end - window:end + horizon])
+        positions.append(np.arange(end, end + horizon))
+        variances.append(sigma2[window:window + horizon])
+    if not positions:
+        return np.array([], dtype='int64'), np.array([])
+    return np.concatenate(positions), np.concatenate(variances)
+
+
+def _fit_task(task):
+    returns, kind = task
+    return fit(returns, kind)
+
+
+def fit_many(series, kind='garch', n_jobs=None):
+    """Ajusta varios símbolos en paralelo: recibe y devuelve un diccionario símbolo -> rendimientos / ajuste"""
+    names = list(series)
+    tasks = [(np.asarray(series[name], dtype='float64'), kind) for name in names]
+    if (n_jobs or 1) == 1 or len(tasks) <= 1:
+        return dict(zip(names, map(_fit_task, tasks)))
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        return dict(zip(names, executor.map(_fit_task, tasks)))
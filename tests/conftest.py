@@ -0,0 +1,40 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Los módulos se importan como `src.<módulo>` desde la raíz del repositorio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_bars(rows, freq='h', start='2024-01-01', seed=0, decimals=None):
+    """Barras OHLCV sintéticas con un paseo aleatorio (opcionalmente redondeadas)"""
+    rng = np.random.default_rng(seed)
+    close = 1000 + np.cumsum(rng.normal(0, 2, rows))
+    spread = np.abs(rng.normal(0, 1, rows))
+    df = pd.DataFrame({
+        'open': close + rng.normal(0, 0.5, rows),
+        'high': close + spread,
+        'low': close - spread,
+        'close': close,
+        'volume': rng.integers(1, 1000, rows).astype('float64')
+    }, index=pd.date_range(start, periods=rows, freq=freq, name='datetime'))
+    return df.round(decimals) if decimals is not None else df
+
+
+def yahoo_week(sunday):
+    """Semana horaria completa como la entrega yfinance: hora de la bolsa con zona horaria"""
+    index = pd.date_range(f'{sunday} 18:00', periods=5 * 24, freq='h', tz='America/New_York')
+    index = index[index.hour != 17]
+    bars = make_bars(len(index), decimals=2)
+    bars['dividends'] = bars['stock_splits'] = 0.0
+    bars.index = index.rename('Datetime')
+    return bars.rename(columns={'open': 'Open', 'high': 'High', 'low': 'Low', 'close': 'Close',
+                                'volume': 'Volume', 'dividends': 'Dividends', 'stock_splits': 'Stock Splits'})
+
+
+@pytest.fixture
+def bars():
+    return make_bars(2000)
@@ -0,0 +1,77 @@
+import logging
+import os
+
+import numpy as np
+import pytest
+
+from src.cache import ResultCache
+from src.enricher import KPI_COLUMNS, Enricher
+from tests.conftest import make_bars
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultCache(logging.getLogger('tests'), cache_dir=str(tmp_path))
+
+
+def results(df):
+    return df[['close']].rename(columns={'close': 'value'}) * 2
+
+
+def test_complete_hit(cache, bars):
+    cache.save('kpis-PA=F', bars, ['close'], results(bars))
+    hit = cache.load('kpis-PA=F', bars, ['close'])
+    assert hit.complete
+    assert hit.rows == len(bars)
+    np.testing.assert_array_equal(hit.frame.to_numpy(), results(bars).to_numpy())
+
+
+def test_appended_bars_reuse_stable_rows(cache):
+    df = make_bars(2001)
+    cache.save('kpis-PA=F', df.iloc[:2000], ['close'], results(df.iloc[:2000]), state={'rows': 1999})
+    hit = cache.load('kpis-PA=F', df, ['close'])
+    assert not hit.complete
+    # La última barra guardada puede ser revisada por la fuente: solo las anteriores son estables
+    assert hit.rows == 1999
+    assert len(hit.frame) == 1999
+    assert hit.state == {'rows': 1999}
+
+
+def test_changed_bars_miss(cache, bars):
+    cache.save('kpis-PA=F', bars, ['close'], results(bars))
+    changed = bars.copy()
+    changed.iloc[10, changed.columns.get_loc('close')] += 1
+    assert cache.load('kpis-PA=F', changed, ['close']) is None
+    assert cache.load('kpis-PA=F', bars, ['close'], version='otra') is None
+
+
+def test_eviction_drops_least_recently_used(tmp_path):
+    cache = ResultCache(logging.getLogger('tests'), cache_dir=str(tmp_path), max_bytes=10 ** 9)
+    frames = {name: make_bars(500, start=start) for name, start in
+              (('a', '2024-01-01'), ('b', '2024-02-01'), ('c', '2024-03-01'))}
+    for index, (name, df) in enumerate(frames.items()):
+        cache.save(name, df, ['close'], results(df))
+        path = cache._path(name, df, '')
+        os.utime(path, (1000 + index, 1000 + index))
+    # Usar 'a' la vuelve la más reciente: se elimina 'b'
+    assert cache.load('a', frames['a'], ['close']).complete
+    size = os.path.getsize(cache._path('c', frames['c'], ''))
+    cache.max_bytes = 2 * size + size // 2
+    cache._evict()
+
+    assert cache.load('b', frames['b'], ['close']) is None
+    assert cache.load('a', frames['a'], ['close']) is not None
+    assert cache.load('c', frames['c'], ['close']) is not None
+
+
+def test_enrich_cached_extends_incrementally(cache):
+    """Con barras nuevas, los KPIs del cache más los calculados en línea coinciden con enrich_data"""
+    enricher = Enricher(logging.getLogger('tests'))
+    df = make_bars(2100)
+    enricher.enrich_cached(df.iloc[:2000].copy(), cache, 'kpis-PA=F')
+
+    extended = enricher.enrich_cached(df.copy(), cache, 'kpis-PA=F')
+
+    expected = enricher.enrich_data(df.copy())
+    np.testing.assert_allclose(extended[KPI_COLUMNS].to_numpy(), expected[KPI_COLUMNS].to_numpy(), rtol=0, atol=1e-4)
+    assert cache.load('kpis-PA=F', df, ['close'], version='').complete
@@ -0,0 +1,56 @@
+import logging
+
+import pandas as pd
+import pytest
+
+from src.enricher import KPI_COLUMNS, Enricher
+from tests.conftest import make_bars
+
+
+@pytest.fixture
+def enricher():
+    return Enricher(logging.getLogger('tests'))
+
+
+def chunks(df, size):
+    return (df.iloc[start:start + size] for start in range(0, len(df), size))
+
+
+@pytest.mark.parametrize('size', [777, 1000, 3000])
+@pytest.mark.parametrize('decimals', [2, 3, 4])
+def test_chunked_matches_in_memory_on_rounded_prices(enricher, size, decimals):
+    """Con precios redondeados los empates de round(4) exponen cualquier diferencia en el último bit"""
+    df = make_bars(12000, decimals=decimals)
+    expected = enricher.enrich_data(df.copy())
+
+    chunked = pd.concat(list(enricher.enrich_chunked(chunks(df, size))))
+
+    assert chunked.index.equals(expected.index)
+    for column in KPI_COLUMNS:
+        assert (chunked[column].to_numpy() == expected[column].to_numpy()).all(), column
+
+
+def test_chunked_short_series(enricher):
+    df = make_bars(300, decimals=3)
+    expected = enricher.enrich_data(df.copy())
+    chunked = pd.concat(list(enricher.enrich_chunked(chunks(df, 64))))
+    pd.testing.assert_frame_equal(chunked, expected, check_freq=False)
+
+
+def test_enrich_data_leaves_input_untouched(enricher, bars):
+    original = bars.copy()
+    enriched = enricher.enrich_data(bars)
+    pd.testing.assert_frame_equal(bars, original)
+    assert set(KPI_COLUMNS) <= set(enriched.columns)
+
+
+def test_enrich_cached_hit_leaves_input_untouched(enricher, bars, tmp_path):
+    from src.cache import ResultCache
+    cache = ResultCache(logging.getLogger('tests'), cache_dir=str(tmp_path))
+    original = bars.copy()
+    enricher.enrich_cached(bars, cache, 'kpis-PA=F')
+
+    enriched = enricher.enrich_cached(bars, cache, 'kpis-PA=F')
+
+    pd.testing.assert_frame_equal(bars, original)
+    pd.testing.assert_frame_equal(enriched, enricher.enrich_data(bars))
@@ -0,0 +1,97 @@
+import copy
+
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.preprocessing import StandardScaler
+
+from src.inference import CompiledForest
+from src.training import remap_thresholds
+
+TOLERANCE = 1e-12
+
+
+def features(rng, rows):
+    """Precios cerca de 1000 y una columna de escala muy chica, donde el redondeo a float32 pesa"""
+    X = rng.normal(1000, 50, (rows, 4))
+    X[:, 1] = rng.normal(0, 1e-3, rows)
+    return X
+
+
+@pytest.fixture(scope='module')
+def trained():
+    rng = np.random.default_rng(0)
+    X = features(rng, 2000)
+    y = 0.01 * X[:, 0] + 1e3 * X[:, 1] + rng.normal(0, 1, len(X))
+    scaler = StandardScaler().fit(X)
+    modelo = RandomForestRegressor(n_estimators=15, max_depth=8, random_state=0).fit(scaler.transform(X), y)
+    return modelo, scaler, X
+
+
+def threshold_rows(modelo, base, to_raw=lambda feature, value: value):
+    """Filas con una característica justo en cada umbral, en el punto medio float32 más cercano y a 1 ulp"""
+    rows = []
+    for estimator in modelo.estimators_:
+        tree = estimator.tree_
+        split = tree.feature >= 0
+        for feature, threshold in zip(tree.feature[split], tree.threshold[split]):
+            below = np.float32(threshold)
+            below = below if below <= threshold else np.nextafter(below, np.float32(-np.inf))
+            middle = (float(below) + float(np.nextafter(below, np.float32(np.inf)))) / 2
+            for value in (threshold, middle, np.nextafter(threshold, -np.inf), np.nextafter(threshold, np.inf)):
+                row = base.copy()
+                row[feature] = to_raw(feature, value)
+                rows.append(row)
+    return np.array(rows)
+
+
+def test_compiled_matches_sklearn_on_random_rows(trained):
+    modelo, scaler, _ = trained
+    compiled = CompiledForest.from_sklearn(modelo, scaler)
+    X = features(np.random.default_rng(1), 5000)
+    np.testing.assert_allclose(compiled.predict(X), modelo.predict(scaler.transform(X)), rtol=0, atol=TOLERANCE)
+
+
+def test_compiled_matches_sklearn_on_threshold_edges(trained):
+    modelo, scaler, X = trained
+    compiled = CompiledForest.from_sklearn(modelo, scaler)
+    edges = threshold_rows(modelo, X.mean(axis=0), lambda feature, value: value * scaler.scale_[feature] +
+                           scaler.mean_[feature])
+    np.testing.assert_allclose(compiled.predict(edges), modelo.predict(scaler.transform(edges)),
+                               rtol=0, atol=TOLERANCE)
+
+
+def test_compiled_without_scaler_resolves_float32_ties(trained):
+    """Sin scaler las filas caen exactamente en los puntos medios float32, donde sklearn redondea a la par"""
+    modelo, scaler, X = trained
+    compiled = CompiledForest.from_sklearn(modelo)
+    edges = threshold_rows(modelo, scaler.transform(X).mean(axis=0))
+    np.testing.assert_allclose(compiled.predict(edges), modelo.predict(edges), rtol=0, atol=TOLERANCE)
+
+
+def test_compiled_round_trip(trained, tmp_path):
+    modelo, scaler, X = trained
+    compiled = CompiledForest.from_sklearn(modelo, scaler, ['a', 'b', 'c', 'd'])
+    path = str(tmp_path / 'compiled.npz')
+    compiled.save(path)
+    loaded = CompiledForest.load(path)
+    assert loaded.features == ['a', 'b', 'c', 'd']
+    np.testing.assert_array_equal(loaded.predict(X), compiled.predict(X))
+
+
+def test_remap_thresholds_keeps_predictions(trained):
+    """Tras actualizar el scaler con barras nuevas (como en reentrenar_df) las predicciones no cambian"""
+    modelo, scaler, X = trained
+    rng = np.random.default_rng(2)
+    new_rows = features(rng, 500)
+    new_rows[:, [0, 2, 3]] += 30  # los precios derivan; la columna de escala chica no
+    new_scaler = copy.deepcopy(scaler).partial_fit(new_rows)
+    remapped = copy.deepcopy(modelo)
+
+    remap_thresholds(remapped, scaler.mean_, scaler.scale_, new_scaler.mean_, new_scaler.scale_)
+
+    Z = features(rng, 5000)
+    np.testing.assert_allclose(remapped.predict(new_scaler.transform(Z)), modelo.predict(scaler.transform(Z)),
+                               rtol=0, atol=TOLERANCE)
+    compiled = CompiledForest.from_sklearn(remapped, new_scaler)
+    np.testing.assert_allclose(compiled.predict(Z), modelo.predict(scaler.transform(Z)), rtol=0, atol=TOLERANCE)
@@ -0,0 +1,51 @@
+import logging
+import os
+
+from src.enricher import Enricher
+from src.logger import TIMINGS, merge_timings, stage_timer, timing_summary, worker_timings
+from src.pipeline import Pipeline, Stage
+from tests.conftest import make_bars
+
+
+def worker_stage(values):
+    with stage_timer('tests.worker', len(values)):
+        return sum(values)
+
+
+def events_since(first, stage):
+    return [event for event in TIMINGS[first:] if event['stage'] == stage]
+
+
+def test_merge_skips_events_of_this_process():
+    first = len(TIMINGS)
+    result, events = worker_timings(worker_stage, [1, 2, 3])
+    assert result == 6 and len(events) == 1
+    merge_timings(events)
+    assert len(events_since(first, 'tests.worker')) == 1
+
+    merge_timings([dict(events[0], pid=os.getpid() + 1)])
+    assert len(events_since(first, 'tests.worker')) == 2
+
+
+def test_process_stage_timings_reach_the_summary(tmp_path):
+    first = len(TIMINGS)
+    stages = [Stage('numbers', lambda n: list(range(n)), ['rows'], ['values']),
+              Stage('total', worker_stage, ['values'], ['total'], pool='process')]
+    pipeline = Pipeline(stages, logger=logging.getLogger('tests'), state_path=str(tmp_path / 'state.json'))
+    pipeline.run({'rows': 10})
+
+    worker = events_since(first, 'tests.worker')
+    assert len(worker) == 1 and worker[0]['pid'] != os.getpid() and worker[0]['rows'] == 10
+    assert events_since(first, 'pipeline.total')[0]['pid'] == worker[0]['pid']
+
+
+def test_enrich_many_worker_timings_reach_the_summary():
+    first = len(TIMINGS)
+    frames = {'PA=F': make_bars(500), 'PL=F': make_bars(400, seed=1)}
+    Enricher(logging.getLogger('tests')).enrich_many(frames, max_workers=2)
+
+    events = events_since(first, 'enricher.enrich_data')
+    assert sorted(event['rows'] for event in events) == [400, 500]
+    assert all(event['pid'] != os.getpid() for event in events)
+    summary = timing_summary(TIMINGS[first:])
+    assert any(line.split()[:2] == ['enricher.enrich_data', '2'] for line in summary.splitlines())
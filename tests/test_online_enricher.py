@@ -0,0 +1,45 @@
+import json
+import logging
+
+import numpy as np
+import pytest
+
+from src.enricher import KPI_COLUMNS, Enricher
+from src.online_enricher import OnlineEnricher
+from tests.conftest import make_bars
+
+# Ambos cálculos redondean a 4 decimales: un empate puede caer distinto por el último bit
+TOLERANCE = 1e-4
+
+
+@pytest.fixture
+def batch(bars):
+    return Enricher(logging.getLogger('tests')).enrich_data(bars.copy())
+
+
+def test_bar_by_bar_matches_batch(bars, batch):
+    online = OnlineEnricher().update_batch(bars)
+    np.testing.assert_allclose(online.to_numpy(), batch[KPI_COLUMNS].to_numpy(), rtol=0, atol=TOLERANCE)
+
+
+def test_from_history_continues_like_batch(bars, batch):
+    online = OnlineEnricher.from_history(bars.iloc[:1500])
+    tail = online.update_batch(bars.iloc[1500:])
+    np.testing.assert_allclose(tail.to_numpy(), batch[KPI_COLUMNS].iloc[1500:].to_numpy(), rtol=0, atol=TOLERANCE)
+    assert online.last_datetime == str(bars.index[-1])
+
+
+def test_serialized_state_resumes_identically(bars):
+    online = OnlineEnricher()
+    online.update_batch(bars.iloc[:1000])
+    resumed = OnlineEnricher.from_dict(json.loads(json.dumps(online.to_dict())))
+
+    expected = online.update_batch(bars.iloc[1000:])
+    np.testing.assert_array_equal(resumed.update_batch(bars.iloc[1000:]).to_numpy(), expected.to_numpy())
+
+
+def test_state_file_round_trip(bars, tmp_path):
+    online = OnlineEnricher.from_history(bars)
+    path = str(tmp_path / 'state' / 'online.json')
+    online.save(path)
+    assert OnlineEnricher.load(path).to_dict() == online.to_dict()
@@ -0,0 +1,115 @@
+import logging
+
+import pytest
+
+from src.pipeline import Pipeline, Stage
+
+
+class Calls:
+    """Funciones de etapa que anotan cada ejecución"""
+
+    def __init__(self):
+        self.names = []
+
+    def stage(self, name, function):
+        def run(*values):
+            self.names.append(name)
+            return function(*values)
+        return run
+
+
+@pytest.fixture
+def calls():
+    return Calls()
+
+
+def graph(calls, state_path, saved=None):
+    """descarga -> (calidad, csv) -> enriquecer; csv solo tiene efectos"""
+    saved = saved if saved is not None else []
+    stages = [
+        Stage('download', calls.stage('download', lambda n: list(range(n))), ['rows'], ['bars'], always=True),
+        Stage('quality', calls.stage('quality', lambda bars: [value * 2 for value in bars]), ['bars'], ['clean']),
+        Stage('csv', calls.stage('csv', lambda bars: saved.append(len(bars))), ['bars'], ['csv_written']),
+        Stage('enrich', calls.stage('enrich', lambda clean, factor: sum(clean) * factor), ['clean', 'factor'],
+              ['kpis'], pool=None),
+    ]
+    return Pipeline(stages, logger=logging.getLogger('tests'), state_path=str(state_path), max_workers=2)
+
+
+def statuses(results):
+    return {name: status for name, status, _ in results}
+
+
+def test_unchanged_stages_are_skipped(calls, tmp_path):
+    pipeline = graph(calls, tmp_path / 'state.json')
+    first = statuses(pipeline.run({'rows': 5, 'factor': 1}))
+    assert set(first.values()) == {'ejecutada'}
+
+    calls.names.clear()
+    second = statuses(pipeline.run({'rows': 5, 'factor': 1}))
+    assert second == {'download': 'ejecutada', 'quality': 'sin cambios', 'csv': 'sin cambios', 'enrich': 'sin cambios'}
+    assert calls.names == ['download']
+
+
+def test_changed_input_reruns_only_its_descendants(calls, tmp_path):
+    pipeline = graph(calls, tmp_path / 'state.json')
+    pipeline.run({'rows': 5, 'factor': 1})
+
+    calls.names.clear()
+    result = statuses(pipeline.run({'rows': 5, 'factor': 3}))
+    assert result['enrich'] == 'ejecutada' and result['quality'] == 'sin cambios'
+    # La etapa saltada se repite solo para materializar la entrada de enrich
+    assert sorted(calls.names) == ['download', 'enrich', 'quality']
+
+    calls.names.clear()
+    result = statuses(pipeline.run({'rows': 6, 'factor': 3}))
+    assert set(result.values()) == {'ejecutada'}
+
+
+def test_only_runs_the_selected_stage(calls, tmp_path):
+    saved = []
+    pipeline = graph(calls, tmp_path / 'state.json', saved)
+    pipeline.run({'rows': 5, 'factor': 1})
+
+    calls.names.clear()
+    result = statuses(pipeline.run({'rows': 5, 'factor': 2}, only=['enrich']))
+    assert result == {'download': 'no seleccionada', 'quality': 'no seleccionada', 'csv': 'no seleccionada',
+                      'enrich': 'ejecutada'}
+    # Las etapas previas se repiten para obtener las entradas de enrich; csv no hace falta
+    assert sorted(calls.names) == ['download', 'enrich', 'quality']
+    assert saved == [5]
+
+    with pytest.raises(ValueError, match='Etapa desconocida'):
+        pipeline.run({'rows': 5, 'factor': 2}, only=['train'])
+
+
+def test_force_and_start(calls, tmp_path):
+    pipeline = graph(calls, tmp_path / 'state.json')
+    pipeline.run({'rows': 5, 'factor': 1})
+
+    calls.names.clear()
+    assert set(statuses(pipeline.run({'rows': 5, 'factor': 1}, force=True)).values()) == {'ejecutada'}
+    assert sorted(calls.names) == ['csv', 'download', 'enrich', 'quality']
+
+    calls.names.clear()
+    result = statuses(pipeline.run({'rows': 5, 'factor': 1}, start='quality', force=True))
+    assert result['quality'] == result['enrich'] == 'ejecutada'
+    assert result['csv'] == 'no seleccionada'
+
+
+def test_failed_stage_cancels_descendants(tmp_path):
+    def fail(bars):
+        raise RuntimeError('falla')
+
+    stages = [Stage('download', lambda n: list(range(n)), ['rows'], ['bars']),
+              Stage('quality', fail, ['bars'], ['clean']),
+              Stage('enrich', sum, ['clean'], ['kpis'])]
+    pipeline = Pipeline(stages, logger=logging.getLogger('tests'), state_path=str(tmp_path / 'state.json'))
+    result = statuses(pipeline.run({'rows': 3}))
+    assert result == {'download': 'ejecutada', 'quality': 'error', 'enrich': 'cancelada'}
+
+
+def test_only_without_previous_run_recovers_inputs(calls, tmp_path):
+    pipeline = graph(calls, tmp_path / 'state.json')
+    result = statuses(pipeline.run({'rows': 4, 'factor': 1}, only=['enrich']))
+    assert result == {'download': 'recuperada', 'quality': 'recuperada', 'csv': 'recuperada', 'enrich': 'ejecutada'}
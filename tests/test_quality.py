@@ -0,0 +1,34 @@
+import pandas as pd
+import pytest
+
+from src.collector import DataCollector
+from src.quality import check_bars
+from tests.conftest import yahoo_week
+
+
+@pytest.mark.parametrize('sunday', ['2024-06-09', '2024-03-10', '2024-11-03'])
+def test_clean_yahoo_session_has_no_gaps(tmp_path, sunday):
+    """Una semana limpia no tiene barras faltantes ni fuera de sesión (también con cambio de horario)"""
+    collector = DataCollector(db_path=str(tmp_path / 'historical.db'), store_format=None)
+    df = collector._to_frame(yahoo_week(sunday))
+
+    cleaned, report = check_bars(df)
+
+    assert report['timeframe'] == '1h'
+    assert report['expected'] == 5 * 23
+    assert report['missing'] == 0
+    assert report['off_calendar'] == 0
+    assert len(cleaned) == 5 * 23
+
+
+def test_missing_bar_is_reported_and_filled(tmp_path):
+    collector = DataCollector(db_path=str(tmp_path / 'historical.db'), store_format=None)
+    df = collector._to_frame(yahoo_week('2024-06-09'))
+    df = df.drop(pd.Timestamp('2024-06-11 10:00'))
+
+    cleaned, report = check_bars(df, fill='ffill')
+
+    assert report['missing'] == 1
+    assert report['largest_gap'] == ('2024-06-11 10:00:00', 1)
+    assert report['filled'] == 1
+    assert cleaned.loc['2024-06-11 10:00', 'close'] == df.loc['2024-06-11 09:00', 'close']
@@ -0,0 +1,75 @@
+import logging
+import os
+
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.preprocessing import StandardScaler
+
+from src.inference import CompiledForest
+from src.registry import ModelRegistry
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return ModelRegistry(logging.getLogger('tests'), 'PA=F', root=str(tmp_path), keep=2)
+
+
+@pytest.fixture(scope='module')
+def artifact():
+    rng = np.random.default_rng(0)
+    X, y = rng.normal(size=(200, 3)), rng.normal(size=200)
+    scaler = StandardScaler().fit(X)
+    return {'model': RandomForestRegressor(n_estimators=3, random_state=0).fit(scaler.transform(X), y),
+            'scaler': scaler, 'features': ['a', 'b', 'c']}
+
+
+def test_register_marks_latest_and_loads(registry, artifact):
+    first = registry.register(artifact, {'rows': 200})
+    second = registry.register(artifact, {'rows': 300})
+
+    assert (first, second) == ('v0001', 'v0002')
+    assert registry.latest_version() == second
+    loaded, metadata = registry.load()
+    assert metadata['version'] == second and metadata['rows'] == 300
+    assert loaded['features'] == artifact['features']
+    # Sin temporales a la vista: las escrituras se hacen en un directorio aparte y se renombran
+    assert sorted(os.listdir(registry.path)) == ['LATEST', 'v0001', 'v0002']
+
+
+def test_failed_register_leaves_latest_untouched(registry, artifact):
+    registry.register(artifact, {})
+    with pytest.raises(Exception):
+        registry.register({'model': lambda x: x}, {})
+    assert registry.versions() == ['v0001']
+    assert registry.latest_version() == 'v0001'
+    assert not [entry for entry in os.listdir(registry.path) if entry.startswith('.')]
+
+
+def test_checksum_mismatch_is_rejected(registry, artifact):
+    version = registry.register(artifact, {})
+    with open(os.path.join(registry.path, version, 'model.joblib'), 'ab') as artifact_file:
+        artifact_file.write(b'0')
+    with pytest.raises(ValueError, match='Checksum'):
+        registry.load()
+
+
+def test_compiled_artifact_is_verified(registry, artifact):
+    compiled = CompiledForest.from_sklearn(artifact['model'], artifact['scaler'], artifact['features'])
+    version = registry.register(artifact, {}, compiled=compiled)
+    loaded, metadata = registry.load_compiled()
+    X = np.random.default_rng(1).normal(size=(50, 3))
+    np.testing.assert_array_equal(loaded.predict(X), compiled.predict(X))
+
+    other = registry.register(artifact, {}, compiled=compiled)
+    with open(os.path.join(registry.path, other, 'compiled.npz'), 'ab') as compiled_file:
+        compiled_file.write(b'0')
+    with pytest.raises(ValueError, match='Checksum'):
+        registry.load_compiled()
+    assert registry.load_compiled(version)[0] is loaded
+
+
+def test_old_versions_are_pruned(registry, artifact):
+    for _ in range(3):
+        registry.register(artifact, {})
+    assert registry.versions() == ['v0002', 'v0003']
@@ -0,0 +1,114 @@
+import os
+
+import pandas as pd
+import pytest
+
+from src.scheduler import DownloadScheduler, TokenBucket
+from src.sources import FakeSource
+from tests.conftest import make_bars
+
+SYMBOL = 'PA=F'
+START, END = pd.Timestamp('2024-01-01'), pd.Timestamp('2024-04-01')
+
+
+@pytest.fixture
+def history():
+    # 91 días de barras horarias: 4 bloques de 30 días con el intervalo '1h' de FakeSource
+    return make_bars(91 * 24, start=START).rename(columns=str.capitalize)
+
+
+class FlakySource(FakeSource):
+    """FakeSource que falla las primeras `failures` solicitudes o las que empiezan desde `broken_from`"""
+
+    def __init__(self, frames, failures=0, error=ConnectionError, broken_from=None, **kwargs):
+        super().__init__(frames=frames, latency=0, **kwargs)
+        self.failures = failures
+        self.error = error
+        self.broken_from = broken_from
+        self.requested = []
+
+    def history(self, symbol, start=None, end=None, interval='1d', period=None):
+        self.requested.append(start)
+        if self.failures:
+            self.failures -= 1
+            raise self.error(f'Conexión interrumpida ({symbol})')
+        if self.broken_from is not None and start >= self.broken_from:
+            raise self.error(f'Respuesta inválida ({symbol})')
+        return super().history(symbol, start=start, end=end, interval=interval, period=period)
+
+
+def scheduler(source, tmp_path, **kwargs):
+    kwargs.setdefault('max_concurrency', 1)
+    kwargs.setdefault('base_delay', 0.001)
+    kwargs.setdefault('max_delay', 0.01)
+    return DownloadScheduler(source, checkpoint_dir=str(tmp_path), seed=0, **kwargs)
+
+
+def download(scheduler):
+    return scheduler.run({SYMBOL: {'start': START, 'end': END, 'interval': '1h'}})[SYMBOL]
+
+
+def test_transient_failure_is_retried(tmp_path, history):
+    source = FlakySource({SYMBOL: history}, failures=2)
+    planner = scheduler(source, tmp_path)
+
+    data = download(planner)
+
+    pd.testing.assert_frame_equal(data, history)
+    assert planner.stats['retries'] == 2
+    assert planner.stats['chunks'] == len(planner.plan(START, END, '1h')) == 4
+    assert planner.stats['requests'] == 4 + 2
+
+
+def test_non_retryable_error_is_raised(tmp_path, history):
+    source = FlakySource({SYMBOL: history}, failures=1, error=ValueError)
+    planner = scheduler(source, tmp_path)
+    with pytest.raises(ValueError):
+        download(planner)
+    assert planner.stats['retries'] == 0
+
+
+def test_rate_limit_pauses_the_bucket(tmp_path, history, monkeypatch):
+    """Un 429 ('Rate limited') de la fuente detiene a todos los consumidores del token bucket"""
+    pauses = []
+    original = TokenBucket.pause
+
+    def pause(bucket, seconds):
+        pauses.append(seconds)
+        original(bucket, seconds)
+
+    monkeypatch.setattr(TokenBucket, 'pause', pause)
+    # La fuente admite 2 solicitudes por segundo: las esperas tienen que cubrir su ventana de un segundo
+    source = FakeSource(frames={SYMBOL: history}, latency=0, rate_limit=2)
+    planner = scheduler(source, tmp_path, max_concurrency=4, retries=10, base_delay=0.2, max_delay=1.0)
+
+    data = download(planner)
+
+    pd.testing.assert_frame_equal(data, history)
+    assert source.rejected > 0
+    assert len(pauses) == planner.stats['retries'] == source.rejected
+
+
+def test_interrupted_run_resumes_from_checkpoints(tmp_path, history):
+    chunks = DownloadScheduler(FakeSource(frames={}), checkpoint_dir=None).plan(START, END, '1h')
+    broken = FlakySource({SYMBOL: history}, error=ValueError, broken_from=chunks[-1][0])
+    with pytest.raises(ValueError):
+        download(scheduler(broken, tmp_path))
+    saved = os.listdir(tmp_path / 'pa_f')
+    assert len(saved) == len(chunks) - 1
+    assert all(name.endswith('.arrow') for name in saved)
+
+    source = FlakySource({SYMBOL: history})
+    planner = scheduler(source, tmp_path)
+    data = download(planner)
+
+    pd.testing.assert_frame_equal(data, history, check_freq=False)
+    assert planner.stats['checkpoints'] == len(chunks) - 1
+    assert source.requested == [chunks[-1][0]]
+
+
+def test_checkpoints_are_cleared_after_success(tmp_path, history):
+    planner = scheduler(FlakySource({SYMBOL: history}), tmp_path)
+    download(planner)
+    assert planner.stats['chunks'] == 4
+    assert not os.path.exists(tmp_path / 'pa_f')
@@ -0,0 +1,28 @@
+import pandas as pd
+
+from src.collector import DataCollector
+from src.sources import LocalFileSource, exchange_time
+from tests.conftest import yahoo_week
+
+
+def test_exchange_time_converts_aware_and_keeps_naive():
+    aware = pd.DatetimeIndex(['2024-03-08 15:00', '2024-03-11 15:00'], tz='UTC')
+    assert list(exchange_time(aware)) == [pd.Timestamp('2024-03-08 10:00'), pd.Timestamp('2024-03-11 11:00')]
+    naive = pd.DatetimeIndex(['2024-03-08 10:00'])
+    assert exchange_time(naive).equals(naive)
+
+
+def test_local_file_matches_yahoo_frame(tmp_path):
+    """Un CSV exportado de yfinance (con desfases que cambian con el horario) da las mismas fechas que la descarga"""
+    week = yahoo_week('2024-03-10')
+    week = pd.concat([yahoo_week('2024-03-03'), week])
+    path = tmp_path / 'pa_f.csv'
+    week.to_csv(path)
+
+    collector = DataCollector(db_path=str(tmp_path / 'historical.db'), store_format=None)
+    from_yahoo = collector._to_frame(week)
+    from_file = collector._to_frame(LocalFileSource(str(tmp_path / '{symbol}.csv')).history('PA=F'))
+
+    assert from_file.index.tz is None
+    assert from_file.index[0] == pd.Timestamp('2024-03-03 18:00')
+    pd.testing.assert_frame_equal(from_file, from_yahoo, check_freq=False)
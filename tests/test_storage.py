@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.storage import PartitionedStore
+from tests.conftest import make_bars
+
+
+def test_partial_month_starting_at_stored_start_keeps_rest_of_month(tmp_path):
+    """Una escritura que empieza en el inicio guardado y termina antes no borra el resto del mes"""
+    store = PartitionedStore('PA=F', root=str(tmp_path), format='parquet')
+    month = make_bars(744, start='2024-01-01')
+    store.write(month)
+
+    partial = month.iloc[:360].copy()
+    partial['close'] += 1.0
+    store.write(partial)
+
+    stored = store.read()
+    assert len(stored) == 744
+    assert store.partitions()['2024-01']['rows'] == 744
+    pd.testing.assert_series_equal(stored['close'].iloc[:360], partial['close'], check_freq=False)
+    pd.testing.assert_series_equal(stored['close'].iloc[360:], month['close'].iloc[360:], check_freq=False)
+
+
+@pytest.fixture(params=['arrow', 'parquet'])
+def store(request, tmp_path):
+    return PartitionedStore('PA=F', root=str(tmp_path), format=request.param)
+
+
+def test_round_trip_across_months(store):
+    df = make_bars(24 * 90, start='2024-01-15')
+    assert store.write(df) == ['2024-01', '2024-02', '2024-03', '2024-04']
+
+    pd.testing.assert_frame_equal(store.read(), df, check_freq=False)
+    assert sum(partition['rows'] for partition in store.partitions().values()) == len(df)
+    # Sin cambios no se reescribe ninguna partición
+    assert store.write(df) == []
+
+
+def test_read_projects_columns_and_range(store):
+    df = make_bars(24 * 75, start='2024-01-15')
+    store.write(df)
+    start, end = '2024-02-10 05:00', '2024-03-02 00:00'
+
+    selected = store.read(columns=['close', 'volume'], start=start, end=end)
+
+    pd.testing.assert_frame_equal(selected, df.loc[start:end, ['close', 'volume']], check_freq=False)
+    times, arrays = store.read_arrays(['close'], start=start, end=end)
+    np.testing.assert_array_equal(arrays['close'], df.loc[start:end, 'close'].to_numpy())
+    blocks = list(store.iter_arrays(['close'], 500, start=start, end=end))
+    np.testing.assert_array_equal(np.concatenate([block['close'] for _, block in blocks]), arrays['close'])
+    np.testing.assert_array_equal(np.concatenate([index for index, _ in blocks]), times)
+
+
+def test_changed_month_is_the_only_one_rewritten(store):
+    df = make_bars(24 * 75, start='2024-01-15')
+    store.write(df)
+    changed = df.copy()
+    changed.loc['2024-03-05', 'close'] += 1.0
+    assert store.write(changed) == ['2024-03']
+    pd.testing.assert_frame_equal(store.read(), changed, check_freq=False)